@@ -0,0 +1,108 @@
+"""Estágios baratos de admissão de lances, antes da verificação da assinatura.
+
+O MS Lance recusa um lance no primeiro estágio que falhar, na ordem:
+  1. checagens de estado (leilão ativo, valor maior que o atual);
+  2. limite de taxa por usuário (LimiteUsuarios);
+  3. filtro de replay pelo par (id_usuario, nonce) e pelo ts (FiltroReplay);
+e só então busca a chave e verifica a assinatura. Os estágios 2 e 3 usam o
+id_usuario, nonce e ts ainda não autenticados: um lance forjado pode gastar
+fichas de outro usuário, mas nunca ser aceito.
+
+As estruturas rodam só na thread da conexão (sem lock) e têm tamanho
+limitado. O estado não vai para o WAL: depois de um restart, o replay de um
+lance já aplicado continua barrado por não ser maior que o lance atual.
+
+Configuração: LEILAO_LANCES_POR_USUARIO (lances/s, 0 = sem limite),
+LEILAO_RAJADA_USUARIO e LEILAO_JANELA_REPLAY (segundos).
+"""
+import os
+import time
+from collections import OrderedDict
+
+TAXA_USUARIO = float(os.environ.get('LEILAO_LANCES_POR_USUARIO', 10))
+RAJADA_USUARIO = float(os.environ.get('LEILAO_RAJADA_USUARIO', 20))
+JANELA_REPLAY = float(os.environ.get('LEILAO_JANELA_REPLAY', 300))
+
+
+class LimiteUsuarios:
+    """Token bucket por usuário, com LRU de no máximo max_usuarios baldes.
+
+    Um usuário que sai do LRU volta com o balde cheio.
+    """
+
+    def __init__(self, taxa=TAXA_USUARIO, rajada=RAJADA_USUARIO, max_usuarios=100000):
+        self.taxa = taxa
+        self.rajada = max(1.0, rajada)
+        self.max_usuarios = max_usuarios
+        # id_usuario -> [fichas, último instante]
+        self._baldes = OrderedDict()
+
+    def permitir(self, id_usuario, agora=None):
+        if self.taxa <= 0:
+            return True
+        agora = time.monotonic() if agora is None else agora
+        balde = self._baldes.get(id_usuario)
+        if balde is None:
+            balde = self._baldes[id_usuario] = [self.rajada, agora]
+            if len(self._baldes) > self.max_usuarios:
+                self._baldes.popitem(last=False)
+        else:
+            self._baldes.move_to_end(id_usuario)
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+        if balde[0] < 1:
+            return False
+        balde[0] -= 1
+        return True
+
+    def stats(self):
+        return {"usuarios": len(self._baldes)}
+
+
+class FiltroReplay:
+    """Recusa nonces repetidos de um usuário e ts fora da janela.
+
+    Um lance é aceito se |agora - ts| <= janela e (id_usuario, nonce) ainda
+    não foi visto. Entradas com ts fora da janela são descartadas em ordem de
+    chegada; se o limite de entradas for atingido antes, a mais antiga sai e
+    o seu ts vira o piso: a partir daí, ts <= piso é recusado, então um nonce
+    esquecido nunca volta a ser aceito.
+    """
+
+    def __init__(self, janela=JANELA_REPLAY, max_entradas=1000000):
+        self.janela = janela
+        self.max_entradas = max_entradas
+        # (id_usuario, nonce) -> ts, em ordem de chegada
+        self._vistos = OrderedDict()
+        self.piso = 0.0
+        self.descartados = 0
+
+    def verificar(self, id_usuario, nonce, ts, agora=None):
+        """None se o lance é novo (e passa a ser lembrado); senão o motivo da recusa."""
+        agora = time.time() if agora is None else agora
+        if not isinstance(ts, (int, float)) or isinstance(ts, bool) or abs(agora - ts) > self.janela:
+            return 'fora_da_janela'
+        self._expirar(agora)
+        if ts <= self.piso:
+            return 'fora_da_janela'
+        chave = (id_usuario, nonce)
+        if chave in self._vistos:
+            return 'replay'
+        self._vistos[chave] = ts
+        if len(self._vistos) > self.max_entradas:
+            _, ts_antigo = self._vistos.popitem(last=False)
+            self.piso = max(self.piso, ts_antigo)
+            self.descartados += 1
+        return None
+
+    def _expirar(self, agora):
+        limite = agora - self.janela
+        vistos = self._vistos
+        while vistos:
+            chave = next(iter(vistos))
+            if vistos[chave] >= limite:
+                break
+            del vistos[chave]
+
+    def stats(self):
+        return {"nonces": len(self._vistos), "descartados": self.descartados}
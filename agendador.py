@@ -0,0 +1,131 @@
+"""Agendador de eventos temporizados baseado em heap.
+
+Substitui a varredura periódica do MS Leilão: em vez de acordar a cada N
+segundos e percorrer todos os leilões, a thread dorme exatamente até a
+próxima transição devida. Inserção e remoção custam O(log n); cancelamentos
+são preguiçosos (a entrada é marcada e descartada quando chega ao topo).
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class Tarefa:
+    __slots__ = ('quando', 'chave', 'callback', 'cancelada')
+
+    def __init__(self, quando, chave, callback):
+        self.quando = quando
+        self.chave = chave
+        self.callback = callback
+        self.cancelada = False
+
+
+class Agendador:
+    """Executa callbacks no instante (epoch, time.time()) agendado.
+
+    Os callbacks rodam na thread que chamou executar(). agendar() e
+    cancelar() podem ser chamados de qualquer thread, inclusive de dentro de
+    um callback.
+    """
+
+    # Limite de espera para tolerar ajustes no relógio do sistema
+    ESPERA_MAXIMA = 60.0
+
+    def __init__(self, relogio=time.time):
+        self.relogio = relogio
+        self._heap = []
+        self._seq = itertools.count()
+        self._por_chave = {}
+        self._canceladas = 0
+        self._cond = threading.Condition()
+        self._rodando = False
+
+    def agendar(self, quando, chave, callback):
+        """Agenda callback() para 'quando'. 'chave' agrupa tarefas para cancelamento."""
+        tarefa = Tarefa(quando, chave, callback)
+        with self._cond:
+            heapq.heappush(self._heap, (quando, next(self._seq), tarefa))
+            self._por_chave.setdefault(chave, set()).add(tarefa)
+            # Só precisa acordar a thread se a nova tarefa vira a próxima
+            if self._heap[0][2] is tarefa:
+                self._cond.notify()
+        return tarefa
+
+    def cancelar(self, tarefa):
+        with self._cond:
+            self._cancelar(tarefa)
+
+    def cancelar_chave(self, chave):
+        """Cancela todas as tarefas pendentes de uma chave."""
+        with self._cond:
+            for tarefa in list(self._por_chave.get(chave, ())):
+                self._cancelar(tarefa)
+
+    def _cancelar(self, tarefa):
+        if tarefa.cancelada:
+            return
+        tarefa.cancelada = True
+        self._remover_indice(tarefa)
+        self._canceladas += 1
+        # Compacta quando a maioria das entradas do heap é lixo
+        if self._canceladas > 1024 and self._canceladas * 2 > len(self._heap):
+            self._heap = [item for item in self._heap if not item[2].cancelada]
+            heapq.heapify(self._heap)
+            self._canceladas = 0
+
+    def _remover_indice(self, tarefa):
+        tarefas = self._por_chave.get(tarefa.chave)
+        if tarefas is not None:
+            tarefas.discard(tarefa)
+            if not tarefas:
+                del self._por_chave[tarefa.chave]
+
+    def pendentes(self):
+        with self._cond:
+            return len(self._heap) - self._canceladas
+
+    def proxima(self):
+        """Instante da próxima tarefa válida, ou None."""
+        with self._cond:
+            self._descartar_canceladas()
+            return self._heap[0][0] if self._heap else None
+
+    def _descartar_canceladas(self):
+        while self._heap and self._heap[0][2].cancelada:
+            heapq.heappop(self._heap)
+            self._canceladas -= 1
+
+    def _proxima_devida(self):
+        """Bloqueia até haver uma tarefa devida; None se o agendador parou."""
+        with self._cond:
+            while self._rodando:
+                self._descartar_canceladas()
+                if self._heap:
+                    espera = self._heap[0][0] - self.relogio()
+                    if espera <= 0:
+                        tarefa = heapq.heappop(self._heap)[2]
+                        self._remover_indice(tarefa)
+                        return tarefa
+                    self._cond.wait(min(espera, self.ESPERA_MAXIMA))
+                else:
+                    self._cond.wait(self.ESPERA_MAXIMA)
+            return None
+
+    def executar(self):
+        """Loop principal: roda até parar() ser chamado."""
+        with self._cond:
+            self._rodando = True
+        while True:
+            tarefa = self._proxima_devida()
+            if tarefa is None:
+                return
+            try:
+                tarefa.callback()
+            except Exception as e:
+                print(f"❌ Erro em tarefa agendada ({tarefa.chave}): {e}")
+
+    def parar(self):
+        with self._cond:
+            self._rodando = False
+            self._cond.notify_all()
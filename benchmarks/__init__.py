@@ -0,0 +1,5 @@
+"""Benchmarks dos serviços de leilão.
+
+Executar a partir da raiz do projeto, por exemplo:
+    python -m benchmarks.publicacao --mensagens 2000
+"""
@@ -0,0 +1,90 @@
+"""Custo de uma enxurrada de lances inúteis no MS Lance, com e sem admissão.
+
+Roda o MS Lance (verificação serial) sobre o broker em memória, abre um
+leilão com um lance alto e mede o tempo para drenar N lances de um cenário:
+  - baixo: lances corretamente assinados, mas abaixo do atual;
+  - inundacao: um usuário só, com valores crescentes, acima do limite de taxa.
+--sem-admissao desliga os estágios baratos (comportamento antigo: toda
+mensagem passa pela verificação da assinatura antes de ser recusada).
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import logs
+import utils
+
+utils.BROKER = 'memoria'
+
+import ms_lance  # noqa: E402
+
+
+def gerar_lances(cenario, n, private_key):
+    lances = []
+    for i in range(n):
+        valor = 1.0 + i if cenario == 'baixo' else 2e9 + i
+        lances.append(utils.build_signed_message(
+            private_key, {"id_leilao": "leilao_adm", "id_usuario": "adm_0000", "valor": valor,
+                          **utils.carimbo_lance()}))
+    return lances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lances', type=int, default=2000)
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default=utils.DEFAULT_SCHEME)
+    parser.add_argument('--cenario', choices=('baixo', 'inundacao'), default='baixo')
+    parser.add_argument('--sem-admissao', action='store_true')
+    args = parser.parse_args()
+
+    logs.configurar('bench', nivel='WARNING', formato='json', destino=io.StringIO())
+    diretorio_chaves = tempfile.mkdtemp(prefix='chaves_')
+    private_key, public_key = utils.generate_keys(args.alg)
+    utils.save_key_to_file(public_key, os.path.join(diretorio_chaves, "adm_0000.pem"))
+    ms_lance.registro_chaves = utils.KeyRegistry(diretorio_chaves)
+    if args.sem_admissao:
+        ms_lance.admitir = lambda lance_info: None
+    lances = gerar_lances(args.cenario, args.lances, private_key)
+    alto = utils.build_signed_message(
+        private_key, {"id_leilao": "leilao_adm", "id_usuario": "adm_0000", "valor": 1e9,
+                      **utils.carimbo_lance()})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        threading.Thread(target=lambda: ms_lance.run(precarregar=False), daemon=True).start()
+        while ms_lance.consumidor is None:
+            time.sleep(0.01)
+        corpo, content_type = utils.encode_event({"id_leilao": "leilao_adm", "descricao": "bench"})
+        utils.publish('leilao_iniciado', '', corpo, utils.event_properties(content_type))
+        while 'leilao_adm' not in ms_lance.leiloes_ativos:
+            time.sleep(0.01)
+        exchange, routing_key = utils.route_bid('leilao_adm')
+        utils.publish(exchange, routing_key, *alto)
+        while ms_lance.maiores_lances['leilao_adm']['valor'] < 1e9:
+            time.sleep(0.01)
+
+        consumidor = ms_lance.consumidor
+        acks_iniciais = consumidor.stats()['acks']
+        inicio = time.perf_counter()
+        for body, properties in lances:
+            utils.publish(exchange, routing_key, body, properties)
+        while consumidor.stats()['acks'] - acks_iniciais < args.lances:
+            time.sleep(0.001)
+        decorrido = time.perf_counter() - inicio
+        consumidor.channel.connection.add_callback_threadsafe(consumidor.channel.stop_consuming)
+
+    modo = 'sem admissão' if args.sem_admissao else 'com admissão'
+    print(f"{args.cenario}, {args.alg}, {modo}: {args.lances} lances em {decorrido:.2f} s "
+          f"({args.lances / decorrido:.0f} lances/s, {decorrido / args.lances * 1e6:.0f} us/lance)")
+    print("Admissão: " + " | ".join(f"{k}={v}" for k, v in ms_lance.stats_admissao().items()))
+    print("Resultados: " + " | ".join(f"{valores[0]}={serie.valor}"
+                                      for valores, serie in sorted(ms_lance.LANCES._series.items())))
+    utils.close_pool()
+
+
+if __name__ == '__main__':
+    main()
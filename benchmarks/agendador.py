@@ -0,0 +1,104 @@
+"""Atraso das transições e CPU: agendador por heap vs. varredura periódica.
+
+Os leilões são sintéticos e as transições apenas registram o instante em que
+foram disparadas, sem publicar nada no broker.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from agendador import Agendador
+
+
+def gerar_leiloes(n, horizonte):
+    agora = time.time()
+    leiloes = {}
+    for i in range(n):
+        inicio = agora + random.uniform(0.5, horizonte / 2)
+        fim = inicio + random.uniform(0.5, horizonte / 2)
+        leiloes[f"leilao_{i:06d}"] = {"inicio": inicio, "fim": fim, "status": "agendado"}
+    return leiloes
+
+
+def varredura(leiloes, intervalo, horizonte):
+    """Laço antigo do MS Leilão: varre todos os leilões a cada 'intervalo'."""
+    atrasos = []
+    limite = time.time() + horizonte + intervalo
+    while time.time() < limite:
+        agora = time.time()
+        for leilao in leiloes.values():
+            if leilao["status"] == "agendado" and leilao["inicio"] <= agora < leilao["fim"]:
+                leilao["status"] = "ativo"
+                atrasos.append(agora - leilao["inicio"])
+            elif leilao["status"] == "ativo" and agora >= leilao["fim"]:
+                leilao["status"] = "finalizado"
+                atrasos.append(agora - leilao["fim"])
+        time.sleep(intervalo)
+    return atrasos
+
+
+def por_heap(leiloes, horizonte):
+    agendador = Agendador()
+    atrasos = []
+
+    def transicao(leilao, campo, status):
+        atrasos.append(time.time() - leilao[campo])
+        leilao["status"] = status
+
+    for id_leilao, leilao in leiloes.items():
+        agendador.agendar(leilao["inicio"], id_leilao,
+                          lambda l=leilao: transicao(l, "inicio", "ativo"))
+        agendador.agendar(leilao["fim"], id_leilao,
+                          lambda l=leilao: transicao(l, "fim", "finalizado"))
+    threading.Timer(horizonte + 0.5, agendador.parar).start()
+    agendador.executar()
+    return atrasos
+
+
+def medir(nome, funcao):
+    cpu = time.process_time()
+    atrasos = funcao()
+    cpu = time.process_time() - cpu
+    atrasos.sort()
+    p99 = atrasos[int(len(atrasos) * 0.99) - 1] if atrasos else 0
+    print(f"{nome:<22} transições={len(atrasos):>7}  atraso médio={statistics.fmean(atrasos) * 1e3:9.2f} ms"
+          f"  p99={p99 * 1e3:9.2f} ms  máx={atrasos[-1] * 1e3:9.2f} ms  CPU={cpu:6.2f} s")
+
+
+def escala(n):
+    """Custo de agendar e cancelar n leilões (2n timers)."""
+    agendador = Agendador()
+    base = time.time() + 3600
+    inicio = time.perf_counter()
+    for i in range(n):
+        agendador.agendar(base + i, i, lambda: None)
+        agendador.agendar(base + i + 60, i, lambda: None)
+    agendar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for i in range(0, n, 2):
+        agendador.cancelar_chave(i)
+    cancelar = time.perf_counter() - inicio
+    print(f"{n} leilões: agendar {agendar / (2 * n) * 1e6:.2f} us/timer, "
+          f"cancelar {cancelar / (n // 2) * 1e6:.2f} us/leilão, pendentes={agendador.pendentes()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leiloes', type=int, default=2000)
+    parser.add_argument('--horizonte', type=float, default=10.0, help='segundos simulados')
+    parser.add_argument('--intervalo', type=float, default=5.0, help='intervalo da varredura antiga')
+    parser.add_argument('--escala', type=int, default=200000, help='leilões no teste de escala')
+    args = parser.parse_args()
+
+    random.seed(42)
+    medir(f"varredura ({args.intervalo:g} s)",
+          lambda: varredura(gerar_leiloes(args.leiloes, args.horizonte), args.intervalo, args.horizonte))
+    random.seed(42)
+    medir("heap (agendador)", lambda: por_heap(gerar_leiloes(args.leiloes, args.horizonte), args.horizonte))
+    escala(args.escala)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Custo de geração de chaves, assinatura e verificação por esquema."""
+import argparse
+import time
+
+import utils
+
+MENSAGEM = {"id_leilao": "leilao_001", "id_usuario": "user_bench", "valor": 1234.5}
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chaves', type=int, default=20, help='repetições de keygen')
+    parser.add_argument('--repeticoes', type=int, default=500, help='repetições de sign/verify')
+    args = parser.parse_args()
+
+    print(f"{'esquema':<16}{'keygen (ms)':>14}{'sign (us)':>12}{'verify (us)':>14}{'verify/s':>12}")
+    for nome in utils.SCHEMES:
+        keygen = medir(lambda: utils.generate_keys(nome), args.chaves)
+        private_key, public_key = utils.generate_keys(nome)
+        assinatura = utils.sign_message(private_key, MENSAGEM)
+        sign = medir(lambda: utils.sign_message(private_key, MENSAGEM), args.repeticoes)
+        verify = medir(lambda: utils.verify_signature(public_key, assinatura, MENSAGEM, nome),
+                       args.repeticoes)
+        print(f"{nome:<16}{keygen * 1e3:>14.2f}{sign * 1e6:>12.1f}{verify * 1e6:>14.1f}{1 / verify:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
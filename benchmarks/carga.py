@@ -0,0 +1,256 @@
+"""Gerador de carga ponta a ponta: lances assinados -> notificações.
+
+Simula N clientes com chaves geradas antes da medição (as públicas vão para
+public_keys/carga_NNNNN.pem, onde o MS Lance as procura, e são apagadas ao
+fim), envia lances a uma taxa alvo distribuídos entre os leilões, escuta
+notificacao_leilao e mede a latência entre o envio do lance e a chegada da
+notificação correspondente.
+
+A latência conta a partir do instante planejado do envio, não do envio de
+fato: se o gerador atrasar, o atraso aparece no resultado (sem omissão
+coordenada). Lances abaixo do maior atual (--invalidos) devem ser recusados
+pelo MS Lance: os que nunca viram notificação contam como rejeitados, e os
+notificados como invalidos_aceitos. Lances válidos sem notificação ao fim da
+espera contam como perdidos (ou coalescidos, se o MS Notificação usar
+conflação).
+
+O resultado vai em JSON para --saida (ou stdout) para comparar builds.
+Os leilões precisam estar ativos: use --leiloes ou deixe o gerador
+descobrir os que o MS Leilão anunciar em leilao_iniciado.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+
+import utils
+
+PUBLIC_KEYS_DIR = 'public_keys'
+
+
+def gerar_clientes(n, alg):
+    clientes = []
+    for i in range(n):
+        user_id = f"carga_{i:05d}"
+        private_key, public_key = utils.generate_keys(alg)
+        utils.save_key_to_file(public_key, os.path.join(PUBLIC_KEYS_DIR, f"{user_id}.pem"))
+        clientes.append((user_id, private_key))
+    return clientes
+
+
+def remover_clientes(clientes):
+    for user_id, _ in clientes:
+        try:
+            os.remove(os.path.join(PUBLIC_KEYS_DIR, f"{user_id}.pem"))
+        except FileNotFoundError:
+            pass
+
+
+def versao():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentis(latencias):
+    latencias = sorted(latencias)
+    if not latencias:
+        return {}
+
+    def p(q):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * q))] * 1e3
+
+    return {"p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": latencias[-1] * 1e3,
+            "media": sum(latencias) / len(latencias) * 1e3}
+
+
+class Observador:
+    """Thread com conexão própria: descobre leilões e casa notificações com lances."""
+
+    def __init__(self, leiloes):
+        self.lock = threading.Lock()
+        self.ativos = list(leiloes)
+        self.encerrados = set()
+        # (id_leilao, id_usuario, valor) -> instante planejado do envio
+        self.aguardando = {}
+        # Lances que o MS Lance deve recusar: os que sobrarem foram rejeitados
+        self.invalidos = Counter()
+        self.invalidos_aceitos = 0
+        self.latencias = []
+        self.inesperadas = 0
+        self.channel = utils.get_rabbitmq_channel()
+        utils.setup_queues(self.channel)
+        fila = self.channel.queue_declare(queue='', exclusive=True).method.queue
+        self.channel.queue_bind(exchange='notificacao_leilao', queue=fila, routing_key='leilao.*')
+        self.channel.basic_consume(queue=fila, on_message_callback=self.notificacao, auto_ack=True)
+        if not leiloes:
+            fila = self.channel.queue_declare(queue='', exclusive=True).method.queue
+            self.channel.queue_bind(exchange='leilao_iniciado', queue=fila)
+            self.channel.basic_consume(queue=fila, on_message_callback=self.leilao_iniciado,
+                                       auto_ack=True)
+        self.thread = threading.Thread(target=self.channel.start_consuming, daemon=True)
+
+    def leilao_iniciado(self, ch, method, properties, body):
+        id_leilao = utils.decode_event(properties, body).get('id_leilao')
+        with self.lock:
+            if id_leilao and id_leilao not in self.ativos and id_leilao not in self.encerrados:
+                self.ativos.append(id_leilao)
+
+    def notificacao(self, ch, method, properties, body):
+        agora = time.perf_counter()
+        evento = utils.decode_event(properties, body)
+        with self.lock:
+            if 'id_vencedor' in evento:
+                self.encerrados.add(evento['id_leilao'])
+                if evento['id_leilao'] in self.ativos:
+                    self.ativos.remove(evento['id_leilao'])
+                return
+            chave = (evento.get('id_leilao'), evento.get('id_usuario'), round(evento.get('valor', 0), 2))
+            enviado = self.aguardando.pop(chave, None)
+            if enviado is not None:
+                self.latencias.append(agora - enviado)
+            elif self.invalidos[chave] > 0:
+                self.invalidos[chave] -= 1
+                self.invalidos_aceitos += 1
+            else:
+                self.inesperadas += 1
+
+    def parar(self):
+        self.channel.connection.add_callback_threadsafe(self.channel.stop_consuming)
+        self.thread.join(5)
+
+
+def executar(args):
+    inicio_chaves = time.perf_counter()
+    clientes = gerar_clientes(args.clientes, args.alg)
+    tempo_chaves = time.perf_counter() - inicio_chaves
+    print(f"{len(clientes)} clientes ({args.alg}) gerados em {tempo_chaves:.1f} s")
+    try:
+        resultado = medir(args, clientes)
+    finally:
+        remover_clientes(clientes)
+    resultado["geracao_chaves_s"] = round(tempo_chaves, 3)
+    return resultado
+
+
+def medir(args, clientes):
+    observador = Observador(args.leiloes.split(',') if args.leiloes else [])
+    observador.thread.start()
+    limite = time.perf_counter() + args.espera_leiloes
+    while not observador.ativos and time.perf_counter() < limite:
+        time.sleep(0.1)
+    if not observador.ativos:
+        raise SystemExit("Nenhum leilão ativo: inicie o MS Leilão ou passe --leiloes")
+
+    aleatorio = random.Random(args.semente)
+    maiores = {}
+    enviados = invalidos = 0
+    atraso_max = 0.0
+    intervalo = 1.0 / args.taxa
+    inicio = time.perf_counter()
+    planejado = inicio
+    fim = inicio + args.duracao
+    while planejado < fim:
+        agora = time.perf_counter()
+        if planejado > agora:
+            time.sleep(planejado - agora)
+        else:
+            atraso_max = max(atraso_max, agora - planejado)
+        with observador.lock:
+            leiloes = observador.ativos[:]
+        if not leiloes:
+            break
+        id_leilao = aleatorio.choice(leiloes)
+        user_id, private_key = aleatorio.choice(clientes)
+        atual = maiores.get(id_leilao, args.valor_inicial)
+        invalido = aleatorio.random() < args.invalidos
+        if invalido:
+            valor = round(max(0.01, atual - args.incremento), 2)
+            invalidos += 1
+            with observador.lock:
+                observador.invalidos[(id_leilao, user_id, valor)] += 1
+        else:
+            valor = round(atual + args.incremento, 2)
+            maiores[id_leilao] = valor
+            with observador.lock:
+                observador.aguardando[(id_leilao, user_id, valor)] = planejado
+        body, properties = utils.build_signed_message(
+            private_key, {"id_leilao": id_leilao, "id_usuario": user_id, "valor": float(valor),
+                          **utils.carimbo_lance()})
+        exchange, routing_key = utils.route_bid(id_leilao)
+        utils.publish(exchange, routing_key, body, properties)
+        enviados += 1
+        planejado += intervalo
+    duracao = time.perf_counter() - inicio
+
+    limite = time.perf_counter() + args.espera
+    while time.perf_counter() < limite:
+        with observador.lock:
+            if not observador.aguardando:
+                break
+        time.sleep(0.05)
+    observador.parar()
+    utils.close_pool()
+
+    with observador.lock:
+        aceitos = len(observador.latencias)
+        return {
+            "versao": versao(),
+            "inicio": datetime.datetime.now().isoformat(timespec='seconds'),
+            "config": {k: v for k, v in vars(args).items() if k != 'saida'},
+            "enviados": enviados,
+            "taxa_alcancada": round(enviados / duracao, 1) if duracao else 0,
+            "atraso_max_envio_ms": round(atraso_max * 1e3, 3),
+            "aceitos": aceitos,
+            "invalidos_enviados": invalidos,
+            "rejeitados": sum(observador.invalidos.values()),
+            "invalidos_aceitos": observador.invalidos_aceitos,
+            "perdidos": len(observador.aguardando),
+            "notificacoes_inesperadas": observador.inesperadas,
+            "latencia_ms": {k: round(v, 3) for k, v in percentis(observador.latencias).items()},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default='ed25519',
+                        help='esquema das chaves dos clientes (ed25519 gera milhares rápido)')
+    parser.add_argument('--taxa', type=float, default=200, help='lances/s alvo')
+    parser.add_argument('--duracao', type=float, default=30, help='segundos de envio')
+    parser.add_argument('--leiloes', default='', help='ids separados por vírgula (padrão: descobrir)')
+    parser.add_argument('--espera-leiloes', type=float, default=30,
+                        help='segundos aguardando algum leilão ser anunciado')
+    parser.add_argument('--invalidos', type=float, default=0.0,
+                        help='fração de lances abaixo do maior atual (devem ser recusados)')
+    parser.add_argument('--valor-inicial', type=float, default=1000.0)
+    parser.add_argument('--incremento', type=float, default=1.0)
+    parser.add_argument('--espera', type=float, default=10,
+                        help='segundos aguardando notificações após o último envio')
+    parser.add_argument('--semente', type=int, default=None)
+    parser.add_argument('--saida', help='arquivo JSON de resultado (padrão: stdout)')
+    args = parser.parse_args()
+
+    resultado = executar(args)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as saida:
+            saida.write(texto + '\n')
+        latencia = resultado['latencia_ms']
+        print(f"enviados={resultado['enviados']} aceitos={resultado['aceitos']} "
+              f"perdidos={resultado['perdidos']} p50={latencia.get('p50')} ms "
+              f"p99={latencia.get('p99')} ms -> {args.saida}")
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
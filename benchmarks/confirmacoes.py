@@ -0,0 +1,78 @@
+"""Publicação sem confirmação, com confirmação síncrona e com ReliablePublisher.
+
+Mede mensagens/s confirmadas e a latência de confirmação (p50/p95/p99).
+"""
+import argparse
+import time
+
+import pika
+
+import utils
+
+FILA = 'bench_confirmacoes'
+
+
+def sem_confirmacao(n, corpo, propriedades):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        utils.publish('', FILA, corpo, propriedades)
+    return n / (time.perf_counter() - inicio), None
+
+
+def confirmacao_sincrona(n, corpo, propriedades):
+    """BlockingChannel em confirm mode: um round-trip por mensagem."""
+    channel = utils.get_rabbitmq_channel()
+    channel.confirm_delivery()
+    latencias = []
+    inicio = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        channel.basic_publish('', FILA, corpo, propriedades)
+        latencias.append(time.perf_counter() - t0)
+    vazao = n / (time.perf_counter() - inicio)
+    channel.connection.close()
+    latencias.sort()
+    return vazao, {f"p{p}_ms": latencias[int(len(latencias) * p / 100) - 1] * 1e3 for p in (50, 95, 99)}
+
+
+def confirmacao_pipeline(n, corpo, propriedades, em_voo):
+    publicador = utils.ReliablePublisher(max_em_voo=em_voo)
+    inicio = time.perf_counter()
+    for _ in range(n):
+        publicador.publish('', FILA, corpo, propriedades)
+    publicador.flush()
+    vazao = n / (time.perf_counter() - inicio)
+    stats = publicador.stats()
+    publicador.close()
+    return vazao, {k: stats[k] for k in ('p50_ms', 'p95_ms', 'p99_ms')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mensagens', type=int, default=20000)
+    parser.add_argument('--tamanho', type=int, default=128)
+    parser.add_argument('--em-voo', type=int, default=1000)
+    args = parser.parse_args()
+
+    corpo = b'x' * args.tamanho
+    propriedades = pika.BasicProperties(delivery_mode=2)
+    channel = utils.get_rabbitmq_channel()
+    channel.queue_declare(queue=FILA, durable=True)
+
+    resultados = [
+        ("sem confirmação", sem_confirmacao(args.mensagens, corpo, propriedades)),
+        ("confirmação síncrona", confirmacao_sincrona(args.mensagens, corpo, propriedades)),
+        (f"confirmação em lote ({args.em_voo} em voo)",
+         confirmacao_pipeline(args.mensagens, corpo, propriedades, args.em_voo)),
+    ]
+    channel.queue_delete(queue=FILA)
+    channel.connection.close()
+    utils.close_pool()
+
+    for nome, (vazao, latencias) in resultados:
+        detalhes = "  ".join(f"{k}={v:.2f}" for k, v in latencias.items()) if latencias else ""
+        print(f"{nome:<36}{vazao:10.0f} msg/s  {detalhes}")
+
+
+if __name__ == '__main__':
+    main()
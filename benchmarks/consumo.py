@@ -0,0 +1,102 @@
+"""Consumo com ack individual vs. prefetch + acks cumulativos (utils.Consumidor).
+
+Enche uma fila e mede quanto tempo cada configuração leva para drená-la.
+Se o plugin de management estiver ativo, também amostra a memória da fila
+e as mensagens entregues sem ack no broker durante o consumo.
+"""
+import argparse
+import base64
+import json
+import time
+import urllib.request
+
+import pika
+
+import utils
+
+FILA = 'bench_consumo'
+API = 'http://localhost:15672/api/queues/%2F/' + FILA
+
+
+def estado_fila():
+    """(memória em bytes, mensagens sem ack) da fila, ou None sem management."""
+    pedido = urllib.request.Request(API, headers={
+        'Authorization': 'Basic ' + base64.b64encode(b'guest:guest').decode()})
+    try:
+        with urllib.request.urlopen(pedido, timeout=1) as resposta:
+            dados = json.load(resposta)
+        return dados.get('memory', 0), dados.get('messages_unacknowledged', 0)
+    except OSError:
+        return None
+
+
+def encher(n, corpo):
+    propriedades = pika.BasicProperties(delivery_mode=2)
+    for _ in range(n):
+        utils.publish('', FILA, corpo, propriedades)
+
+
+def drenar(n, prefetch, lote, intervalo):
+    channel = utils.get_rabbitmq_channel()
+    consumidor = utils.Consumidor(channel, prefetch, lote, intervalo)
+    recebidas = 0
+    amostras = []
+
+    def callback(ch, method, properties, body):
+        nonlocal recebidas
+        recebidas += 1
+        consumidor.ack(method.delivery_tag)
+        if recebidas % max(1, n // 5) == 0:
+            amostras.append(estado_fila())
+        if recebidas == n:
+            consumidor.flush()
+            ch.stop_consuming()
+
+    consumidor.consumir(FILA, callback)
+    inicio = time.perf_counter()
+    channel.start_consuming()
+    vazao = n / (time.perf_counter() - inicio)
+    stats = consumidor.stats()
+    channel.connection.close()
+    amostras = [a for a in amostras if a is not None]
+    memoria = max((a[0] for a in amostras), default=None)
+    sem_ack = max((a[1] for a in amostras), default=None)
+    return vazao, stats['acks_por_frame'], memoria, sem_ack
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mensagens', type=int, default=50000)
+    parser.add_argument('--tamanho', type=int, default=128)
+    parser.add_argument('--prefetch', type=int, default=utils.PREFETCH)
+    parser.add_argument('--lote', type=int, default=utils.ACK_LOTE)
+    args = parser.parse_args()
+
+    corpo = b'x' * args.tamanho
+    channel = utils.get_rabbitmq_channel()
+    channel.queue_declare(queue=FILA, durable=True)
+    channel.queue_purge(queue=FILA)
+
+    cenarios = [
+        ("sem prefetch, ack individual", 0, 1, 0),
+        (f"prefetch {args.prefetch}, ack individual", args.prefetch, 1, 0),
+        (f"prefetch {args.prefetch}, acks em lote de {args.lote}", args.prefetch, args.lote,
+         utils.ACK_INTERVALO),
+    ]
+    resultados = []
+    for nome, prefetch, lote, intervalo in cenarios:
+        encher(args.mensagens, corpo)
+        resultados.append((nome, drenar(args.mensagens, prefetch, lote, intervalo)))
+    channel.queue_delete(queue=FILA)
+    channel.connection.close()
+    utils.close_pool()
+
+    print(f"{'cenário':<40}{'msg/s':>10}{'acks/frame':>12}{'memória fila':>15}{'sem ack':>10}")
+    for nome, (vazao, por_frame, memoria, sem_ack) in resultados:
+        memoria = f"{memoria / 1024:.0f} KiB" if memoria is not None else "n/d"
+        sem_ack = sem_ack if sem_ack is not None else "n/d"
+        print(f"{nome:<40}{vazao:10.0f}{por_frame:12.1f}{memoria:>15}{sem_ack:>10}")
+
+
+if __name__ == '__main__':
+    main()
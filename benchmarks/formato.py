@@ -0,0 +1,55 @@
+"""Formato JSON vs. binário: tempo de codificação/decodificação e bytes por evento."""
+import argparse
+import json
+import time
+
+import utils
+import wire
+
+EVENTOS = {
+    "leilao_iniciado": {
+        "id_leilao": "leilao_001", "descricao": "iPhone 15 Pro Max 256GB - Azul Titânio",
+        "inicio": "2025-09-09T10:10:00", "fim": "2025-09-09T10:11:20", "status": "ativo",
+    },
+    "lance_realizado": {"id_leilao": "leilao_001", "id_usuario": "user_d1558b", "valor": 1234.5},
+    "lance_validado": {"id_leilao": "leilao_001", "id_usuario": "user_d1558b", "valor": 1234.5},
+    "leilao_vencedor": {"id_leilao": "leilao_001", "id_vencedor": "user_d1558b", "valor": 1234.5},
+}
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeticoes', type=int, default=100000)
+    args = parser.parse_args()
+    n = args.repeticoes
+
+    private_key, _ = utils.generate_keys()
+    print(f"{'evento':<18}{'formato':<9}{'bytes':>7}{'encode (us)':>13}{'decode (us)':>13}")
+    for nome, evento in EVENTOS.items():
+        corpo_json = utils.encode_payload(evento, 'json')
+        corpo_bin = wire.codificar(evento)
+        extra_json = extra_bin = 0
+        if nome == "lance_realizado":
+            # Envelope antigo: assinatura em hex dentro do JSON; novo: bytes crus no header
+            assinatura = utils.sign_message(private_key, corpo_json)
+            extra_json = len(json.dumps({"data": evento, "assinatura": assinatura.hex()})) - len(corpo_json)
+            extra_bin = len(assinatura)
+        linhas = (
+            ("json", len(corpo_json) + extra_json,
+             medir(lambda: utils.encode_payload(evento, 'json'), n), medir(lambda: json.loads(corpo_json), n)),
+            ("binario", len(corpo_bin) + extra_bin,
+             medir(lambda: wire.codificar(evento), n), medir(lambda: wire.decodificar(corpo_bin), n)),
+        )
+        for formato, tamanho, encode, decode in linhas:
+            print(f"{nome:<18}{formato:<9}{tamanho:>7}{encode:>13.2f}{decode:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
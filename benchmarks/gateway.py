@@ -0,0 +1,141 @@
+"""Fanout do gateway para muitos assinantes locais, sem broker.
+
+O gateway roda neste processo (eventos entregues direto em distribuir());
+os assinantes TCP rodam num processo filho, todos num event loop, e medem
+a latência de cada evento (instante do recebimento - instante do envio,
+que vai no próprio evento). Mede também a memória do gateway por conexão
+(VmRSS antes e depois de conectar todos) e, com --lentos, quantos
+assinantes que não leem são derrubados.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import statistics
+import time
+
+import gateway
+
+
+def rss_kib():
+    with open('/proc/self/status') as status:
+        for linha in status:
+            if linha.startswith('VmRSS:'):
+                return int(linha.split()[1])
+    return 0
+
+
+def percentis(valores):
+    if not valores:
+        return {}
+    valores = sorted(valores)
+    return {f"p{q}": valores[min(len(valores) - 1, int(len(valores) * q / 100))] * 1e3
+            for q in (50, 90, 99)} | {"max": valores[-1] * 1e3}
+
+
+async def assinantes(porta, n, lentos, eventos, pronto, resultado):
+    latencias = []
+    recebidos = 0
+    conexoes = []
+    for i in range(n + lentos):
+        sock = socket.socket()
+        if i >= n:
+            # Janela de recepção pequena: o kernel não esconde o assinante lento
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', porta))
+        reader, writer = await asyncio.open_connection(sock=sock)
+        writer.write(b'+leilao_bench\n')
+        conexoes.append((reader, writer, i >= n))
+
+    async def ler(reader):
+        nonlocal recebidos
+        for _ in range(eventos):
+            linha = await reader.readline()
+            if not linha:
+                return
+            latencias.append(time.time() - json.loads(linha)['t'])
+            recebidos += 1
+
+    await asyncio.sleep(0.5)
+    pronto.set()
+    tarefas = [ler(reader) for reader, _, lento in conexoes if not lento]
+    await asyncio.wait_for(asyncio.gather(*tarefas), 120)
+    resultado.put({"recebidos": recebidos, "latencias": latencias})
+    for _, writer, _ in conexoes:
+        writer.close()
+
+
+def processo_assinantes(porta, n, lentos, eventos, pronto, resultado):
+    asyncio.run(assinantes(porta, n, lentos, eventos, pronto, resultado))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--assinantes', type=int, default=5000)
+    parser.add_argument('--eventos', type=int, default=50)
+    parser.add_argument('--intervalo-ms', type=float, default=250)
+    parser.add_argument('--tamanho', type=int, default=200, help='bytes de preenchimento por evento')
+    parser.add_argument('--lentos', type=int, default=0, help='assinantes extras que nunca leem')
+    parser.add_argument('--limite-buffer', type=int, default=gateway.LIMITE_BUFFER)
+    args = parser.parse_args()
+
+    gw = gateway.Gateway(args.limite_buffer)
+    loop = gw.loop
+    asyncio.set_event_loop(loop)
+    servidor, = loop.run_until_complete(gw.iniciar_servidores('127.0.0.1', 0, None))
+    porta = servidor.sockets[0].getsockname()[1]
+
+    contexto = multiprocessing.get_context('fork')
+    pronto, resultado = contexto.Event(), contexto.Queue()
+    rss_antes = rss_kib()
+    filho = contexto.Process(target=processo_assinantes,
+                             args=(porta, args.assinantes, args.lentos, args.eventos, pronto, resultado))
+    filho.start()
+
+    async def aguardar_conexoes():
+        while not pronto.is_set() or len(gw.assinantes) < args.assinantes + args.lentos:
+            await asyncio.sleep(0.05)
+    loop.run_until_complete(aguardar_conexoes())
+    rss_conectados = rss_kib()
+
+    enchimento = 'x' * args.tamanho
+    duracoes = []
+
+    async def enviar():
+        for i in range(args.eventos):
+            corpo = json.dumps({"id_leilao": "leilao_bench", "id_usuario": "bench", "valor": float(i),
+                                "t": time.time(), "p": enchimento}).encode('utf-8')
+            inicio = time.perf_counter()
+            gw.distribuir('leilao_bench', 'lance', corpo)
+            duracoes.append(time.perf_counter() - inicio)
+            await asyncio.sleep(args.intervalo_ms / 1000)
+        # Dá tempo para os transportes esvaziarem
+        await asyncio.sleep(0.5)
+    loop.run_until_complete(enviar())
+
+    dados = None
+    while dados is None:
+        loop.run_until_complete(asyncio.sleep(0.1))
+        if not resultado.empty():
+            dados = resultado.get()
+    filho.join(10)
+
+    esperados = args.assinantes * args.eventos
+    print(f"{args.assinantes} assinantes (+{args.lentos} lentos), {args.eventos} eventos de "
+          f"~{args.tamanho + 100} bytes a cada {args.intervalo_ms:g} ms")
+    print(f"Entregues: {dados['recebidos']}/{esperados}")
+    print(f"Memória do gateway: {(rss_conectados - rss_antes) / max(1, args.assinantes + args.lentos):.1f} "
+          f"KiB/conexão ({(rss_conectados - rss_antes) / 1024:.1f} MiB)")
+    print(f"distribuir(): mediana {statistics.median(duracoes) * 1e3:.2f} ms por evento "
+          f"({statistics.median(duracoes) / max(1, args.assinantes) * 1e6:.2f} us/assinante)")
+    print("Latência de fanout (ms): " + " | ".join(
+        f"{k}={v:.2f}" for k, v in percentis(dados['latencias']).items()))
+    print(f"Lentos derrubados: {int(gateway.DERRUBADOS.rotulos('lento').valor)}")
+    servidor.close()
+
+
+if __name__ == '__main__':
+    main()
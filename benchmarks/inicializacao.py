@@ -0,0 +1,71 @@
+"""Tempo de criação do ClienteLeilao: identidade efêmera vs. chaveiro.
+
+Para cada esquema mede, num diretório temporário:
+  - efêmero: gera user_id e chaves novas e grava um .pem a cada início
+    (comportamento antigo);
+  - primeiro início com perfil: gera e grava o chaveiro;
+  - reinício com perfil: só carrega a chave privada do chaveiro.
+Também mostra quantos .pem ficam em public_keys/ depois de N inícios.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import utils
+import cliente
+
+
+def medir(criar, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            criar()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1e3
+
+
+def limpar_pem():
+    """Esvazia public_keys/ e devolve quantos arquivos havia."""
+    nomes = os.listdir(cliente.PUBLIC_KEYS_DIR)
+    for nome in nomes:
+        os.unlink(os.path.join(cliente.PUBLIC_KEYS_DIR, nome))
+    return len(nomes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+    n = args.repeticoes
+    original = os.getcwd()
+
+    print(f"{'esquema':<16}{'efêmero (ms)':>14}{'1º início (ms)':>16}{'reinício (ms)':>15}"
+          f"{'.pem efêmero':>14}{'.pem perfil':>13}")
+    for alg in utils.SCHEMES:
+        with tempfile.TemporaryDirectory() as diretorio:
+            os.chdir(diretorio)
+            try:
+                chaveiro_dir = os.path.join(diretorio, 'chaveiro')
+                efemero = medir(lambda: cliente.ClienteLeilao(alg, None), n)
+                pem_efemero = limpar_pem()
+
+                contador = iter(range(n))
+                primeiro = medir(lambda: cliente.ClienteLeilao(
+                    alg, f"perfil{next(contador)}", chaveiro_dir), n)
+                limpar_pem()
+                reinicio = medir(lambda: cliente.ClienteLeilao(alg, 'perfil0', chaveiro_dir), n)
+                pem_perfil = limpar_pem()
+            finally:
+                os.chdir(original)
+        print(f"{alg:<16}{efemero:>14.2f}{primeiro:>16.2f}{reinicio:>15.2f}"
+              f"{pem_efemero:>14}{pem_perfil:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Disputa entre vários usuários no MS Lance: lances comuns x automáticos.
+
+Cada usuário tem um valor máximo (sorteado com --semente). No modo comum,
+quem está perdendo cobre o preço com o próximo incremento enquanto o seu
+máximo permitir, como fariam os clientes manualmente: uma mensagem assinada,
+uma verificação e um lance_validado por degrau. No modo automático, cada
+usuário manda só uma mensagem com o máximo e o MS Lance resolve a disputa.
+
+Roda o MS Lance (verificação serial) sobre o broker em memória, sem limite
+de taxa por usuário, e conta as mensagens de lance_realizado e de
+lance_validado de cada modo, o tempo para drenar e o resultado final.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+import logs
+import utils
+
+utils.BROKER = 'memoria'
+
+import lance_automatico  # noqa: E402
+import ms_lance  # noqa: E402
+
+
+def disputa_manual(maximos):
+    """Sequência de (usuario, valor) em que os usuários se cobrem um incremento por vez."""
+    lances, preco, lider = [], 0, None
+    while True:
+        houve_lance = False
+        for usuario, maximo in maximos.items():
+            if usuario != lider and maximo >= lance_automatico.proximo(preco):
+                preco, lider = lance_automatico.proximo(preco), usuario
+                lances.append((usuario, preco))
+                houve_lance = True
+        if not houve_lance:
+            return lances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--maximo', type=float, default=5000, help='maior valor máximo sorteado')
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default=utils.DEFAULT_SCHEME)
+    parser.add_argument('--semente', type=int, default=1)
+    args = parser.parse_args()
+
+    logs.configurar('bench', nivel='WARNING', formato='json', destino=io.StringIO())
+    sorteio = random.Random(args.semente)
+    diretorio_chaves = tempfile.mkdtemp(prefix='chaves_')
+    chaves, maximos = {}, {}
+    for i in range(args.usuarios):
+        usuario = f"auto_{i:04d}"
+        private_key, public_key = utils.generate_keys(args.alg)
+        utils.save_key_to_file(public_key, os.path.join(diretorio_chaves, f"{usuario}.pem"))
+        chaves[usuario] = private_key
+        maximos[usuario] = round(sorteio.uniform(args.maximo / 10, args.maximo), 2)
+    ms_lance.registro_chaves = utils.KeyRegistry(diretorio_chaves)
+    ms_lance.limite_usuarios.taxa = 0
+
+    def assinar(id_leilao, usuario, campo, valor):
+        return utils.build_signed_message(chaves[usuario], {
+            "id_leilao": id_leilao, "id_usuario": usuario, campo: valor, **utils.carimbo_lance()})
+
+    modos = {
+        'comum': ('leilao_comum', [assinar('leilao_comum', usuario, 'valor', valor)
+                                   for usuario, valor in disputa_manual(maximos)]),
+        'automatico': ('leilao_automatico', [assinar('leilao_automatico', usuario, 'maximo', maximo)
+                                             for usuario, maximo in maximos.items()]),
+    }
+
+    resultados = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        threading.Thread(target=lambda: ms_lance.run(precarregar=False), daemon=True).start()
+        while ms_lance.consumidor is None:
+            time.sleep(0.01)
+        channel = utils.get_rabbitmq_channel()
+        for id_leilao, _ in modos.values():
+            corpo, content_type = utils.encode_event({"id_leilao": id_leilao, "descricao": "bench"})
+            utils.publish('leilao_iniciado', '', corpo, utils.event_properties(content_type))
+        while len(ms_lance.leiloes_ativos) < len(modos):
+            time.sleep(0.01)
+
+        consumidor = ms_lance.consumidor
+        for modo, (id_leilao, lances) in modos.items():
+            validados = channel.queue_declare(queue='lance_validado', passive=True).method.message_count
+            acks_iniciais = consumidor.stats()['acks']
+            exchange, routing_key = utils.route_bid(id_leilao)
+            inicio = time.perf_counter()
+            for body, properties in lances:
+                utils.publish(exchange, routing_key, body, properties)
+            while consumidor.stats()['acks'] - acks_iniciais < len(lances):
+                time.sleep(0.001)
+            decorrido = time.perf_counter() - inicio
+            resultados[modo] = {
+                "lances": len(lances),
+                "validados": channel.queue_declare(queue='lance_validado', passive=True).method.message_count
+                - validados,
+                "segundos": decorrido,
+                "final": ms_lance.maiores_lances[id_leilao],
+            }
+        consumidor.channel.connection.add_callback_threadsafe(consumidor.channel.stop_consuming)
+
+    segundo, primeiro = sorted(maximos.items(), key=lambda item: item[1])[-2:]
+    print(f"{args.usuarios} usuários, {args.alg}; maior máximo {primeiro[1]} ({primeiro[0]}), "
+          f"segundo {segundo[1]} ({segundo[0]})")
+    for modo, r in resultados.items():
+        print(f"{modo:>10}: {r['lances']:6d} lances assinados, {r['validados']:6d} lance_validado, "
+              f"{r['segundos'] * 1e3:8.1f} ms | vencedor {r['final']['id_usuario']} "
+              f"a R${r['final']['valor']}")
+    utils.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Custo na thread do consumidor: print síncrono vs. logging pela fila.
+
+Mede o tempo por lance inválido (o caso mais verboso) de:
+  - print das quatro linhas antigas para um arquivo;
+  - log JSON sem limite (só formata a mensagem e enfileira);
+  - log JSON limitado, com o registro suprimido pelo limite de taxa.
+O throughput ponta a ponta com logging ligado/desligado está em
+benchmarks.pipeline_memoria --log.
+"""
+import argparse
+import contextlib
+import logging
+import tempfile
+import time
+
+import logs
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        funcao(i)
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def com_print(i):
+    print(f"MS Lance: Lance de user_x no leilão leilao_001 de R${i} é INVÁLIDO.")
+    print("  - Leilão Ativo: True")
+    print(f"  - Lance Maior: False (Atual: {i + 1})")
+    print("  - Assinatura válida: True")
+
+
+def com_log(logger):
+    def registrar(i):
+        logger.info('lance_invalido', extra={'campos': {
+            'id_leilao': 'leilao_001', 'id_usuario': 'user_x', 'valor': i, 'motivo': 'lance_baixo',
+            'leilao_ativo': True, 'lance_maior': False, 'valor_atual': i + 1,
+            'assinatura_valida': True}})
+    return registrar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=20000)
+    args = parser.parse_args()
+    n = args.repeticoes
+
+    with tempfile.TemporaryFile('w') as arquivo:
+        with contextlib.redirect_stdout(arquivo):
+            us_print = medir(com_print, n)
+        logs.configurar('bench', nivel='INFO', formato='json', destino=arquivo)
+        us_completo = medir(com_log(logs.limitado('bench.completo', taxa=0)), n)
+        us_limitado = medir(com_log(logs.limitado('bench.limitado', taxa=20)), n)
+        desligado = logs.limitado('bench.desligado', taxa=0)
+        desligado.logger.setLevel(logging.WARNING)
+        us_desligado = medir(com_log(desligado), n)
+        logs.parar()
+
+    print(f"{'print (4 linhas, síncrono)':<36}{us_print:8.2f} us/lance")
+    print(f"{'log JSON pela fila, sem limite':<36}{us_completo:8.2f} us/lance")
+    print(f"{'log JSON limitado (suprimido)':<36}{us_limitado:8.2f} us/lance")
+    print(f"{'log abaixo do nível':<36}{us_desligado:8.2f} us/lance")
+
+
+if __name__ == '__main__':
+    main()
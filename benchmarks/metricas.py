@@ -0,0 +1,45 @@
+"""Custo da instrumentação: ns por incremento/observação e por coleta do /metrics."""
+import argparse
+import time
+
+import metricas
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeticoes', type=int, default=1000000)
+    args = parser.parse_args()
+    n = args.repeticoes
+
+    registro = metricas.Registro()
+    contador = registro.contador('bench_total', 'bench', ['resultado'])
+    histograma = registro.histograma('bench_segundos', 'bench', ['estagio'])
+    serie_contador = contador.rotulos('valido')
+    serie_histograma = histograma.rotulos('verificacao')
+
+    resultados = [
+        ("perf_counter()", medir(time.perf_counter, n)),
+        ("contador (série guardada)", medir(serie_contador.inc, n)),
+        ("contador (rotulos() a cada vez)", medir(lambda: contador.rotulos('valido').inc(), n)),
+        ("histograma (série guardada)", medir(lambda: serie_histograma.observar(0.0004), n)),
+        ("estágio cronometrado (2x perf_counter + observar)",
+         medir(lambda: serie_histograma.observar(-time.perf_counter() + time.perf_counter()), n)),
+    ]
+    for i in range(50):
+        contador.rotulos(f"r{i}").inc()
+        histograma.rotulos(f"e{i}").observar(0.001)
+    resultados.append(("coleta /metrics (100 séries)", medir(registro.exportar, max(1, n // 1000))))
+
+    for nome, ns in resultados:
+        print(f"{nome:<52}{ns:10.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Notificações roteadas/s: MS Notificação com threads vs. asyncio.
+
+Enche a fila lance_validado com N eventos, sobe o MS Notificação no runtime
+escolhido (saída descartada) e mede o tempo até a fila esvaziar.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import utils
+
+
+def encher_fila(n):
+    for i in range(n):
+        utils.publish('', 'lance_validado', json.dumps({
+            "id_leilao": f"leilao_{i % 50:03d}", "id_usuario": "user_bench", "valor": float(i)
+        }))
+
+
+def mensagens_na_fila(channel):
+    return channel.queue_declare(queue='lance_validado', durable=True, passive=True).method.message_count
+
+
+def medir(runtime, n, concorrencia):
+    channel = utils.get_rabbitmq_channel()
+    channel.queue_declare(queue='lance_validado', durable=True)
+    channel.queue_purge(queue='lance_validado')
+    encher_fila(n)
+
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ms_notif.py')
+    processo = subprocess.Popen(
+        [sys.executable, script, '--runtime', runtime, '--concorrencia', str(concorrencia)],
+        stdout=subprocess.DEVNULL
+    )
+    inicio = time.perf_counter()
+    while mensagens_na_fila(channel) > 0:
+        time.sleep(0.02)
+    decorrido = time.perf_counter() - inicio
+    processo.terminate()
+    processo.wait()
+    channel.connection.close()
+    return n / decorrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mensagens', type=int, default=20000)
+    parser.add_argument('--concorrencia', type=int, default=100)
+    args = parser.parse_args()
+
+    for runtime in ('threads', 'asyncio'):
+        vazao = medir(runtime, args.mensagens, args.concorrencia)
+        print(f"{runtime:<8} {vazao:10.0f} notificações/s")
+    utils.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Pipeline completo num processo só, sobre o broker em memória.
+
+Sobe MS Lance (verificação serial) e MS Notificação (runtime com threads)
+em threads, anuncia um leilão, envia N lances assinados e mede o tempo até
+todas as notificações chegarem. Sem rede nem RabbitMQ, o resultado reflete
+só o custo dos próprios serviços; --perfil mostra onde cada um gasta tempo.
+
+--log escolhe o logging dos serviços (gravado em JSON num arquivo temporário):
+desligado (só avisos), limitado (padrão dos serviços) ou completo (um
+registro por lance, sem limite de taxa).
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+
+import logs
+import utils
+
+utils.BROKER = 'memoria'
+
+import broker_memoria  # noqa: E402
+import ms_lance  # noqa: E402
+from ms_notif import MSNotificacao  # noqa: E402
+
+
+def em_thread(nome, alvo, perfis):
+    def rodar():
+        if perfis is None:
+            alvo()
+        else:
+            perfis[nome] = cProfile.Profile()
+            perfis[nome].runcall(alvo)
+    thread = threading.Thread(target=rodar, daemon=True, name=nome)
+    thread.start()
+    return thread
+
+
+def parar(channel):
+    channel.connection.add_callback_threadsafe(channel.stop_consuming)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lances', type=int, default=5000)
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default='ed25519')
+    parser.add_argument('--perfil', action='store_true', help='cProfile de cada serviço')
+    parser.add_argument('--log', choices=('desligado', 'limitado', 'completo'), default='limitado')
+    args = parser.parse_args()
+
+    destino_log = tempfile.TemporaryFile('w+', encoding='utf-8')
+    logs.configurar('pipeline', nivel='WARNING' if args.log == 'desligado' else 'INFO',
+                    formato='json', destino=destino_log)
+    if args.log == 'completo':
+        for nome in ('ms_lance.lances', 'ms_notif.eventos'):
+            logs.limitado(nome).limite.taxa = 0
+
+    diretorio_chaves = tempfile.mkdtemp(prefix='chaves_')
+    clientes = []
+    for i in range(args.clientes):
+        private_key, public_key = utils.generate_keys(args.alg)
+        utils.save_key_to_file(public_key, os.path.join(diretorio_chaves, f"mem_{i:04d}.pem"))
+        clientes.append((f"mem_{i:04d}", private_key))
+    ms_lance.registro_chaves = utils.KeyRegistry(diretorio_chaves)
+    # Poucos clientes mandando milhares de lances: o limite por usuário recusaria quase todos
+    ms_lance.limite_usuarios.taxa = 0
+
+    lances = []
+    for i in range(args.lances):
+        user_id, private_key = clientes[i % len(clientes)]
+        lances.append(utils.build_signed_message(
+            private_key, {"id_leilao": "leilao_mem", "id_usuario": user_id, "valor": float(i + 1),
+                          **utils.carimbo_lance()}))
+
+    perfis = {} if args.perfil else None
+    recebidas = 0
+    todas = threading.Event()
+    channel = utils.get_rabbitmq_channel()
+    utils.setup_queues(channel)
+    fila = channel.queue_declare(queue='', exclusive=True).method.queue
+    channel.queue_bind(exchange='notificacao_leilao', queue=fila, routing_key='leilao.*')
+
+    def notificacao(ch, method, properties, body):
+        nonlocal recebidas
+        recebidas += 1
+        if recebidas == args.lances:
+            todas.set()
+            ch.stop_consuming()
+
+    channel.basic_consume(queue=fila, on_message_callback=notificacao, auto_ack=True)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        em_thread('ms_lance', lambda: ms_lance.run(precarregar=False), perfis)
+        ms_notif = MSNotificacao()
+        em_thread('ms_notif.lance', ms_notif.consumir_lance_validado, perfis)
+        em_thread('ms_notif.vencedor', ms_notif.consumir_leilao_vencedor, perfis)
+        em_thread('assinante', channel.start_consuming, None)
+        while ms_lance.consumidor is None or ms_notif.consumidor_vencedor is None:
+            time.sleep(0.01)
+
+        corpo, content_type = utils.encode_event({"id_leilao": "leilao_mem", "descricao": "bench"})
+        utils.publish('leilao_iniciado', '', corpo, utils.event_properties(content_type))
+        while 'leilao_mem' not in ms_lance.leiloes_ativos:
+            time.sleep(0.01)
+
+        inicio = time.perf_counter()
+        for body, properties in lances:
+            exchange, routing_key = utils.route_bid('leilao_mem')
+            utils.publish(exchange, routing_key, body, properties)
+        completo = todas.wait(60)
+        decorrido = time.perf_counter() - inicio
+
+        parar(ms_lance.consumidor.channel)
+        parar(ms_notif.channel)
+        parar(ms_notif.consumidor_vencedor.channel)
+        time.sleep(0.2)
+
+    logs.parar()
+    destino_log.seek(0)
+    linhas_log = sum(1 for _ in destino_log)
+    print(f"{recebidas}/{args.lances} notificações em {decorrido:.2f} s "
+          f"({recebidas / decorrido:.0f} lances/s ponta a ponta, {args.alg}, "
+          f"log {args.log}: {linhas_log} linhas)"
+          + ("" if completo else " - INCOMPLETO"))
+    print("Broker: " + " | ".join(f"{k}={v}" for k, v in broker_memoria.broker.stats().items()))
+    for nome, perfil in (perfis or {}).items():
+        print(f"\n=== {nome} ===")
+        pstats.Stats(perfil).sort_stats('cumulative').print_stats(15)
+    utils.close_pool()
+
+
+if __name__ == '__main__':
+    main()
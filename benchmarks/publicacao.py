@@ -0,0 +1,51 @@
+"""Mensagens/s publicando com conexão nova por mensagem vs. pool de conexões."""
+import argparse
+import time
+
+import utils
+
+FILA = 'bench_publicacao'
+
+
+def publicar_conexao_nova(n, corpo):
+    """Comportamento antigo: um BlockingConnection por publicação."""
+    inicio = time.perf_counter()
+    for _ in range(n):
+        channel = utils.get_rabbitmq_channel()
+        channel.basic_publish(exchange='', routing_key=FILA, body=corpo)
+        # O código antigo vazava a conexão; aqui fechamos para não esgotar o broker
+        channel.connection.close()
+    return n / (time.perf_counter() - inicio)
+
+
+def publicar_pool(n, corpo):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        utils.publish(exchange='', routing_key=FILA, body=corpo)
+    return n / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mensagens', type=int, default=1000)
+    parser.add_argument('--tamanho', type=int, default=128, help='bytes por mensagem')
+    args = parser.parse_args()
+
+    corpo = b'x' * args.tamanho
+    channel = utils.get_rabbitmq_channel()
+    channel.queue_declare(queue=FILA, auto_delete=False)
+
+    antes = publicar_conexao_nova(args.mensagens, corpo)
+    depois = publicar_pool(args.mensagens, corpo)
+
+    channel.queue_delete(queue=FILA)
+    channel.connection.close()
+    utils.close_pool()
+
+    print(f"Conexão por mensagem: {antes:10.1f} msg/s")
+    print(f"Pool de conexões:     {depois:10.1f} msg/s")
+    print(f"Ganho:                {depois / antes:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
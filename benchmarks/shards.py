@@ -0,0 +1,86 @@
+"""Vazão do MS Lance particionado em 1..N shards (sem broker).
+
+Gera lances assinados para vários leilões, particiona com utils.shard_for e
+processa cada partição num processo com o mesmo trabalho do caminho serial
+(verificação da assinatura + decisão contra o maior lance do leilão).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+import utils
+
+
+def gerar_lances(total, leiloes, usuarios, esquema):
+    chaves = [utils.generate_keys(esquema) for _ in range(usuarios)]
+    pems = [utils.serialize_public_key(public_key) for _, public_key in chaves]
+    lances = []
+    for i in range(total):
+        usuario = random.randrange(usuarios)
+        dados = {
+            "id_leilao": f"leilao_{random.randrange(leiloes):04d}",
+            "id_usuario": f"user_{usuario}",
+            "valor": round(random.uniform(1, total), 2),
+        }
+        payload = utils.encode_payload(dados)
+        lances.append((dados["id_leilao"], usuario, dados["valor"], payload,
+                       utils.sign_message(chaves[usuario][0], payload)))
+    return pems, lances
+
+
+def processar_shard(pems, lances, esquema, resultado):
+    chaves = [utils.deserialize_public_key(pem) for pem in pems]
+    maiores = {}
+    inicio = time.perf_counter()
+    aceitos = 0
+    for id_leilao, usuario, valor, payload, assinatura in lances:
+        ass_valida = utils.verify_signature(chaves[usuario], assinatura, payload, esquema)
+        if ass_valida and valor > maiores.get(id_leilao, 0):
+            maiores[id_leilao] = valor
+            aceitos += 1
+    resultado.put((time.perf_counter() - inicio, aceitos))
+
+
+def executar(num_shards, pems, lances, esquema):
+    particoes = [[] for _ in range(num_shards)]
+    for lance in lances:
+        particoes[utils.shard_for(lance[0], num_shards)].append(lance)
+    resultado = multiprocessing.Queue()
+    processos = [multiprocessing.Process(target=processar_shard, args=(pems, particao, esquema, resultado))
+                 for particao in particoes]
+    inicio = time.perf_counter()
+    for processo in processos:
+        processo.start()
+    aceitos = sum(resultado.get()[1] for _ in processos)
+    for processo in processos:
+        processo.join()
+    return len(lances) / (time.perf_counter() - inicio), aceitos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lances', type=int, default=20000)
+    parser.add_argument('--leiloes', type=int, default=256)
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--max-shards', type=int, default=os.cpu_count())
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default=utils.DEFAULT_SCHEME)
+    args = parser.parse_args()
+
+    random.seed(7)
+    print(f"Gerando {args.lances} lances assinados ({args.alg})...")
+    pems, lances = gerar_lances(args.lances, args.leiloes, args.usuarios, args.alg)
+
+    base = None
+    shards = 1
+    while shards <= args.max_shards:
+        vazao, aceitos = executar(shards, pems, lances, args.alg)
+        base = base or vazao
+        print(f"shards={shards:<3} {vazao:10.0f} lances/s  speedup={vazao / base:5.2f}x  "
+              f"eficiência={vazao / base / shards:5.0%}  aceitos={aceitos}")
+        shards *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Custo do WAL do MS Lance: gravação com group commit e tempo de recuperação."""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from wal import LogLances
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lances', type=int, default=2000000)
+    parser.add_argument('--leiloes', type=int, default=1000)
+    parser.add_argument('--lote', type=int, default=256, help='registros por fsync')
+    parser.add_argument('--diretorio', default=None, help='padrão: diretório temporário')
+    args = parser.parse_args()
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='wal_bench_')
+    # Sem snapshots automáticos: mede a recuperação do pior caso (log inteiro)
+    wal = LogLances(diretorio, snapshot_a_cada=float('inf'))
+    wal.recuperar()
+
+    random.seed(1)
+    maiores = {}
+    fsyncs = 0
+    inicio = time.perf_counter()
+    for i in range(args.leiloes):
+        wal.registrar(["i", f"leilao_{i:05d}"])
+    for i in range(args.lances):
+        id_leilao = f"leilao_{random.randrange(args.leiloes):05d}"
+        valor = maiores.get(id_leilao, 0) + round(random.uniform(0.01, 10), 2)
+        maiores[id_leilao] = valor
+        wal.registrar(["l", id_leilao, f"user_{random.randrange(100000):06x}", valor])
+        if wal.pendentes >= args.lote:
+            wal.sincronizar()
+            fsyncs += 1
+    wal.fechar()
+    gravacao = time.perf_counter() - inicio
+    tamanho = sum(os.path.getsize(os.path.join(diretorio, n)) for n in os.listdir(diretorio))
+    print(f"Gravação: {args.lances / gravacao:,.0f} lances/s, {fsyncs} fsyncs, "
+          f"{gravacao / fsyncs * 1e3:.2f} ms por lote de {args.lote}, {tamanho / 1e6:.1f} MB")
+
+    wal = LogLances(diretorio)
+    inicio = time.perf_counter()
+    ativos, recuperados, reaplicados = wal.recuperar()
+    recuperacao = time.perf_counter() - inicio
+    assert all(recuperados[k]["valor"] == v for k, v in maiores.items())
+    print(f"Recuperação só do log: {recuperacao:.2f} s ({reaplicados:,} registros, "
+          f"{reaplicados / recuperacao:,.0f} registros/s)")
+
+    inicio = time.perf_counter()
+    wal.snapshot(ativos, recuperados)
+    print(f"Snapshot: {time.perf_counter() - inicio:.2f} s")
+    wal.fechar()
+
+    wal = LogLances(diretorio)
+    inicio = time.perf_counter()
+    wal.recuperar()
+    print(f"Recuperação a partir do snapshot: {(time.perf_counter() - inicio) * 1e3:.1f} ms")
+    wal.fechar()
+
+    if args.diretorio is None:
+        shutil.rmtree(diretorio)
+
+
+if __name__ == '__main__':
+    main()
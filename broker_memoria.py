@@ -0,0 +1,517 @@
+"""Broker AMQP em memória, no mesmo processo, com a parte da API do pika usada aqui.
+
+Substitui o RabbitMQ quando LEILAO_BROKER=memoria (ver utils.open_connection):
+exchanges default/direct/fanout/topic, filas duráveis/exclusivas, basic_qos
+(por consumidor, como no RabbitMQ), basic_consume, basic_publish e
+ack/nack/reject com as mesmas regras de delivery tag. Cada Conexao imita a
+BlockingConnection: as entregas e os callbacks agendados só rodam dentro de
+process_data_events/start_consuming, na thread dona da conexão.
+
+Nada é persistido, e não há heartbeats, publisher confirms reais nem
+mandatory/return. Como o broker só existe dentro do processo, os serviços
+precisam rodar juntos (ver benchmarks/pipeline_memoria.py); o runtime
+asyncio do MS Notificação e o ReliablePublisher continuam exigindo RabbitMQ.
+Serve para benchmarks determinísticos e para testes sem broker.
+"""
+import heapq
+import itertools
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from functools import partial
+from types import SimpleNamespace
+
+import pika
+from pika import spec
+from pika.exceptions import ChannelClosedByBroker, ChannelWrongStateError, ConnectionWrongStateError
+
+
+def _padrao_topic(chave):
+    """Regex de uma binding key topic, para casar com '.' + routing key.
+
+    Cada palavra consome o próprio ponto à esquerda, então '#' (zero ou mais
+    palavras) não precisa de tratamento especial para os separadores.
+    """
+    partes = []
+    for palavra in chave.split('.'):
+        if palavra == '#':
+            partes.append(r'(?:\.[^.]*)*')
+        elif palavra == '*':
+            partes.append(r'\.[^.]*')
+        else:
+            partes.append(r'\.' + re.escape(palavra))
+    return re.compile(''.join(partes) + r'\Z')
+
+
+class _Mensagem:
+    __slots__ = ('exchange', 'routing_key', 'body', 'properties', 'redelivered')
+
+    def __init__(self, exchange, routing_key, body, properties):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.redelivered = False
+
+
+class _Fila:
+    def __init__(self, nome, durable, dona):
+        self.nome = nome
+        self.durable = durable
+        # Conexão dona de uma fila exclusiva (apagada quando ela fecha)
+        self.dona = dona
+        self.mensagens = deque()
+        self.consumidores = []
+        self.proximo = 0
+
+
+class _Consumidor:
+    __slots__ = ('canal', 'tag', 'fila', 'callback', 'auto_ack', 'prefetch', 'em_voo')
+
+    def __init__(self, canal, tag, fila, callback, auto_ack, prefetch):
+        self.canal = canal
+        self.tag = tag
+        self.fila = fila
+        self.callback = callback
+        self.auto_ack = auto_ack
+        self.prefetch = prefetch
+        self.em_voo = 0
+
+    def livre(self):
+        return self.auto_ack or not self.prefetch or self.em_voo < self.prefetch
+
+
+class BrokerMemoria:
+    """Estado do broker: exchanges, bindings e filas, protegido por um lock."""
+
+    TIPOS = ('direct', 'fanout', 'topic')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.exchanges = {'': 'direct'}
+        # exchange -> lista de (fila, binding key)
+        self.bindings = {}
+        self.filas = {}
+        self._padroes = {}
+        self.publicadas = 0
+        self.descartadas = 0
+
+    def _destinos(self, exchange, routing_key):
+        tipo = self.exchanges.get(exchange)
+        if tipo is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+        if exchange == '':
+            return [routing_key] if routing_key in self.filas else []
+        destinos = []
+        for fila, chave in self.bindings.get(exchange, ()):
+            if tipo == 'fanout':
+                casa = True
+            elif tipo == 'direct':
+                casa = chave == routing_key
+            else:
+                padrao = self._padroes.get(chave)
+                if padrao is None:
+                    padrao = self._padroes[chave] = _padrao_topic(chave)
+                casa = padrao.match('.' + routing_key) is not None
+            if casa and fila not in destinos:
+                destinos.append(fila)
+        return destinos
+
+    def publicar(self, exchange, routing_key, body, properties):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self.lock:
+            destinos = self._destinos(exchange, routing_key)
+            self.publicadas += 1
+            if not destinos:
+                self.descartadas += 1
+            for nome in destinos:
+                fila = self.filas[nome]
+                fila.mensagens.append(_Mensagem(exchange, routing_key, body, properties))
+                self.despachar(fila)
+
+    def despachar(self, fila):
+        """Entrega mensagens da fila, em round-robin, aos consumidores com prefetch livre."""
+        while fila.mensagens and fila.consumidores:
+            n = len(fila.consumidores)
+            for i in range(n):
+                consumidor = fila.consumidores[(fila.proximo + i) % n]
+                if consumidor.livre():
+                    fila.proximo = (fila.proximo + i + 1) % n
+                    break
+            else:
+                return
+            mensagem = fila.mensagens.popleft()
+            consumidor.canal._receber(consumidor, fila, mensagem)
+
+    def requeue(self, fila, mensagens):
+        """Devolve mensagens ao início da fila, na ordem original, como redelivered."""
+        for mensagem in reversed(mensagens):
+            mensagem.redelivered = True
+            fila.mensagens.appendleft(mensagem)
+        if fila.nome in self.filas:
+            self.despachar(fila)
+
+    def fechar_conexao(self, conexao):
+        with self.lock:
+            for nome, fila in list(self.filas.items()):
+                if fila.dona is conexao:
+                    self._apagar_fila(nome)
+
+    def _apagar_fila(self, nome):
+        fila = self.filas.pop(nome)
+        for exchange, ligacoes in self.bindings.items():
+            self.bindings[exchange] = [(f, k) for f, k in ligacoes if f != nome]
+        return fila
+
+    def stats(self):
+        with self.lock:
+            return {
+                "publicadas": self.publicadas,
+                "descartadas": self.descartadas,
+                "filas": len(self.filas),
+                "prontas": sum(len(f.mensagens) for f in self.filas.values()),
+            }
+
+
+class Canal:
+    """Equivalente em memória de pika BlockingChannel."""
+
+    def __init__(self, conexao, numero):
+        self.connection = conexao
+        self.channel_number = numero
+        self._broker = conexao._broker
+        self._prefetch = 0
+        self._tag = 0
+        # delivery_tag -> (consumidor, fila, mensagem)
+        self._nao_confirmadas = {}
+        self._consumidores = {}
+        self._consumindo = False
+        self._aberto = True
+
+    @property
+    def is_open(self):
+        return self._aberto and self.connection.is_open
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    @property
+    def consumer_tags(self):
+        return list(self._consumidores)
+
+    def _verificar_aberto(self):
+        if not self.is_open:
+            raise ChannelWrongStateError('Channel is closed.')
+
+    def _falhar(self, codigo, texto):
+        """Erro de protocolo: como no RabbitMQ, o broker fecha o canal."""
+        self._fechar()
+        raise ChannelClosedByBroker(codigo, texto)
+
+    # Declarações
+
+    def exchange_declare(self, exchange, exchange_type='direct', passive=False, durable=False,
+                         auto_delete=False, internal=False, arguments=None, callback=None):
+        self._verificar_aberto()
+        exchange_type = getattr(exchange_type, 'value', exchange_type)
+        with self._broker.lock:
+            atual = self._broker.exchanges.get(exchange)
+            if atual is None:
+                if passive:
+                    self._falhar(404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+                if exchange_type not in BrokerMemoria.TIPOS:
+                    self._falhar(503, f"COMMAND_INVALID - unknown exchange type '{exchange_type}'")
+                self._broker.exchanges[exchange] = exchange_type
+            elif not passive and atual != exchange_type:
+                self._falhar(406, f"PRECONDITION_FAILED - inequivalent arg 'type' for exchange "
+                                  f"'{exchange}' in vhost '/': received '{exchange_type}' but current is '{atual}'")
+        return SimpleNamespace(method=spec.Exchange.DeclareOk())
+
+    def queue_declare(self, queue, passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None, callback=None):
+        self._verificar_aberto()
+        with self._broker.lock:
+            if not queue:
+                queue = f"amq.gen-{uuid.uuid4().hex[:22]}"
+            fila = self._broker.filas.get(queue)
+            if fila is None:
+                if passive:
+                    self._falhar(404, f"NOT_FOUND - no queue '{queue}' in vhost '/'")
+                fila = _Fila(queue, durable, self.connection if exclusive else None)
+                self._broker.filas[queue] = fila
+            elif fila.dona is not None and fila.dona is not self.connection:
+                self._falhar(405, f"RESOURCE_LOCKED - cannot obtain exclusive access to locked queue '{queue}'")
+            return SimpleNamespace(method=spec.Queue.DeclareOk(
+                queue, len(fila.mensagens), len(fila.consumidores)))
+
+    def _fila(self, nome):
+        fila = self._broker.filas.get(nome)
+        if fila is None:
+            self._falhar(404, f"NOT_FOUND - no queue '{nome}' in vhost '/'")
+        return fila
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None, callback=None):
+        self._verificar_aberto()
+        routing_key = queue if routing_key is None else routing_key
+        with self._broker.lock:
+            self._fila(queue)
+            if exchange not in self._broker.exchanges:
+                self._falhar(404, f"NOT_FOUND - no exchange '{exchange}' in vhost '/'")
+            ligacoes = self._broker.bindings.setdefault(exchange, [])
+            if (queue, routing_key) not in ligacoes:
+                ligacoes.append((queue, routing_key))
+        return SimpleNamespace(method=spec.Queue.BindOk())
+
+    def queue_unbind(self, queue, exchange=None, routing_key=None, arguments=None, callback=None):
+        self._verificar_aberto()
+        routing_key = queue if routing_key is None else routing_key
+        with self._broker.lock:
+            ligacoes = self._broker.bindings.get(exchange, [])
+            if (queue, routing_key) in ligacoes:
+                ligacoes.remove((queue, routing_key))
+        return SimpleNamespace(method=spec.Queue.UnbindOk())
+
+    def queue_purge(self, queue, callback=None):
+        self._verificar_aberto()
+        with self._broker.lock:
+            fila = self._fila(queue)
+            total = len(fila.mensagens)
+            fila.mensagens.clear()
+        return SimpleNamespace(method=spec.Queue.PurgeOk(total))
+
+    def queue_delete(self, queue, if_unused=False, if_empty=False, callback=None):
+        self._verificar_aberto()
+        with self._broker.lock:
+            if queue not in self._broker.filas:
+                return SimpleNamespace(method=spec.Queue.DeleteOk(0))
+            fila = self._broker._apagar_fila(queue)
+            for consumidor in fila.consumidores:
+                consumidor.canal._consumidores.pop(consumidor.tag, None)
+        return SimpleNamespace(method=spec.Queue.DeleteOk(len(fila.mensagens)))
+
+    # Consumo e publicação
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False, callback=None):
+        """Vale para os consumidores criados depois (por consumidor, como no RabbitMQ)."""
+        self._verificar_aberto()
+        self._prefetch = prefetch_count
+
+    def confirm_delivery(self):
+        """Publicações em memória nunca se perdem: o modo confirm não muda nada."""
+        self._verificar_aberto()
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._verificar_aberto()
+        try:
+            self._broker.publicar(exchange, routing_key, body, properties or pika.BasicProperties())
+        except ChannelClosedByBroker:
+            self._fechar()
+            raise
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None, callback=None):
+        self._verificar_aberto()
+        with self._broker.lock:
+            fila = self._fila(queue)
+            tag = consumer_tag or f"ctag{self.channel_number}.{uuid.uuid4().hex[:16]}"
+            consumidor = _Consumidor(self, tag, fila, on_message_callback, auto_ack, self._prefetch)
+            self._consumidores[tag] = consumidor
+            fila.consumidores.append(consumidor)
+            self._broker.despachar(fila)
+        return tag
+
+    def basic_cancel(self, consumer_tag):
+        with self._broker.lock:
+            consumidor = self._consumidores.pop(consumer_tag, None)
+            if consumidor is not None and consumidor in consumidor.fila.consumidores:
+                consumidor.fila.consumidores.remove(consumidor)
+        return []
+
+    def _receber(self, consumidor, fila, mensagem):
+        """Chamado pelo broker, com o lock: reserva a delivery tag e agenda a entrega."""
+        self._tag += 1
+        if not consumidor.auto_ack:
+            consumidor.em_voo += 1
+            self._nao_confirmadas[self._tag] = (consumidor, fila, mensagem)
+        self.connection._eventos.put(partial(self._entregar, consumidor, self._tag, mensagem))
+
+    def _entregar(self, consumidor, delivery_tag, mensagem):
+        # Cancelado ou fechado depois do despacho: fica sem ack até o canal
+        # fechar e então volta para a fila, como no RabbitMQ
+        if not self.is_open or consumidor.tag not in self._consumidores:
+            return
+        metodo = spec.Basic.Deliver(consumidor.tag, delivery_tag, mensagem.redelivered,
+                                    mensagem.exchange, mensagem.routing_key)
+        consumidor.callback(self, metodo, mensagem.properties, mensagem.body)
+
+    def _liquidar(self, delivery_tag, multiple):
+        """Remove e devolve as entregas cobertas por um ack/nack (regras do RabbitMQ)."""
+        if multiple and delivery_tag == 0:
+            tags = list(self._nao_confirmadas)
+        elif delivery_tag not in self._nao_confirmadas:
+            self._falhar(406, f"PRECONDITION_FAILED - unknown delivery tag {delivery_tag}")
+        elif multiple:
+            tags = [t for t in self._nao_confirmadas if t <= delivery_tag]
+        else:
+            tags = [delivery_tag]
+        entregas = [self._nao_confirmadas.pop(t) for t in sorted(tags)]
+        for consumidor, _, _ in entregas:
+            consumidor.em_voo -= 1
+        return entregas
+
+    def _redespachar(self, entregas, requeue):
+        filas = []
+        por_fila = {}
+        for _, fila, mensagem in entregas:
+            if fila.nome not in por_fila:
+                por_fila[fila.nome] = []
+                filas.append(fila)
+            por_fila[fila.nome].append(mensagem)
+        for fila in filas:
+            if requeue:
+                self._broker.requeue(fila, por_fila[fila.nome])
+            elif fila.nome in self._broker.filas:
+                self._broker.despachar(fila)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._verificar_aberto()
+        with self._broker.lock:
+            self._redespachar(self._liquidar(delivery_tag, multiple), requeue=False)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self._verificar_aberto()
+        with self._broker.lock:
+            self._redespachar(self._liquidar(delivery_tag, multiple), requeue)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+    def start_consuming(self):
+        self._consumindo = True
+        while self._consumindo and self._consumidores and self.is_open:
+            self.connection._processar(self.connection._espera_maxima)
+
+    def stop_consuming(self, consumer_tag=None):
+        for tag in ([consumer_tag] if consumer_tag else list(self._consumidores)):
+            self.basic_cancel(tag)
+        self._consumindo = False
+
+    def _fechar(self):
+        with self._broker.lock:
+            if not self._aberto:
+                return
+            self._aberto = False
+            for tag in list(self._consumidores):
+                self.basic_cancel(tag)
+            entregas = [self._nao_confirmadas.pop(t) for t in sorted(self._nao_confirmadas)]
+            self._redespachar(entregas, requeue=True)
+        self._consumindo = False
+
+    def close(self, reply_code=0, reply_text='Normal shutdown'):
+        self._verificar_aberto()
+        self._fechar()
+
+
+class Conexao:
+    """Equivalente em memória de pika BlockingConnection."""
+
+    _espera_maxima = 0.5
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._eventos = queue.Queue()
+        self._timers = []
+        self._seq = itertools.count()
+        self._cancelados = set()
+        self._canais = []
+        self._aberta = True
+
+    @property
+    def is_open(self):
+        return self._aberta
+
+    @property
+    def is_closed(self):
+        return not self._aberta
+
+    def channel(self, channel_number=None):
+        if not self._aberta:
+            raise ConnectionWrongStateError('Connection is closed.')
+        canal = Canal(self, channel_number or len(self._canais) + 1)
+        self._canais.append(canal)
+        return canal
+
+    def call_later(self, delay, callback):
+        timer = next(self._seq)
+        heapq.heappush(self._timers, (time.monotonic() + delay, timer, callback))
+        return timer
+
+    def remove_timeout(self, timeout_id):
+        self._cancelados.add(timeout_id)
+
+    def add_callback_threadsafe(self, callback):
+        self._eventos.put(callback)
+
+    def _rodar_timers(self):
+        agora = time.monotonic()
+        while self._timers and self._timers[0][0] <= agora:
+            _, timer, callback = heapq.heappop(self._timers)
+            if timer in self._cancelados:
+                self._cancelados.discard(timer)
+            else:
+                callback()
+
+    def _processar(self, espera):
+        """Roda timers vencidos e eventos, esperando até 'espera' segundos pelo primeiro."""
+        self._rodar_timers()
+        if self._timers:
+            espera = max(0.0, min(espera, self._timers[0][0] - time.monotonic()))
+        try:
+            evento = self._eventos.get(timeout=espera) if espera > 0 else self._eventos.get_nowait()
+        except queue.Empty:
+            self._rodar_timers()
+            return
+        evento()
+        while True:
+            try:
+                evento = self._eventos.get_nowait()
+            except queue.Empty:
+                break
+            evento()
+        self._rodar_timers()
+
+    def process_data_events(self, time_limit=0):
+        if not self._aberta:
+            raise ConnectionWrongStateError('Connection is closed.')
+        if not time_limit:
+            self._processar(0)
+            return
+        limite = time.monotonic() + time_limit
+        while self._aberta:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            self._processar(restante)
+
+    def sleep(self, duration):
+        self.process_data_events(duration)
+
+    def close(self, reply_code=200, reply_text='Normal shutdown'):
+        if not self._aberta:
+            raise ConnectionWrongStateError('Connection is closed.')
+        for canal in self._canais:
+            canal._fechar()
+        self._aberta = False
+        self._broker.fechar_conexao(self)
+
+
+broker = BrokerMemoria()
+
+def conectar():
+    """Nova conexão com o broker em memória do processo."""
+    return Conexao(broker)
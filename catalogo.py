@@ -0,0 +1,179 @@
+"""Catálogo persistente de leilões em SQLite.
+
+Guarda os leilões num arquivo local, com índices por status e horário de
+início/fim, para que o MS Leilão consulte apenas as próximas transições e
+pagine a listagem sem carregar tudo em memória. O status gravado sobrevive a
+reinícios: um leilão já 'ativo' não é anunciado de novo.
+"""
+import datetime
+import json
+import sqlite3
+import sys
+import threading
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS leiloes (
+    id_leilao TEXT PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    inicio    REAL NOT NULL,
+    fim       REAL NOT NULL,
+    status    TEXT NOT NULL DEFAULT 'agendado'
+);
+CREATE INDEX IF NOT EXISTS idx_leiloes_status_inicio ON leiloes (status, inicio);
+CREATE INDEX IF NOT EXISTS idx_leiloes_status_fim ON leiloes (status, fim);
+"""
+
+
+def _para_epoch(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.timestamp()
+    if isinstance(valor, str):
+        return datetime.datetime.fromisoformat(valor).timestamp()
+    return float(valor)
+
+
+def _para_dict(linha):
+    id_leilao, descricao, inicio, fim, status = linha
+    return {
+        "id_leilao": id_leilao,
+        "descricao": descricao,
+        "inicio": datetime.datetime.fromtimestamp(inicio),
+        "fim": datetime.datetime.fromtimestamp(fim),
+        "status": status,
+    }
+
+
+class CatalogoLeiloes:
+    """Acesso ao catálogo; seguro para uso a partir de várias threads."""
+
+    COLUNAS = "id_leilao, descricao, inicio, fim, status"
+
+    def __init__(self, caminho='leiloes.db'):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(ESQUEMA)
+        self._db.commit()
+
+    def fechar(self):
+        with self._lock:
+            self._db.close()
+
+    def contar(self, status=None):
+        with self._lock:
+            if status is None:
+                return self._db.execute("SELECT COUNT(*) FROM leiloes").fetchone()[0]
+            return self._db.execute(
+                "SELECT COUNT(*) FROM leiloes WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def adicionar(self, id_leilao, descricao, inicio, fim, status='agendado'):
+        """Cadastra (ou substitui) um leilão."""
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO leiloes ({self.COLUNAS}) VALUES (?, ?, ?, ?, ?)",
+                (id_leilao, descricao, _para_epoch(inicio), _para_epoch(fim), status)
+            )
+
+    def importar_jsonl(self, caminho, tamanho_lote=5000):
+        """Importa leilões de um arquivo JSONL; devolve quantos foram gravados.
+
+        Cada linha: {"id_leilao", "descricao", "inicio", "fim"[, "status"]},
+        com datas em ISO 8601 ou epoch. Leilões já existentes mantêm o status.
+        """
+        total = 0
+        lote = []
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                if not linha.strip():
+                    continue
+                item = json.loads(linha)
+                lote.append((
+                    item["id_leilao"], item["descricao"],
+                    _para_epoch(item["inicio"]), _para_epoch(item["fim"]),
+                    item.get("status", "agendado")
+                ))
+                if len(lote) >= tamanho_lote:
+                    total += self._gravar_lote(lote)
+                    lote = []
+        if lote:
+            total += self._gravar_lote(lote)
+        return total
+
+    def _gravar_lote(self, lote):
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO leiloes ({self.COLUNAS}) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id_leilao) DO UPDATE SET descricao = excluded.descricao, "
+                "inicio = excluded.inicio, fim = excluded.fim",
+                lote
+            )
+        return len(lote)
+
+    def obter(self, id_leilao):
+        with self._lock:
+            linha = self._db.execute(
+                f"SELECT {self.COLUNAS} FROM leiloes WHERE id_leilao = ?", (id_leilao,)
+            ).fetchone()
+        return _para_dict(linha) if linha else None
+
+    def atualizar_status(self, id_leilao, status):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE leiloes SET status = ? WHERE id_leilao = ?", (status, id_leilao)
+            )
+
+    def proximas_transicoes(self, ate):
+        """Transições devidas até 'ate' (epoch), em ordem: [(quando, id_leilao, tipo)].
+
+        tipo é 'inicio' para leilões agendados e 'fim' para os ativos (o fim de
+        um leilão agendado só é agendado depois que ele inicia).
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT inicio AS quando, id_leilao, 'inicio' FROM leiloes "
+                "WHERE status = 'agendado' AND inicio <= ? "
+                "UNION ALL "
+                "SELECT fim AS quando, id_leilao, 'fim' FROM leiloes "
+                "WHERE status = 'ativo' AND fim <= ? "
+                "ORDER BY quando",
+                (ate, ate)
+            ).fetchall()
+
+    def listar(self, limite=50, apos=None, status=None):
+        """Uma página de leilões ordenada por id (paginação por chave: 'apos')."""
+        condicoes, parametros = [], []
+        if apos is not None:
+            condicoes.append("id_leilao > ?")
+            parametros.append(apos)
+        if status is not None:
+            condicoes.append("status = ?")
+            parametros.append(status)
+        where = f"WHERE {' AND '.join(condicoes)} " if condicoes else ""
+        with self._lock:
+            linhas = self._db.execute(
+                f"SELECT {self.COLUNAS} FROM leiloes {where}ORDER BY id_leilao LIMIT ?",
+                (*parametros, limite)
+            ).fetchall()
+        return [_para_dict(linha) for linha in linhas]
+
+    def paginas(self, tamanho=50, status=None):
+        """Itera o catálogo página a página."""
+        apos = None
+        while True:
+            pagina = self.listar(tamanho, apos, status)
+            if not pagina:
+                return
+            yield pagina
+            apos = pagina[-1]["id_leilao"]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'importar':
+        print("Uso: python catalogo.py importar <leiloes.jsonl>")
+        sys.exit(1)
+    catalogo = CatalogoLeiloes()
+    print(f"{catalogo.importar_jsonl(sys.argv[2])} leilões importados para {catalogo.caminho}")
+    catalogo.fechar()
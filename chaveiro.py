@@ -0,0 +1,150 @@
+"""Chaveiro local do cliente: identidade (user_id) e chave privada persistidas.
+
+Cada perfil é um arquivo <diretorio>/<perfil>.json com o user_id, o esquema
+de assinatura e a chave privada em PEM (PKCS#8, sem senha), gravado com
+permissão 0600. O cliente carrega a identidade existente e só gera chaves
+quando o perfil ainda não existe; assim reinícios não criam um usuário novo
+nem um .pem novo em public_keys/, e o cache de chaves do MS Lance continua
+válido.
+
+Configuração: LEILAO_CHAVEIRO (diretório, padrão 'chaveiro').
+"""
+import datetime
+import json
+import os
+import time
+import uuid
+
+from cryptography.hazmat.primitives import serialization
+
+import utils
+
+DIRETORIO = os.environ.get('LEILAO_CHAVEIRO', 'chaveiro')
+PERFIL_PADRAO = 'padrao'
+# Uma chave pública com mtime mais antigo que isso é "tocada" ao iniciar, para
+# a limpeza (limpar_chaves.py) saber que ela está em uso; tocar a cada início
+# faria o KeyRegistry do MS Lance reler o arquivo sem necessidade
+INTERVALO_TOQUE = 24 * 3600
+
+
+class ErroEsquema(ValueError):
+    """O perfil existe com outro esquema e a troca de chaves não foi pedida."""
+
+
+class Identidade:
+    """user_id, esquema e par de chaves de um usuário."""
+
+    def __init__(self, user_id, alg, private_key):
+        self.user_id = user_id
+        self.alg = alg
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+
+
+def _caminho(perfil, diretorio):
+    if not perfil or os.sep in perfil or '/' in perfil or perfil.startswith('.'):
+        raise ValueError(f"Nome de perfil inválido: {perfil!r}")
+    return os.path.join(diretorio, f"{perfil}.json")
+
+
+def _gravar(caminho, dados, modo=0o644):
+    """Grava via arquivo temporário + rename: leitores nunca veem o arquivo pela metade."""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    fd = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, modo)
+    try:
+        with os.fdopen(fd, 'wb') as saida:
+            saida.write(dados)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+
+
+def carregar(perfil=PERFIL_PADRAO, diretorio=DIRETORIO):
+    """Identidade salva no perfil, ou None se ele não existir."""
+    try:
+        with open(_caminho(perfil, diretorio), 'rb') as entrada:
+            dados = json.loads(entrada.read())
+    except FileNotFoundError:
+        return None
+    # A chave foi gerada por este cliente e o arquivo é 0600: a validação
+    # da chave RSA (checagem de primalidade) custaria quase o mesmo que gerá-la
+    private_key = serialization.load_pem_private_key(dados["chave_privada"].encode('ascii'),
+                                                     password=None,
+                                                     unsafe_skip_rsa_key_validation=True)
+    return Identidade(dados["user_id"], dados["alg"], private_key)
+
+
+def salvar(identidade, perfil=PERFIL_PADRAO, diretorio=DIRETORIO):
+    pem = identidade.private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    dados = {
+        "user_id": identidade.user_id,
+        "alg": identidade.alg,
+        "chave_privada": pem.decode('ascii'),
+        "criado_em": datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    _gravar(_caminho(perfil, diretorio), json.dumps(dados, indent=2).encode('utf-8'), 0o600)
+
+
+def obter(perfil=PERFIL_PADRAO, alg=None, diretorio=DIRETORIO, rotacionar=False):
+    """Carrega o perfil ou cria um novo. Devolve (identidade, criada).
+
+    alg=None usa o esquema salvo (DEFAULT_SCHEME num perfil novo). Um perfil
+    salvo com outro esquema levanta ErroEsquema, a não ser com rotacionar=True:
+    aí o user_id é mantido e só o par de chaves é trocado (a chave pública
+    publicada muda junto).
+    """
+    identidade = carregar(perfil, diretorio)
+    if identidade is not None and alg in (None, identidade.alg):
+        return identidade, False
+    if identidade is not None and not rotacionar:
+        raise ErroEsquema(f"O perfil {perfil!r} usa {identidade.alg}, não {alg}; "
+                          f"trocar as chaves exige rotacionar")
+    alg = alg or utils.DEFAULT_SCHEME
+    user_id = identidade.user_id if identidade is not None else f"user_{uuid.uuid4().hex[:6]}"
+    private_key, _ = utils.generate_keys(alg)
+    identidade = Identidade(user_id, alg, private_key)
+    salvar(identidade, perfil, diretorio)
+    return identidade, True
+
+
+def publicar_chave(identidade, diretorio_publico):
+    """Garante <diretorio_publico>/<user_id>.pem com a chave pública da identidade.
+
+    Só reescreve se o conteúdo mudou; se não mudou, atualiza o mtime no
+    máximo uma vez a cada INTERVALO_TOQUE.
+    """
+    caminho = os.path.join(diretorio_publico, f"{identidade.user_id}.pem")
+    pem = utils.serialize_public_key(identidade.public_key)
+    try:
+        with open(caminho, 'rb') as entrada:
+            atual = entrada.read()
+    except FileNotFoundError:
+        atual = None
+    if atual != pem:
+        _gravar(caminho, pem)
+    elif time.time() - os.stat(caminho).st_mtime > INTERVALO_TOQUE:
+        os.utime(caminho)
+    return caminho
+
+
+def usuarios(diretorio=DIRETORIO):
+    """user_ids de todos os perfis do chaveiro."""
+    if not os.path.isdir(diretorio):
+        return set()
+    encontrados = set()
+    for nome in os.listdir(diretorio):
+        if not nome.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(diretorio, nome), 'rb') as entrada:
+                encontrados.add(json.loads(entrada.read())["user_id"])
+        except (OSError, ValueError, KeyError):
+            continue
+    return encontrados
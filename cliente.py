@@ -3,120 +3,353 @@ import uuid
 import json
 import threading
 import os
+import argparse
+import sys
+import logging
+import logs
+import datetime
+import time
+import chaveiro
+import lance_automatico
+import pika
 
 PUBLIC_KEYS_DIR = 'public_keys'
+# Segundos após o fim previsto até desistir do anúncio do vencedor
+MARGEM_FIM = 30
+# Deltas do MS Estado guardados enquanto o snapshot não chega
+MAX_DELTAS_PENDENTES = 10000
+# Segundos sem resposta até pedir o snapshot de novo
+ESPERA_SNAPSHOT = 2.0
+
+log = logging.getLogger('cliente')
+
+
+def ler_valor(texto):
+    """Valor digitado como float; None (com aviso) se não for um número finito e positivo."""
+    try:
+        valor = float(texto)
+    except ValueError:
+        valor = None
+    # float() aceita "nan" e "inf", que o MS Lance recusaria
+    if not lance_automatico.valor_valido(valor):
+        print("\nValor inválido!")
+        return None
+    return valor
 
 class ClienteLeilao:
-    def __init__(self):
-        self.user_id = f"user_{uuid.uuid4().hex[:6]}"
-        self.private_key, self.public_key = utils.generate_keys()
+    """Cliente interativo.
+
+    Usa uma única conexão, com uma fila exclusiva ligada à exchange
+    leilao_iniciado e, dinamicamente, a leilao.<id> na notificacao_leilao
+    para cada leilão em que o usuário deu lance. A conexão pertence à thread
+    de consumo (BlockingConnection não é thread-safe): binds, unbinds e
+    publicação de lances feitos pela thread da interface são entregues a ela
+    com add_callback_threadsafe, na ordem em que foram pedidos.
+    """
 
-        public_key_filename = os.path.join(PUBLIC_KEYS_DIR, f"{self.user_id}.pem")
-        utils.save_key_to_file(self.public_key, public_key_filename)
+    def __init__(self, alg=None, perfil=chaveiro.PERFIL_PADRAO,
+                 diretorio_chaveiro=chaveiro.DIRETORIO, rotacionar=False):
+        # perfil=None: identidade descartável, gerada a cada execução.
+        # alg=None: o esquema salvo no perfil
+        if perfil is None:
+            alg = alg or utils.DEFAULT_SCHEME
+            private_key, _ = utils.generate_keys(alg)
+            identidade = chaveiro.Identidade(f"user_{uuid.uuid4().hex[:6]}", alg, private_key)
+        else:
+            identidade, _ = chaveiro.obter(perfil, alg, diretorio_chaveiro, rotacionar)
+        self.user_id = identidade.user_id
+        self.alg = identidade.alg
+        self.private_key, self.public_key = identidade.private_key, identidade.public_key
+
+        chaveiro.publicar_chave(identidade, PUBLIC_KEYS_DIR)
         self.leiloes_disponiveis = {}
         self.leiloes_interessado = set()
+        # id_leilao -> timer que desfaz o bind se o vencedor nunca for anunciado
+        self._expiracoes = {}
+        # correlation_id -> [evento, resposta] das consultas ao MS Histórico
+        self._consultas = {}
+        # Cache do MS Estado: instância e seq do snapshot aplicado, pedido em
+        # aberto e deltas recebidos antes dele
+        self._instancia = None
+        self._seq = 0
+        self._snapshot_id = None
+        self._snapshot_pedido_em = 0.0
+        self._deltas_pendentes = []
+        self.connection = None
+        self.channel = None
+        self.fila = None
+        self._thread = None
         print(f"Cliente inicializado com id: {self.user_id}")
 
+    def conectar(self):
+        """Abre a conexão, declara a fila privada e inicia a thread de consumo."""
+        self.connection = utils.open_connection()
+        self.channel = self.connection.channel()
+        # Inclui as filas de lances (e dos shards), para publicar antes do MS Lance subir
+        utils.setup_queues(self.channel)
+        self.fila = self.channel.queue_declare(queue='', exclusive=True).method.queue
+        self.channel.queue_bind(exchange='leilao_iniciado', queue=self.fila)
+        # Deltas primeiro, snapshot depois: nada entre os dois se perde
+        self.channel.exchange_declare(exchange=utils.EXCHANGE_DELTAS, exchange_type='fanout')
+        self.channel.queue_bind(exchange=utils.EXCHANGE_DELTAS, queue=self.fila)
+        self._instancia = None
+        self._pedir_snapshot()
+        # Reconexão: refaz os binds dos leilões que ainda estão sendo acompanhados
+        self._expiracoes.clear()
+        for id_leilao in self.leiloes_interessado:
+            self._bind(id_leilao)
+        self.channel.basic_consume(queue=self.fila, on_message_callback=self._callback, auto_ack=True)
+        self._thread = threading.Thread(target=self._consumir, daemon=True, name='cliente')
+        self._thread.start()
+
+    def _consumir(self):
+        try:
+            self.channel.start_consuming()
+        except Exception:
+            log.exception('conexao_perdida')
+
+    def _na_conexao(self, funcao):
+        """Executa funcao na thread da conexão, reconectando se ela caiu."""
+        if self._thread is None or not self._thread.is_alive():
+            print("\nConexão com o broker perdida, reconectando...")
+            self.conectar()
+
+        def executar():
+            try:
+                funcao()
+            except Exception:
+                log.exception('operacao_falhou')
+        self.connection.add_callback_threadsafe(executar)
+
     def lance(self, id_leilao, valor):
         
-        channel = utils.get_rabbitmq_channel()
         if id_leilao not in self.leiloes_disponiveis:
             print("\nID de leilão inválido!")
             return
+        valor = ler_valor(valor)
+        if valor is None:
+            return
 
         lance_info = {
             "id_leilao": id_leilao,
             "id_usuario": self.user_id,
-            "valor": float(valor)
+            "valor": valor,
+            **utils.carimbo_lance()
         }
+        self._publicar_lance(lance_info)
+        print(f"Lance de R${valor} enviado para o leilão {id_leilao}.")
 
-        ass = utils.sign_message(self.private_key, lance_info)
-        
-        publication = {
-            "data": lance_info,
-            "assinatura": ass.hex()
+    def lance_automatico(self, id_leilao, maximo):
+        """Um único lance assinado com o valor máximo: o MS Lance cobre os lances dos outros até ele."""
+        if id_leilao not in self.leiloes_disponiveis:
+            print("\nID de leilão inválido!")
+            return
+        maximo = ler_valor(maximo)
+        if maximo is None:
+            return
+
+        lance_info = {
+            "id_leilao": id_leilao,
+            "id_usuario": self.user_id,
+            "maximo": maximo,
+            **utils.carimbo_lance()
         }
+        self._publicar_lance(lance_info)
+        print(f"Lance automático de até R${maximo} enviado para o leilão {id_leilao}.")
 
-        channel.basic_publish(
-            exchange='',
-            routing_key='lance_realizado',
-            body=json.dumps(publication)
-        )
-        print(f"Lance de R${valor} enviado para o leilão {id_leilao}.")
-        
+    def _publicar_lance(self, lance_info):
+        id_leilao = lance_info["id_leilao"]
+        # O payload canônico é assinado uma vez e trafega sem ser reserializado
+        body, properties = utils.build_signed_message(self.private_key, lance_info)
 
+        # O bind é pedido antes da publicação e executado antes dela na thread
+        # da conexão, então a notificação do próprio lance não se perde
         if id_leilao not in self.leiloes_interessado:
             self.checar_notif_leilao(id_leilao)
-            self.leiloes_interessado.add(id_leilao)
-    
-    def checar_novos_leiloes(self):
-        
-        channel = utils.get_rabbitmq_channel()
-        channel.queue_declare (queue= 'leilao_iniciado', durable=True)
-        
-        def callback_novo_leilao(ch , method, properties, body):
-            if not body:
-                return
-            try:
-                data = json.loads(body)
-                leilao_id = data.get('id_leilao')
-                if leilao_id:
-                    self.leiloes_disponiveis[leilao_id] = data
-                    print(f"\nNovo leião disponível! ID: {leilao_id} | {data.get('descricao')}")
-            except json.JSONDecodeError:
-                print(f"Erro ao decodificar JSON") 
-        
-        result = channel.queue_declare(queue='', exclusive=True)
-        queue_name_iniciado = result.method.queue
-        channel.queue_bind(exchange='leilao_iniciado', queue=queue_name_iniciado)
-        channel.basic_consume(queue=queue_name_iniciado, on_message_callback=callback_novo_leilao, auto_ack=True)
-        th_lance = threading.Thread(target=channel.start_consuming, daemon=True)
-        th_lance.start()
+
+        exchange, routing_key = utils.route_bid(id_leilao)
+        self._na_conexao(lambda: self.channel.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=properties
+        ))
 
     def checar_notif_leilao(self, id_leilao):
+        """Passa a receber as notificações do leilão na fila do cliente."""
+        self.leiloes_interessado.add(id_leilao)
+        self._na_conexao(lambda: self._bind(id_leilao))
+        print(f"Inscrito para receber notificações do leilão {id_leilao}.")
 
-        channel = utils.get_rabbitmq_channel()
-        result = channel.queue_declare(queue='', exclusive=True)
-        queue_name = result.method.queue
-        
-        queue_key = f"leilao.{id_leilao}"
-        channel.queue_bind(exchange='notificacao_leilao', queue=queue_name, routing_key=queue_key)
-        
-        def callback_notificacao(ch, method, properties, body):
-            if not body:
+    def _bind(self, id_leilao):
+        self.channel.queue_bind(exchange='notificacao_leilao', queue=self.fila,
+                                routing_key=f"leilao.{id_leilao}")
+        # Leilão encerrado sem lances válidos não anuncia vencedor: o bind é
+        # desfeito de qualquer forma um pouco depois do fim previsto
+        data = self.leiloes_disponiveis.get(id_leilao) or {}
+        if data.get('fim') and id_leilao not in self._expiracoes:
+            try:
+                restante = datetime.datetime.fromisoformat(str(data['fim'])).timestamp() - time.time()
+            except ValueError:
                 return
-            data = json.loads(body)
-            notif_id_leilao = data.get('id_leilao')
-            print(f"\n--- NOTIFICAÇÃO DO LEILÃO {notif_id_leilao} ---")
-            if "id_vencedor" in data:
-                print(f"||LEILÃO ENCERRADO!||\nVencedor: {data['id_vencedor']} com R${data['valor']}.")
-                self.leiloes_disponiveis.pop(notif_id_leilao)
-            else:
-                print(f"Novo lance foi realizado!\nUsuário: {data['id_usuario']}, Valor: R${data['valor']}.")
-            print("---------------------------------")
-        def consume_thread():
-            channel.basic_consume(queue=queue_name, on_message_callback=callback_notificacao, auto_ack=True)
-            channel.start_consuming()
-        
-        th_notif = threading.Thread(target=consume_thread, daemon=True)
-        th_notif.start()
-        print(f"Inscrito para receber notificações do leilão {id_leilao}.")
+            self._expiracoes[id_leilao] = self.connection.call_later(
+                max(0.0, restante) + MARGEM_FIM, lambda: self._unbind(id_leilao))
+
+    def _unbind(self, id_leilao):
+        """Desfaz o bind de um leilão encerrado (roda na thread da conexão)."""
+        timer = self._expiracoes.pop(id_leilao, None)
+        if timer is not None:
+            self.connection.remove_timeout(timer)
+        if id_leilao not in self.leiloes_interessado:
+            return
+        self.leiloes_interessado.discard(id_leilao)
+        self.channel.queue_unbind(queue=self.fila, exchange='notificacao_leilao',
+                                  routing_key=f"leilao.{id_leilao}")
+
+    def _callback(self, ch, method, properties, body):
+        if not body:
+            return
+        try:
+            data = utils.decode_event(properties, body)
+        except ValueError:
+            log.warning('evento_malformado', extra={'campos': {'exchange': method.exchange}})
+            return
+        if properties is not None and properties.correlation_id is not None:
+            # Resposta do MS Histórico (via default exchange, com o reply_to desta fila)
+            consulta = self._consultas.get(properties.correlation_id)
+            if consulta is not None:
+                consulta[1] = data
+                consulta[0].set()
+            elif properties.correlation_id == self._snapshot_id:
+                self._aplicar_snapshot(data)
+        elif method.exchange == utils.EXCHANGE_DELTAS:
+            self._delta(data)
+        elif method.exchange == 'leilao_iniciado':
+            self._novo_leilao(data)
+        else:
+            self._notificacao(data)
+
+    def _novo_leilao(self, data):
+        leilao_id = data.get('id_leilao')
+        if not leilao_id:
+            return
+        # O mesmo leilão chega pelo leilao_iniciado e pelo delta do MS Estado
+        anterior = self.leiloes_disponiveis.get(leilao_id)
+        self.leiloes_disponiveis[leilao_id] = dict(data, maior=anterior.get('maior') if anterior else None)
+        if anterior is None:
+            print(f"\nNovo leião disponível! ID: {leilao_id} | {data.get('descricao')}")
+
+    def _pedir_snapshot(self):
+        """Pede ao MS Estado os leilões ativos; a resposta chega na fila do cliente."""
+        self._snapshot_id = uuid.uuid4().hex
+        self._snapshot_pedido_em = time.monotonic()
+        self.channel.basic_publish(
+            exchange='', routing_key=utils.FILA_SNAPSHOT, body=b'{}',
+            properties=pika.BasicProperties(content_type='application/json', reply_to=self.fila,
+                                            correlation_id=self._snapshot_id))
+
+    def _aplicar_snapshot(self, data):
+        self._snapshot_id = None
+        self._instancia, self._seq = data['instancia'], data['seq']
+        self.leiloes_disponiveis = {leilao['id_leilao']: leilao for leilao in data['leiloes']}
+        pendentes, self._deltas_pendentes = self._deltas_pendentes, []
+        for delta in pendentes:
+            if delta.get('instancia') == self._instancia:
+                self._delta(delta)
+        log.info('snapshot_aplicado', extra={'campos': {
+            'leiloes': len(self.leiloes_disponiveis), 'seq': self._seq, 'deltas_pendentes': len(pendentes)}})
+
+    def _delta(self, data):
+        if data.get('instancia') != self._instancia:
+            # Snapshot ainda não chegou, ou o MS Estado reiniciou e a sequência
+            # recomeçou: guarda o delta e pede (de novo, se demorou) o snapshot
+            self._deltas_pendentes.append(data)
+            del self._deltas_pendentes[:-MAX_DELTAS_PENDENTES]
+            if time.monotonic() - self._snapshot_pedido_em > ESPERA_SNAPSHOT:
+                self._pedir_snapshot()
+            return
+        if data['seq'] <= self._seq:
+            return
+        self._seq = data['seq']
+        id_leilao = data['id_leilao']
+        if data['tipo'] == 'iniciado':
+            self._novo_leilao(data)
+        elif data['tipo'] == 'lance':
+            leilao = self.leiloes_disponiveis.get(id_leilao)
+            if leilao is not None:
+                leilao['maior'] = {"id_usuario": data['id_usuario'], "valor": data['valor']}
+        elif data['tipo'] == 'encerrado':
+            self.leiloes_disponiveis.pop(id_leilao, None)
+            # Leilão sem vencedor não gera notificação: o bind sai aqui
+            self._unbind(id_leilao)
+
+    def _notificacao(self, data):
+        notif_id_leilao = data.get('id_leilao')
+        print(f"\n--- NOTIFICAÇÃO DO LEILÃO {notif_id_leilao} ---")
+        if "id_vencedor" in data:
+            print(f"||LEILÃO ENCERRADO!||\nVencedor: {data['id_vencedor']} com R${data['valor']}.")
+            self.leiloes_disponiveis.pop(notif_id_leilao, None)
+            self._unbind(notif_id_leilao)
+        else:
+            origem = " (automático)" if data.get('automatico') else ""
+            print(f"Novo lance foi realizado{origem}!\nUsuário: {data['id_usuario']}, Valor: R${data['valor']}.")
+        print("---------------------------------")
+
+    def consultar_historico(self, pedido, timeout=5.0):
+        """Consulta o MS Histórico com reply_to na fila do cliente. None se não houver resposta."""
+        correlation_id = uuid.uuid4().hex
+        consulta = self._consultas[correlation_id] = [threading.Event(), None]
+        properties = pika.BasicProperties(content_type='application/json', reply_to=self.fila,
+                                          correlation_id=correlation_id)
+        try:
+            self._na_conexao(lambda: self.channel.basic_publish(
+                exchange='', routing_key=utils.FILA_CONSULTAS,
+                body=json.dumps(pedido).encode('utf-8'), properties=properties))
+            consulta[0].wait(timeout)
+            return consulta[1]
+        finally:
+            self._consultas.pop(correlation_id, None)
+
+    def mostrar_maiores_lances(self, id_leilao, k=5):
+        resposta = self.consultar_historico({"tipo": "top", "id_leilao": id_leilao, "k": k})
+        if resposta is None:
+            print("\nO MS Histórico não respondeu")
+        elif not resposta["ok"]:
+            print(f"\nConsulta recusada: {resposta['erro']}")
+        elif not resposta["resultado"]:
+            print(f"\nNenhum lance registrado no leilão {id_leilao}")
+        else:
+            print(f"\nMaiores lances do leilão {id_leilao}:")
+            for posicao, lance in enumerate(resposta["resultado"], 1):
+                print(f"{posicao}. R${lance['valor']} - {lance['id_usuario']}")
+
+    def encerrar(self):
+        """Para a thread de consumo e fecha a conexão."""
+        if self._thread is not None and self._thread.is_alive():
+            self.connection.add_callback_threadsafe(self.channel.stop_consuming)
+            self._thread.join(timeout=5)
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
 
     def run(self):
-        self.checar_novos_leiloes()
+        self.conectar()
         while True:
             print("\nEscolha:")
             print("-(1)- Listar leilões disponíveis")
             print("-(2)- Realizar um lance")
-            print("-(3)- Encerrar cliente")
+            print("-(3)- Realizar um lance automático (valor máximo)")
+            print("-(4)- Ver maiores lances de um leilão")
+            print("-(5)- Encerrar cliente")
             modo = input("> ")
 
             if modo == '1':
                 if not self.leiloes_disponiveis:
                     print("Não existem leilões disponíveis no momento")
                 else:
-                    for id_leilao, data in self.leiloes_disponiveis.items():
-                        print(f"ID : {id_leilao} | {data['descricao']}")
+                    for id_leilao, data in list(self.leiloes_disponiveis.items()):
+                        maior = data.get('maior')
+                        lance = f" | Maior lance: R${maior['valor']} ({maior['id_usuario']})" if maior else ""
+                        print(f"ID : {id_leilao} | {data['descricao']}{lance}")
 
             
             elif modo == '2':
@@ -126,16 +359,44 @@ class ClienteLeilao:
                 self.lance(id_leilao, valor)
 
             elif modo == '3':
+                print("\n-Lance automático-")
+                id_leilao = input("Id do leilão em que deseja realizar o lance\n> ")
+                maximo = input(f"Até quanto deseja pagar no leilão {id_leilao}?\n> ")
+                self.lance_automatico(id_leilao, maximo)
+
+            elif modo == '4':
+                id_leilao = input("Id do leilão\n> ")
+                self.mostrar_maiores_lances(id_leilao)
+
+            elif modo == '5':
                 break
 
             else:
                 print("\n||Opção invalida||")
 
+        self.encerrar()
         print("\nCliente encerrado")
 
 
 
 if __name__ == '__main__':
-    cliente = ClienteLeilao()
+    parser = argparse.ArgumentParser(description='Cliente de leilão')
+    parser.add_argument('--alg', choices=sorted(utils.SCHEMES), default=os.environ.get('LEILAO_ALG'),
+                        help=f'esquema de assinatura dos lances (padrão: o do perfil; '
+                             f'num perfil novo, {utils.DEFAULT_SCHEME})')
+    parser.add_argument('--rotacionar', action='store_true',
+                        help='troca as chaves do perfil se --alg for outro esquema (mantém o user_id)')
+    parser.add_argument('--perfil', default=os.environ.get('LEILAO_PERFIL', chaveiro.PERFIL_PADRAO),
+                        help='perfil do chaveiro local com a identidade do usuário')
+    parser.add_argument('--efemero', action='store_true',
+                        help='gera uma identidade nova só para esta execução')
+    args = parser.parse_args()
+    # A saída padrão é a interface do cliente: logs só de avisos, no stderr
+    logs.configurar('cliente', nivel=os.environ.get('LEILAO_LOG_NIVEL', 'WARNING').upper(),
+                    formato=logs.FORMATO or 'texto', destino=sys.stderr)
+    try:
+        cliente = ClienteLeilao(args.alg, None if args.efemero else args.perfil, rotacionar=args.rotacionar)
+    except chaveiro.ErroEsquema as erro:
+        parser.error(f"{erro} (use --rotacionar)")
     cliente.run()
     
@@ -0,0 +1,320 @@
+"""Gateway de notificações: uma assinatura AMQP, muitos assinantes locais.
+
+Consome notificacao_leilao (leilao.*) com uma única conexão e fila exclusiva
+e repassa cada evento, num event loop asyncio, aos assinantes conectados:
+  - TCP (--porta-tcp): uma linha JSON por evento. O assinante manda
+    comandos por linha: "+<id_leilao>" assina, "-<id_leilao>" cancela,
+    "*" assina todos os leilões e "-*" cancela essa assinatura.
+  - SSE (--porta-sse): GET /eventos?leiloes=L1,L2 (sem leiloes = todos),
+    com "event: lance" ou "event: vencedor" e o JSON em "data:".
+Assim clientes leves não precisam de conexão nem fila no broker.
+
+O evento é decodificado e serializado uma vez; cada assinante recebe os
+mesmos bytes direto no transporte, sem uma fila própria por assinante. O buffer
+de escrita de cada um é limitado (LIMITE_BUFFER): quem não lê rápido o
+bastante para caber nele é desconectado em vez de acumular memória.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+import logs
+import metricas
+import utils
+import wire
+
+PORTA_TCP = 8765
+PORTA_SSE = 8766
+# Bytes pendentes no transporte de um assinante antes de ele ser derrubado
+LIMITE_BUFFER = 256 * 1024
+MAX_LEILOES_POR_ASSINANTE = 1000
+INTERVALO_HEARTBEAT = 15.0
+
+log = logging.getLogger('gateway')
+
+ASSINANTES = metricas.medidor('gateway_assinantes', 'Assinantes conectados, por protocolo', ['protocolo'])
+EVENTOS = metricas.contador('gateway_eventos_total', 'Eventos recebidos do broker, por tipo', ['tipo'])
+ENTREGAS = metricas.contador('gateway_entregas_total', 'Eventos escritos para assinantes')
+DERRUBADOS = metricas.contador('gateway_assinantes_derrubados_total',
+                               'Assinantes desconectados pelo gateway, por motivo', ['motivo'])
+FANOUT = metricas.histograma('gateway_fanout_segundos', 'Duração da distribuição de um evento')
+
+
+class Assinante:
+    __slots__ = ('transporte', 'protocolo', 'leiloes', 'todos')
+
+    def __init__(self, transporte, protocolo):
+        self.transporte = transporte
+        self.protocolo = protocolo
+        self.leiloes = set()
+        self.todos = False
+
+
+class Gateway:
+    def __init__(self, limite_buffer=LIMITE_BUFFER, loop=None):
+        self.limite_buffer = limite_buffer
+        self.loop = loop or asyncio.new_event_loop()
+        # id_leilao -> assinantes daquele leilão; 'todos' recebe qualquer leilão
+        self.por_leilao = {}
+        self.todos = set()
+        self.assinantes = set()
+        self.connection = None
+        self.channel = None
+        self.encerrando = False
+        self._series_assinantes = {p: ASSINANTES.rotulos(p) for p in ('tcp', 'sse')}
+
+    # --- assinantes ---
+
+    def adicionar(self, assinante):
+        self.assinantes.add(assinante)
+        self._series_assinantes[assinante.protocolo].inc()
+
+    def assinar(self, assinante, id_leilao):
+        if id_leilao in assinante.leiloes:
+            return True
+        if len(assinante.leiloes) >= MAX_LEILOES_POR_ASSINANTE:
+            return False
+        assinante.leiloes.add(id_leilao)
+        self.por_leilao.setdefault(id_leilao, set()).add(assinante)
+        return True
+
+    def assinar_todos(self, assinante):
+        assinante.todos = True
+        self.todos.add(assinante)
+
+    def cancelar_todos(self, assinante):
+        # As assinaturas por leilão continuam valendo
+        assinante.todos = False
+        self.todos.discard(assinante)
+
+    def cancelar(self, assinante, id_leilao):
+        assinante.leiloes.discard(id_leilao)
+        assinantes = self.por_leilao.get(id_leilao)
+        if assinantes is not None:
+            assinantes.discard(assinante)
+            if not assinantes:
+                del self.por_leilao[id_leilao]
+
+    def remover(self, assinante):
+        if assinante not in self.assinantes:
+            return
+        self.assinantes.discard(assinante)
+        self.todos.discard(assinante)
+        for id_leilao in list(assinante.leiloes):
+            self.cancelar(assinante, id_leilao)
+        self._series_assinantes[assinante.protocolo].dec()
+
+    def derrubar(self, assinante, motivo):
+        DERRUBADOS.rotulos(motivo).inc()
+        self.remover(assinante)
+        # abort descarta o que estava pendente em vez de esperar o envio
+        assinante.transporte.abort()
+
+    def _escrever(self, assinante, dados):
+        transporte = assinante.transporte
+        if transporte.is_closing():
+            self.remover(assinante)
+            return False
+        if transporte.get_write_buffer_size() + len(dados) > self.limite_buffer:
+            self.derrubar(assinante, 'lento')
+            return False
+        transporte.write(dados)
+        return True
+
+    # --- distribuição ---
+
+    def distribuir(self, id_leilao, tipo, corpo):
+        """Entrega o evento (JSON já serializado) a quem assina o leilão ou todos."""
+        inicio = time.perf_counter()
+        quadros = {
+            'tcp': corpo + b'\n',
+            'sse': b'event: ' + tipo.encode() + b'\ndata: ' + corpo + b'\n\n',
+        }
+        destinos = self.por_leilao.get(id_leilao)
+        entregues = 0
+        # Cópias: derrubar um assinante altera os conjuntos durante a iteração.
+        # Quem assina todos recebe só pelo segundo grupo, mesmo que também
+        # tenha assinado o leilão
+        for grupo in ([a for a in destinos if not a.todos] if destinos else (), list(self.todos)):
+            for assinante in grupo:
+                if self._escrever(assinante, quadros[assinante.protocolo]):
+                    entregues += 1
+        ENTREGAS.inc(entregues)
+        FANOUT.observar(time.perf_counter() - inicio)
+        return entregues
+
+    def heartbeat(self):
+        """Comentário SSE periódico: detecta conexões mortas e mantém proxies abertos."""
+        for assinante in list(self.assinantes):
+            if assinante.protocolo == 'sse':
+                self._escrever(assinante, b':\n\n')
+        self.loop.call_later(INTERVALO_HEARTBEAT, self.heartbeat)
+
+    # --- servidores ---
+
+    async def atender_tcp(self, reader, writer):
+        assinante = Assinante(writer.transport, 'tcp')
+        self.adicionar(assinante)
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                comando = linha.strip().decode('utf-8', 'replace')
+                if comando == '*':
+                    self.assinar_todos(assinante)
+                elif comando == '-*':
+                    self.cancelar_todos(assinante)
+                elif comando.startswith('+') and len(comando) > 1:
+                    if not self.assinar(assinante, comando[1:]):
+                        self._escrever(assinante, b'{"erro": "limite de leiloes"}\n')
+                elif comando.startswith('-') and len(comando) > 1:
+                    self.cancelar(assinante, comando[1:])
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.remover(assinante)
+            writer.close()
+
+    async def atender_sse(self, reader, writer):
+        try:
+            requisicao = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            metodo, alvo, _ = requisicao.split(b'\r\n', 1)[0].decode('latin-1').split(' ', 2)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            writer.close()
+            return
+        url = urlsplit(alvo)
+        if metodo != 'GET' or url.path != '/eventos':
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+        leiloes = [l for valor in parse_qs(url.query).get('leiloes', []) for l in valor.split(',') if l]
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n')
+        assinante = Assinante(writer.transport, 'sse')
+        self.adicionar(assinante)
+        if not leiloes:
+            self.assinar_todos(assinante)
+        for id_leilao in leiloes[:MAX_LEILOES_POR_ASSINANTE]:
+            self.assinar(assinante, id_leilao)
+        try:
+            # O assinante SSE não manda nada; a leitura só detecta o fechamento
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.remover(assinante)
+            writer.close()
+
+    async def iniciar_servidores(self, host, porta_tcp, porta_sse):
+        servidores = []
+        if porta_tcp is not None:
+            servidores.append(await asyncio.start_server(self.atender_tcp, host, porta_tcp, backlog=4096))
+        if porta_sse is not None:
+            servidores.append(await asyncio.start_server(self.atender_sse, host, porta_sse, backlog=4096))
+        return servidores
+
+    # --- broker ---
+
+    def conectar(self):
+        self.connection = AsyncioConnection(
+            utils.get_connection_parameters(),
+            on_open_callback=lambda conexao: conexao.channel(on_open_callback=self._on_canal_aberto),
+            on_open_error_callback=self._on_falha_conexao,
+            on_close_callback=self._on_conexao_fechada,
+            custom_ioloop=self.loop
+        )
+
+    def _on_falha_conexao(self, connection, erro):
+        print(f"❌ Falha ao conectar ao broker: {erro}")
+        self._reconectar()
+
+    def _on_conexao_fechada(self, connection, motivo):
+        self.channel = None
+        if self.encerrando:
+            self.loop.stop()
+        else:
+            print(f"⚠️ Conexão perdida ({motivo}), reconectando...")
+            self._reconectar()
+
+    def _reconectar(self):
+        if not self.encerrando:
+            self.loop.call_later(2.0, self.conectar)
+
+    def _on_canal_aberto(self, channel):
+        self.channel = channel
+        channel.exchange_declare(
+            exchange='notificacao_leilao', exchange_type='topic',
+            callback=lambda _frame: channel.queue_declare(
+                queue='', exclusive=True, callback=self._on_fila_declarada))
+
+    def _on_fila_declarada(self, frame):
+        fila = frame.method.queue
+        self.channel.queue_bind(
+            queue=fila, exchange='notificacao_leilao', routing_key='leilao.*',
+            callback=lambda _frame: self.channel.basic_consume(
+                queue=fila, on_message_callback=self.processar, auto_ack=True))
+        print("✅ Assinando notificacao_leilao (leilao.*)")
+
+    def processar(self, ch, method, properties, body):
+        try:
+            evento = utils.decode_event(properties, body)
+            id_leilao = evento['id_leilao']
+            # Vira chave de dicionário em distribuir
+            if not isinstance(id_leilao, str):
+                raise ValueError("id_leilao deve ser texto")
+        except (ValueError, KeyError, TypeError):
+            log.warning('evento_malformado', extra={'campos': {'corpo': body[:200]}})
+            return
+        tipo = 'vencedor' if 'id_vencedor' in evento else 'lance'
+        EVENTOS.rotulos(tipo).inc()
+        # Assinantes sempre recebem JSON: só o formato binário é reserializado
+        if properties.content_type == wire.CONTENT_TYPE_BINARIO:
+            body = json.dumps(evento, separators=(',', ':'), default=str).encode('utf-8')
+        self.distribuir(id_leilao, tipo, body)
+
+    def parar(self):
+        self.encerrando = True
+        for assinante in list(self.assinantes):
+            self.remover(assinante)
+            assinante.transporte.close()
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+        else:
+            self.loop.stop()
+
+    def run(self, host, porta_tcp, porta_sse):
+        self.loop.run_until_complete(self.iniciar_servidores(host, porta_tcp, porta_sse))
+        print(f"🚀 Gateway iniciado! TCP em {host}:{porta_tcp} | SSE em http://{host}:{porta_sse}/eventos")
+        self.conectar()
+        self.loop.call_later(INTERVALO_HEARTBEAT, self.heartbeat)
+        try:
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            print(f"\n🛑 Gateway encerrado pelo usuário ({len(self.assinantes)} assinantes conectados)")
+            self.parar()
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gateway de notificações (TCP e SSE)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta-tcp', type=int, default=PORTA_TCP)
+    parser.add_argument('--porta-sse', type=int, default=PORTA_SSE)
+    parser.add_argument('--limite-buffer', type=int, default=LIMITE_BUFFER,
+                        help='bytes pendentes por assinante antes de desconectá-lo')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+    logs.configurar('gateway')
+    utils.iniciar_metricas(args.metricas_porta, 'Gateway')
+    Gateway(args.limite_buffer).run(args.host, args.porta_tcp, args.porta_sse)
@@ -0,0 +1,47 @@
+"""Inicia N workers do MS Lance, um por shard.
+
+Uso: python lancar_shards.py 4 [--workers 2 ...]
+
+Os argumentos extras são repassados a cada ms_lance.py. Publicadores
+(cliente.py, ms_leilao.py) precisam rodar com LEILAO_SHARDS=N para rotear
+lances e fins de leilão para o shard certo.
+"""
+import os
+import subprocess
+import sys
+
+
+def main():
+    if len(sys.argv) < 2 or not sys.argv[1].isdigit() or int(sys.argv[1]) < 1:
+        print(__doc__)
+        sys.exit(1)
+    shards = int(sys.argv[1])
+    extras = sys.argv[2:]
+    ambiente = dict(os.environ, LEILAO_SHARDS=str(shards))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ms_lance.py')
+
+    processos = [
+        subprocess.Popen(
+            [sys.executable, script, '--shards', str(shards), '--shard', str(shard), *extras],
+            env=ambiente
+        )
+        for shard in range(shards)
+    ]
+    print(f"🚀 {shards} shards do MS Lance iniciados (PIDs: {', '.join(str(p.pid) for p in processos)})")
+    print(f"   Use LEILAO_SHARDS={shards} no cliente e no MS Leilão.")
+
+    try:
+        for processo in processos:
+            processo.wait()
+    except KeyboardInterrupt:
+        # Ctrl+C já chega a todo o grupo de processos; só aguarda o término
+        for processo in processos:
+            try:
+                processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+        print("\n🛑 Shards encerrados")
+
+
+if __name__ == '__main__':
+    main()
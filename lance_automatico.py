@@ -0,0 +1,88 @@
+"""Lances automáticos (proxy): o cliente assina só o valor máximo.
+
+Um lance automático é uma mensagem assinada com "maximo" no lugar de
+"valor". O MS Lance guarda o máximo do líder junto do maior lance do leilão
+e disputa por ele: o preço visível sobe só o necessário para manter o líder
+à frente, em degraus de incremento() (tabela INCREMENTOS). Só o líder
+precisa de máximo guardado: quem perde a disputa já teve o seu esgotado.
+
+Regras, com preço atual P, líder L e máximo do líder ML:
+  - automático M de outro usuário: precisa de M >= proximo(P); se M > ML o
+    novo líder paga min(M, proximo(ML)), senão L continua à frente pagando
+    min(ML, proximo(M)) (empate fica com quem chegou antes);
+  - automático M do próprio líder: só sobe o máximo guardado;
+  - lance comum V > P: se V <= ML, o máximo de L cobre o lance e o preço
+    vai a min(ML, proximo(V)); senão vale como sempre valeu.
+O máximo nunca é publicado: lance_validado recebe só o preço resultante.
+Valores que não são números finitos e positivos (valor_valido) são recusados
+antes de qualquer regra.
+"""
+import math
+
+# (limite superior do preço, incremento): a primeira faixa que cobre o preço
+INCREMENTOS = (
+    (1, 0.05),
+    (5, 0.25),
+    (25, 0.50),
+    (100, 1.00),
+    (250, 2.50),
+    (500, 5.00),
+    (1000, 10.00),
+    (2500, 25.00),
+    (5000, 50.00),
+)
+INCREMENTO_MAXIMO = 100.00
+
+
+def incremento(preco):
+    for limite, passo in INCREMENTOS:
+        if preco < limite:
+            return passo
+    return INCREMENTO_MAXIMO
+
+
+def proximo(preco):
+    """Menor lance automático que supera o preço."""
+    return round(preco + incremento(preco), 2)
+
+
+def valor_valido(valor):
+    """Número finito e positivo: NaN é falso em qualquer comparação e inf cobriria qualquer lance."""
+    if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+        return False
+    return valor > 0 and not (isinstance(valor, float) and not math.isfinite(valor))
+
+
+def resolver(atual, id_usuario, valor, automatico=False):
+    """Aplica um lance ao estado do leilão ({"id_usuario", "valor"[, "maximo"]}).
+
+    Devolve (novo, motivo): novo é o estado seguinte, ou None com o motivo
+    da recusa. Um lance aceito pode deixar o líder anterior à frente.
+    """
+    if not valor_valido(valor):
+        return None, 'valor_invalido'
+    lider, preco = atual["id_usuario"], atual["valor"]
+    maximo_lider = atual.get("maximo")
+
+    if not automatico:
+        if not (valor > preco):
+            return None, 'lance_baixo'
+        if maximo_lider is None or maximo_lider < valor:
+            return {"id_usuario": id_usuario, "valor": valor}, None
+        if lider == id_usuario:
+            # O líder cobriu o próprio preço: o máximo guardado continua valendo
+            return dict(atual, valor=valor), None
+        return dict(atual, valor=min(maximo_lider, proximo(valor))), None
+
+    if lider is not None and lider == id_usuario:
+        if not (valor > max(preco, maximo_lider or 0)):
+            return None, 'lance_baixo'
+        return dict(atual, maximo=valor), None
+    minimo = proximo(preco)
+    if not (valor >= minimo):
+        return None, 'lance_baixo'
+    if maximo_lider is None:
+        return {"id_usuario": id_usuario, "valor": minimo, "maximo": valor}, None
+    if valor > maximo_lider:
+        return {"id_usuario": id_usuario, "valor": min(valor, proximo(maximo_lider)), "maximo": valor}, None
+    return dict(atual, valor=min(maximo_lider, proximo(valor))), None
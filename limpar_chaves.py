@@ -0,0 +1,94 @@
+"""Remove chaves públicas antigas ou inválidas do diretório de chaves.
+
+Uso: python limpar_chaves.py [--dias 30] [--simular]
+
+Cada identidade efêmera de cliente deixa um .pem em public_keys/, e o MS
+Lance pré-carrega o diretório inteiro ao iniciar. Esta ferramenta apaga:
+  - .pem que não pode ser lido como chave pública;
+  - .pem sem uso há mais de --dias (mtime; clientes com chaveiro tocam
+    a própria chave ao iniciar, ver chaveiro.publicar_chave);
+  - temporários (.tmp) abandonados por gravações interrompidas.
+Chaves dos perfis do chaveiro local nunca são apagadas. Com o MS Lance
+rodando, lances de usuários removidos passam a ser recusados por falta de
+chave depois que a entrada sai do cache.
+"""
+import argparse
+import os
+import time
+
+import chaveiro
+import utils
+
+PUBLIC_KEYS_DIR = 'public_keys'
+# Temporários mais novos que isso podem ser de uma gravação em andamento
+IDADE_MINIMA_TMP = 3600
+
+
+def classificar(caminho, nome, limite, protegidos, agora):
+    """Motivo para apagar o arquivo, ou None para mantê-lo."""
+    st = os.stat(caminho)
+    if nome.endswith('.tmp'):
+        return 'temporario' if agora - st.st_mtime > IDADE_MINIMA_TMP else None
+    if not nome.endswith('.pem'):
+        return None
+    if nome[:-len('.pem')] in protegidos:
+        return None
+    try:
+        with open(caminho, 'rb') as entrada:
+            utils.deserialize_public_key(entrada.read())
+    except ValueError:
+        return 'invalida'
+    if st.st_mtime < limite:
+        return 'antiga'
+    return None
+
+
+def limpar(diretorio, dias, protegidos=(), simular=False):
+    """Apaga (ou só lista, com simular) os arquivos removíveis. Devolve o resumo."""
+    agora = time.time()
+    limite = agora - dias * 86400
+    resumo = {"mantidas": 0, "bytes": 0, "antiga": 0, "invalida": 0, "temporario": 0}
+    for nome in sorted(os.listdir(diretorio)):
+        caminho = os.path.join(diretorio, nome)
+        try:
+            motivo = classificar(caminho, nome, limite, protegidos, agora)
+            tamanho = os.path.getsize(caminho)
+            if motivo is not None and not simular:
+                os.unlink(caminho)
+        except OSError:
+            # Apagado ou trocado por outro processo durante a varredura
+            continue
+        if motivo is None:
+            resumo["mantidas"] += 1 if nome.endswith('.pem') else 0
+            continue
+        resumo[motivo] += 1
+        resumo["bytes"] += tamanho
+        if simular:
+            print(f"   {motivo:<10} {nome}")
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--diretorio', default=PUBLIC_KEYS_DIR, help='diretório de chaves públicas')
+    parser.add_argument('--dias', type=float, default=30, help='idade mínima (mtime) para remover uma chave')
+    parser.add_argument('--chaveiro', default=chaveiro.DIRETORIO,
+                        help='chaveiro cujos usuários nunca são removidos')
+    parser.add_argument('--simular', action='store_true', help='só lista o que seria removido')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.diretorio):
+        print(f"Diretório {args.diretorio} não existe")
+        return
+    resumo = limpar(args.diretorio, args.dias, chaveiro.usuarios(args.chaveiro), args.simular)
+    removidas = resumo["antiga"] + resumo["invalida"] + resumo["temporario"]
+    acao = "seriam removidos" if args.simular else "removidos"
+    print(f"🧹 {removidas} arquivos {acao} ({resumo['bytes'] / 1024:.1f} KiB): "
+          f"{resumo['antiga']} antigos, {resumo['invalida']} inválidos, "
+          f"{resumo['temporario']} temporários")
+    print(f"   {resumo['mantidas']} chaves mantidas em {args.diretorio}")
+
+
+if __name__ == '__main__':
+    main()
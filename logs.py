@@ -0,0 +1,223 @@
+"""Logging estruturado (JSON lines) fora da thread que consome mensagens.
+
+configurar() troca os handlers do logger raiz por um QueueHandler: quem loga
+só formata a mensagem e a coloca numa fila limitada, e uma QueueListener
+escreve no destino em outra thread. Se a fila encher, o registro é
+descartado e contado em vez de bloquear o consumo.
+
+Eventos por lance (aceito, recusado, roteado...) usam loggers de limitado(),
+com no máximo LEILAO_LOG_TAXA registros/s por evento. O limite é checado
+antes de criar o LogRecord, então um registro suprimido custa pouco; o
+primeiro que passa depois de uma supressão leva o total no campo
+"suprimidos".
+
+    log = logs.limitado('ms_lance.lances')
+    log.info('lance_valido', extra={'campos': {'id_leilao': ..., 'valor': ...}})
+
+Configuração: LEILAO_LOG_NIVEL (padrão INFO), LEILAO_LOG_FORMATO (json ou
+texto; padrão texto num terminal e json fora dele) e LEILAO_LOG_TAXA
+(0 = sem limite).
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+NIVEL = os.environ.get('LEILAO_LOG_NIVEL', 'INFO').upper()
+FORMATO = os.environ.get('LEILAO_LOG_FORMATO')
+TAXA = float(os.environ.get('LEILAO_LOG_TAXA', 20))
+TAMANHO_FILA = 10000
+
+
+class FormatoJSON(logging.Formatter):
+    """Um objeto JSON por linha: ts, nivel, servico, logger, evento e os campos extras."""
+
+    def __init__(self, servico):
+        super().__init__()
+        self.servico = servico
+
+    def format(self, record):
+        dados = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "nivel": record.levelname,
+            "servico": self.servico,
+            "logger": record.name,
+            "evento": record.getMessage(),
+        }
+        campos = getattr(record, 'campos', None)
+        if campos:
+            dados.update(campos)
+        suprimidos = getattr(record, 'suprimidos', 0)
+        if suprimidos:
+            dados["suprimidos"] = suprimidos
+        if record.exc_text:
+            dados["erro"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    """Linha legível para terminal, com os campos como chave=valor."""
+
+    def __init__(self, servico):
+        super().__init__(f"%(asctime)s %(levelname)-7s {servico} %(name)s: %(message)s", '%H:%M:%S')
+
+    def format(self, record):
+        linha = super().format(record)
+        campos = dict(getattr(record, 'campos', None) or {})
+        if getattr(record, 'suprimidos', 0):
+            campos["suprimidos"] = record.suprimidos
+        if campos:
+            linha += " " + " ".join(f"{k}={v}" for k, v in campos.items())
+        return linha
+
+
+class LimiteTaxa:
+    """Token bucket por evento: até 'taxa' registros/s, com rajada de 'rajada'."""
+
+    def __init__(self, taxa, rajada=None):
+        self.taxa = taxa
+        self.rajada = rajada or max(1.0, taxa)
+        # evento -> [fichas, último instante, suprimidos desde o último emitido]
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def permitir(self, evento):
+        """None se o registro deve ser suprimido; senão, quantos foram suprimidos antes dele."""
+        if self.taxa <= 0:
+            return 0
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.get(evento)
+            if balde is None:
+                balde = self._baldes[evento] = [self.rajada, agora, 0]
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+            if balde[0] < 1:
+                balde[2] += 1
+                return None
+            balde[0] -= 1
+            suprimidos, balde[2] = balde[2], 0
+        return suprimidos
+
+
+class LoggerLimitado:
+    """Logger com limite de taxa por evento (a mensagem), mesma interface de chamada."""
+
+    def __init__(self, logger, taxa):
+        self.logger = logger
+        self.limite = LimiteTaxa(taxa)
+
+    def isEnabledFor(self, nivel):
+        return self.logger.isEnabledFor(nivel)
+
+    def log(self, nivel, evento, *args, extra=None, **kwargs):
+        if not self.logger.isEnabledFor(nivel):
+            return
+        suprimidos = self.limite.permitir(evento)
+        if suprimidos is None:
+            return
+        if suprimidos:
+            extra = dict(extra or {}, suprimidos=suprimidos)
+        self.logger.log(nivel, evento, *args, extra=extra, **kwargs)
+
+    def debug(self, evento, *args, **kwargs):
+        self.log(logging.DEBUG, evento, *args, **kwargs)
+
+    def info(self, evento, *args, **kwargs):
+        self.log(logging.INFO, evento, *args, **kwargs)
+
+    def warning(self, evento, *args, **kwargs):
+        self.log(logging.WARNING, evento, *args, **kwargs)
+
+    def error(self, evento, *args, **kwargs):
+        self.log(logging.ERROR, evento, *args, **kwargs)
+
+    def exception(self, evento, *args, exc_info=True, **kwargs):
+        self.log(logging.ERROR, evento, *args, exc_info=exc_info, **kwargs)
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) em vez de bloquear com a fila cheia."""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Resolve mensagem e traceback aqui (podem referenciar objetos
+        # mutáveis), mas deixa a formatação final para a thread de escrita
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_listener = None
+_handler = None
+_limitados = {}
+
+
+def limitado(nome, taxa=None):
+    """Logger para eventos por mensagem, com limite de taxa por evento."""
+    logger = _limitados.get(nome)
+    if logger is None:
+        logger = _limitados[nome] = LoggerLimitado(logging.getLogger(nome),
+                                                   TAXA if taxa is None else taxa)
+    return logger
+
+
+def configurar(servico, nivel=None, formato=None, destino=None):
+    """Liga o logging do processo através da fila; chamar uma vez, no início do main."""
+    global _listener, _handler
+    parar()
+    formato = formato or FORMATO or ('texto' if sys.stdout.isatty() else 'json')
+    saida = logging.StreamHandler(destino or sys.stdout)
+    saida.setFormatter(FormatoJSON(servico) if formato == 'json' else FormatoTexto(servico))
+
+    # Atributos do LogRecord que os formatos não usam e custam caro de
+    # preencher a cada registro (o _srcfile faz findCaller percorrer a pilha)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    fila = queue.Queue(TAMANHO_FILA)
+    _handler = HandlerFila(fila)
+    _listener = logging.handlers.QueueListener(fila, saida)
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    raiz.addHandler(_handler)
+    raiz.setLevel(nivel or NIVEL)
+    _listener.start()
+    return _listener
+
+
+def parar():
+    """Esvazia a fila e para a thread de escrita (registrado no atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _handler is not None and _handler.descartados:
+            print(f"Logging: {_handler.descartados} registros descartados com a fila cheia",
+                  file=sys.stderr)
+
+
+atexit.register(parar)
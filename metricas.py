@@ -0,0 +1,208 @@
+"""Métricas dos serviços (contadores, medidores e histogramas) no formato Prometheus.
+
+Cada métrica pode ter rótulos; rotulos(...) devolve a série correspondente,
+que pode ser guardada numa variável para o caminho quente não pagar a busca
+no dicionário. Incrementar/observar custa um lock e, no histograma, uma
+busca binária nos buckets, então dá para deixar ligado em produção.
+
+    LANCES = metricas.contador('leilao_lances_total', 'Lances por resultado', ['resultado'])
+    LANCES.rotulos('valido').inc()
+
+servir(porta) expõe GET /metrics em text/plain (versão 0.0.4) numa thread.
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Segundos: de dezenas de microssegundos (decode) a segundos (filas atrasadas)
+BUCKETS_PADRAO = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                  0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatar(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _SerieContador:
+    __slots__ = ('_lock', 'valor')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valor = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+    def amostras(self, nome, rotulos):
+        yield nome, rotulos, self.valor
+
+
+class _SerieMedidor:
+    __slots__ = ('_lock', 'valor', 'funcao')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valor = 0
+        # Se definida, é chamada na coleta (ex.: profundidade de uma fila)
+        self.funcao = None
+
+    def set(self, valor):
+        self.valor = valor
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+    def dec(self, n=1):
+        self.inc(-n)
+
+    def set_funcao(self, funcao):
+        self.funcao = funcao
+
+    def amostras(self, nome, rotulos):
+        yield nome, rotulos, self.funcao() if self.funcao is not None else self.valor
+
+
+class _SerieHistograma:
+    __slots__ = ('_lock', 'limites', 'contagens', 'soma', 'total')
+
+    def __init__(self, limites):
+        self._lock = threading.Lock()
+        self.limites = limites
+        # Um contador por bucket (não cumulativo) e um extra para +Inf
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.contagens[i] += 1
+            self.soma += valor
+            self.total += 1
+
+    def amostras(self, nome, rotulos):
+        with self._lock:
+            contagens, soma, total = list(self.contagens), self.soma, self.total
+        acumulado = 0
+        for limite, contagem in zip(self.limites + (float('inf'),), contagens):
+            acumulado += contagem
+            yield nome + '_bucket', rotulos + (('le', _formatar(limite)),), acumulado
+        yield nome + '_sum', rotulos, soma
+        yield nome + '_count', rotulos, total
+
+
+class Metrica:
+    """Família de séries com o mesmo nome, uma por combinação de rótulos."""
+
+    def __init__(self, tipo, nome, ajuda, rotulos, criar_serie):
+        self.tipo = tipo
+        self.nome = nome
+        self.ajuda = ajuda
+        self.nomes_rotulos = tuple(rotulos)
+        self._criar_serie = criar_serie
+        self._series = {}
+        self._lock = threading.Lock()
+        if not self.nomes_rotulos:
+            self._sem_rotulos = self.rotulos()
+
+    def rotulos(self, *valores):
+        if len(valores) != len(self.nomes_rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.nomes_rotulos}")
+        serie = self._series.get(valores)
+        if serie is None:
+            with self._lock:
+                serie = self._series.setdefault(valores, self._criar_serie())
+        return serie
+
+    def __getattr__(self, atributo):
+        # Métricas sem rótulos: LANCES.inc() em vez de LANCES.rotulos().inc()
+        if atributo in ('inc', 'dec', 'set', 'set_funcao', 'observar') and not self.nomes_rotulos:
+            return getattr(self._sem_rotulos, atributo)
+        raise AttributeError(atributo)
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        for valores, serie in sorted(self._series.items()):
+            rotulos = tuple(zip(self.nomes_rotulos, valores))
+            for nome, rotulos_amostra, valor in serie.amostras(self.nome, rotulos):
+                if rotulos_amostra:
+                    texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos_amostra)
+                    linhas.append(f"{nome}{{{texto}}} {_formatar(valor)}")
+                else:
+                    linhas.append(f"{nome} {_formatar(valor)}")
+        return "\n".join(linhas)
+
+
+class Registro:
+    """Conjunto de métricas de um processo."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, tipo, nome, ajuda, rotulos, criar_serie):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = Metrica(tipo, nome, ajuda, rotulos, criar_serie)
+            elif metrica.tipo != tipo or metrica.nomes_rotulos != tuple(rotulos):
+                raise ValueError(f"Métrica {nome} já registrada com outro tipo ou rótulos")
+            return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar('counter', nome, ajuda, rotulos, _SerieContador)
+
+    def medidor(self, nome, ajuda, rotulos=()):
+        return self._registrar('gauge', nome, ajuda, rotulos, _SerieMedidor)
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        limites = tuple(sorted(buckets))
+        return self._registrar('histogram', nome, ajuda, rotulos, lambda: _SerieHistograma(limites))
+
+    def exportar(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return "\n".join(m.exportar() for m in metricas) + "\n"
+
+
+registro = Registro()
+contador = registro.contador
+medidor = registro.medidor
+histograma = registro.histograma
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registro = registro
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        corpo = self.registro.exportar().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def servir(porta, host='127.0.0.1', registro_servido=None):
+    """Sobe o endpoint /metrics numa thread daemon e devolve o servidor."""
+    handler = type('Handler', (_Handler,), {'registro': registro_servido or registro})
+    servidor = ThreadingHTTPServer((host, porta), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name='metricas').start()
+    return servidor
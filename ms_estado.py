@@ -0,0 +1,208 @@
+"""MS Estado: cache do último valor dos leilões ativos (snapshot + deltas).
+
+Mantém os leilões ativos e o maior lance de cada um, a partir de
+leilao_iniciado e de notificacao_leilao (leilao.*), na fila durável
+estado_eventos. Cada mudança vira um delta numerado publicado na exchange
+fanout estado_leiloes:
+    {"tipo": "iniciado" | "lance" | "encerrado", "instancia", "seq", "id_leilao", ...}
+Deltas de lance são conflacionados por leilão (no máximo um a cada
+LEILAO_ESTADO_INTERVALO_MS); os demais saem na hora.
+
+Um cliente liga sua fila a estado_leiloes e só então pede o snapshot na fila
+estado_snapshot (reply_to + correlation_id). A resposta traz os leilões, a
+instancia e o seq do último delta já publicado: o cliente descarta deltas com
+seq menor ou igual e aplica os seguintes. Se a instancia dos deltas mudar
+(serviço reiniciado), a sequência recomeçou e é preciso pedir outro snapshot.
+
+Leilões que terminam sem vencedor não geram evento: saem do cache um pouco
+depois do fim previsto. --catalogo carrega os leilões ativos do catálogo do
+MS Leilão ao iniciar, para não depender de ter visto o leilao_iniciado.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
+import pika
+
+import logs
+import metricas
+import utils
+from catalogo import CatalogoLeiloes
+
+FILA_EVENTOS = 'estado_eventos'
+INTERVALO_DELTAS = float(os.environ.get('LEILAO_ESTADO_INTERVALO_MS', 100)) / 1000
+# Segundos após o fim previsto até tirar do cache um leilão sem vencedor
+MARGEM_FIM = 30
+
+log = logging.getLogger('ms_estado')
+
+DELTAS = metricas.contador('ms_estado_deltas_total', 'Deltas publicados, por tipo', ['tipo'])
+CONFLACIONADOS = metricas.contador('ms_estado_lances_conflacionados_total',
+                                   'Lances substituídos por um mais novo antes de virar delta')
+SNAPSHOTS = metricas.contador('ms_estado_snapshots_total', 'Snapshots enviados')
+DURACAO_SNAPSHOT = metricas.histograma('ms_estado_snapshot_segundos',
+                                       'Duração da montagem e publicação de um snapshot')
+
+
+def _fim_epoch(fim):
+    try:
+        return datetime.datetime.fromisoformat(str(fim)).timestamp()
+    except ValueError:
+        return None
+
+
+class MSEstado:
+    def __init__(self, intervalo=INTERVALO_DELTAS):
+        self.intervalo = intervalo
+        # Muda a cada início: o seq de uma instância não vale para outra
+        self.instancia = uuid.uuid4().hex[:12]
+        self.seq = 0
+        # id_leilao -> {"id_leilao", "descricao", "inicio", "fim", "maior"}
+        self.leiloes = {}
+        # id_leilao -> maior lance ainda não publicado como delta
+        self._lances_pendentes = {}
+        self._flush_agendado = False
+        self._expiracoes = {}
+
+        self.channel = utils.get_rabbitmq_channel()
+        utils.setup_queues(self.channel)
+        self.channel.exchange_declare(exchange=utils.EXCHANGE_DELTAS, exchange_type='fanout')
+        self.channel.queue_declare(queue=FILA_EVENTOS, durable=True)
+        self.channel.queue_bind(exchange='leilao_iniciado', queue=FILA_EVENTOS)
+        self.channel.queue_bind(exchange='notificacao_leilao', queue=FILA_EVENTOS, routing_key='leilao.*')
+        # Pedidos de snapshot não sobrevivem a um restart: o cliente pede de novo
+        self.channel.queue_declare(queue=utils.FILA_SNAPSHOT)
+        self.consumidor = utils.Consumidor(self.channel)
+        metricas.medidor('ms_estado_leiloes_ativos', 'Leilões ativos no cache').set_funcao(
+            lambda: len(self.leiloes))
+
+    def carregar_catalogo(self, caminho):
+        catalogo = CatalogoLeiloes(caminho)
+        try:
+            for pagina in catalogo.paginas(1000, status='ativo'):
+                for leilao in pagina:
+                    self.iniciar({
+                        "id_leilao": leilao["id_leilao"],
+                        "descricao": leilao["descricao"],
+                        "inicio": leilao["inicio"].isoformat(),
+                        "fim": leilao["fim"].isoformat(),
+                    }, publicar=False)
+        finally:
+            catalogo.fechar()
+        print(f"📥 {len(self.leiloes)} leilões ativos carregados de {caminho}")
+
+    def publicar_delta(self, tipo, dados):
+        self.seq += 1
+        delta = dict(dados, tipo=tipo, instancia=self.instancia, seq=self.seq)
+        corpo, content_type = utils.encode_event(delta)
+        self.channel.basic_publish(exchange=utils.EXCHANGE_DELTAS, routing_key='', body=corpo,
+                                   properties=utils.event_properties(content_type))
+        DELTAS.rotulos(tipo).inc()
+
+    def iniciar(self, evento, publicar=True):
+        id_leilao = evento['id_leilao']
+        leilao = {
+            "id_leilao": id_leilao,
+            "descricao": evento.get('descricao'),
+            "inicio": evento.get('inicio'),
+            "fim": evento.get('fim'),
+        }
+        anterior = self.leiloes.get(id_leilao)
+        self.leiloes[id_leilao] = dict(leilao, maior=anterior["maior"] if anterior else None)
+        fim = _fim_epoch(leilao["fim"])
+        if fim is not None and id_leilao not in self._expiracoes:
+            self._expiracoes[id_leilao] = self.channel.connection.call_later(
+                max(0.0, fim - time.time()) + MARGEM_FIM, lambda: self.encerrar(id_leilao))
+        if publicar and anterior is None:
+            self.publicar_delta('iniciado', leilao)
+
+    def registrar_lance(self, id_leilao, id_usuario, valor):
+        leilao = self.leiloes.get(id_leilao)
+        if leilao is None or (leilao["maior"] is not None and valor <= leilao["maior"]["valor"]):
+            return
+        leilao["maior"] = {"id_usuario": id_usuario, "valor": valor}
+        if self.intervalo <= 0:
+            self.publicar_delta('lance', {"id_leilao": id_leilao, "id_usuario": id_usuario, "valor": valor})
+            return
+        if id_leilao in self._lances_pendentes:
+            CONFLACIONADOS.inc()
+        self._lances_pendentes[id_leilao] = leilao["maior"]
+        if not self._flush_agendado:
+            self._flush_agendado = True
+            self.channel.connection.call_later(self.intervalo, self.publicar_lances)
+
+    def publicar_lances(self):
+        self._flush_agendado = False
+        pendentes, self._lances_pendentes = self._lances_pendentes, {}
+        for id_leilao, maior in pendentes.items():
+            if id_leilao in self.leiloes:
+                self.publicar_delta('lance', dict(maior, id_leilao=id_leilao))
+
+    def encerrar(self, id_leilao, vencedor=None):
+        timer = self._expiracoes.pop(id_leilao, None)
+        if timer is not None and vencedor is not None:
+            self.channel.connection.remove_timeout(timer)
+        if self.leiloes.pop(id_leilao, None) is None:
+            return
+        self._lances_pendentes.pop(id_leilao, None)
+        self.publicar_delta('encerrado', dict(vencedor or {}, id_leilao=id_leilao))
+
+    def processar_evento(self, ch, method, properties, body):
+        try:
+            evento = utils.decode_event(properties, body)
+            id_leilao = evento['id_leilao']
+            if method.exchange == 'leilao_iniciado':
+                self.iniciar(evento)
+            elif 'id_vencedor' in evento:
+                self.encerrar(id_leilao, {"id_vencedor": evento['id_vencedor'], "valor": evento.get('valor')})
+            else:
+                self.registrar_lance(id_leilao, evento['id_usuario'], float(evento['valor']))
+        except (ValueError, KeyError, TypeError):
+            log.warning('evento_malformado', extra={'campos': {'exchange': method.exchange, 'corpo': body[:200]}})
+        self.consumidor.ack(method.delivery_tag)
+
+    def processar_snapshot(self, ch, method, properties, body):
+        inicio = time.perf_counter()
+        if properties.reply_to:
+            # Os lances pendentes já estão em self.leiloes; o delta deles sai
+            # depois com seq maior e só repete o valor
+            snapshot = {"instancia": self.instancia, "seq": self.seq, "leiloes": list(self.leiloes.values())}
+            self.channel.basic_publish(
+                exchange='', routing_key=properties.reply_to,
+                body=json.dumps(snapshot, default=str).encode('utf-8'),
+                properties=pika.BasicProperties(content_type='application/json',
+                                                correlation_id=properties.correlation_id))
+            SNAPSHOTS.inc()
+        DURACAO_SNAPSHOT.observar(time.perf_counter() - inicio)
+        self.consumidor.ack(method.delivery_tag)
+
+    def run(self):
+        self.consumidor.consumir(FILA_EVENTOS, self.processar_evento)
+        self.consumidor.consumir(utils.FILA_SNAPSHOT, self.processar_snapshot)
+        print(f"🗂️  MS Estado iniciado (instância {self.instancia})! Deltas em '{utils.EXCHANGE_DELTAS}'")
+        print(f"📸 Snapshots na fila '{utils.FILA_SNAPSHOT}'")
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            self.consumidor.flush()
+            print(f"\n🛑 MS Estado encerrado pelo usuário ({len(self.leiloes)} leilões ativos, seq {self.seq})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MS Estado')
+    parser.add_argument('--catalogo', help='carrega os leilões ativos deste catálogo SQLite ao iniciar')
+    parser.add_argument('--intervalo-ms', type=float, default=INTERVALO_DELTAS * 1000,
+                        help='conflação dos deltas de lance por leilão (0 = um delta por lance)')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+    logs.configurar('ms_estado')
+    utils.iniciar_metricas(args.metricas_porta, 'MS Estado')
+    ms_estado = MSEstado(args.intervalo_ms / 1000)
+    if args.catalogo:
+        ms_estado.carregar_catalogo(args.catalogo)
+    ms_estado.run()
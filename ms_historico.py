@@ -0,0 +1,314 @@
+"""MS Histórico: índice dos lances validados, consultado por RPC sobre AMQP.
+
+Assina notificacao_leilao (leilao.*) com a fila própria historico_lances,
+então lê os mesmos eventos que os clientes recebem e não toca no caminho de
+validação do MS Lance. Cada lance validado supera o anterior do leilão, então
+a ordem de chegada já é a ordem por valor: por leilão os lances ficam numa
+deque limitada (inserir e descartar o menor em O(1), top k em O(k)), com os
+valores de cada usuário numa deque própria. Cada leilão guarda no máximo
+LEILAO_HISTORICO_POR_LEILAO lances (os de menor valor saem primeiro) e o
+serviço guarda no máximo LEILAO_HISTORICO_LEILOES leilões (sai o menos
+recentemente atualizado).
+
+Com a conflação do MS Notificação ligada (--conflacao-ms), os lances
+coalescidos nunca chegam a notificacao_leilao e o índice não os vê: os
+lances de um usuário e o top ficam incompletos (o maior lance, não).
+
+Consultas vão para a fila historico_consultas com reply_to e correlation_id;
+pedido e resposta são JSON:
+    {"tipo": "top", "id_leilao": "...", "k": 10}
+    {"tipo": "usuario", "id_usuario": "...", "id_leilao": "..." (opcional)}
+    {"tipo": "resumo", "id_leilao": "..."}
+Resposta: {"ok": true, "resultado": ...} ou {"ok": false, "erro": "..."}.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import pika
+
+import logs
+import metricas
+import utils
+
+FILA_HISTORICO = 'historico_lances'
+MAX_POR_LEILAO = int(os.environ.get('LEILAO_HISTORICO_POR_LEILAO', 1000))
+MAX_LEILOES = int(os.environ.get('LEILAO_HISTORICO_LEILOES', 10000))
+MAX_K = 1000
+TIPOS_CONSULTA = ('top', 'usuario', 'resumo')
+
+log = logging.getLogger('ms_historico')
+
+INDEXADOS = metricas.contador('ms_historico_lances_total', 'Eventos de lance recebidos, por resultado',
+                              ['resultado'])
+CONSULTAS = metricas.contador('ms_historico_consultas_total', 'Consultas atendidas, por tipo e resultado',
+                              ['tipo', 'resultado'])
+DURACAO_CONSULTA = metricas.histograma('ms_historico_consulta_segundos',
+                                       'Duração de uma consulta (sem a publicação da resposta)', ['tipo'])
+
+
+class HistoricoLeilao:
+    """Últimos lances de um leilão em ordem de chegada (valor crescente), com índice por usuário."""
+
+    __slots__ = ('lances', 'por_usuario', 'total', 'vencedor')
+
+    def __init__(self, limite):
+        # (valor, id_usuario, ts), crescente por valor; no limite sai o mais antigo
+        self.lances = deque(maxlen=limite)
+        # id_usuario -> valores retidos desse usuário, crescentes
+        self.por_usuario = {}
+        # Lances indexados desde o início, inclusive os que já saíram do limite
+        self.total = 0
+        self.vencedor = None
+
+    def inserir(self, valor, id_usuario, ts):
+        """Insere o lance. Devolve (inserido, usuário que ficou sem lances retidos ou None)."""
+        # Cada lance validado supera o anterior: um valor que não supera o
+        # último é reentrega de uma mensagem já indexada
+        if self.lances and not valor > self.lances[-1][0]:
+            return False, None
+        cheio = len(self.lances) == self.lances.maxlen
+        usuario_antigo = self.lances[0][1] if cheio else None
+        self.lances.append((valor, id_usuario, ts))
+        self.por_usuario.setdefault(id_usuario, deque()).append(valor)
+        self.total += 1
+        if not cheio:
+            return True, None
+        valores = self.por_usuario[usuario_antigo]
+        # O lance descartado é o mais antigo do leilão, logo também o do usuário
+        valores.popleft()
+        if valores:
+            return True, None
+        del self.por_usuario[usuario_antigo]
+        return True, usuario_antigo
+
+    def top(self, k):
+        return [{"id_usuario": u, "valor": v, "ts": ts}
+                for v, u, ts in itertools.islice(reversed(self.lances), k)]
+
+    def resumo(self):
+        maior = self.lances[-1] if self.lances else None
+        return {
+            "total": self.total,
+            "retidos": len(self.lances),
+            "usuarios": len(self.por_usuario),
+            "maior": {"id_usuario": maior[1], "valor": maior[0]} if maior else None,
+            "vencedor": self.vencedor,
+        }
+
+
+class IndiceLances:
+    """Históricos por leilão, no máximo max_leiloes (LRU por atualização)."""
+
+    def __init__(self, max_por_leilao=MAX_POR_LEILAO, max_leiloes=MAX_LEILOES):
+        self.max_por_leilao = max_por_leilao
+        self.max_leiloes = max_leiloes
+        self.leiloes = OrderedDict()
+        # id_usuario -> leilões em que ele tem lances retidos
+        self.usuarios = {}
+
+    def _historico(self, id_leilao):
+        historico = self.leiloes.get(id_leilao)
+        if historico is None:
+            historico = self.leiloes[id_leilao] = HistoricoLeilao(self.max_por_leilao)
+            if len(self.leiloes) > self.max_leiloes:
+                antigo_id, antigo = self.leiloes.popitem(last=False)
+                for id_usuario in antigo.por_usuario:
+                    self._desindexar_usuario(id_usuario, antigo_id)
+        else:
+            self.leiloes.move_to_end(id_leilao)
+        return historico
+
+    def _desindexar_usuario(self, id_usuario, id_leilao):
+        leiloes = self.usuarios.get(id_usuario)
+        if leiloes is not None:
+            leiloes.discard(id_leilao)
+            if not leiloes:
+                del self.usuarios[id_usuario]
+
+    def adicionar(self, id_leilao, id_usuario, valor, ts):
+        inserido, sem_lances = self._historico(id_leilao).inserir(valor, id_usuario, ts)
+        if inserido:
+            self.usuarios.setdefault(id_usuario, set()).add(id_leilao)
+            if sem_lances is not None:
+                self._desindexar_usuario(sem_lances, id_leilao)
+        return inserido
+
+    def encerrar(self, id_leilao, id_vencedor, valor):
+        self._historico(id_leilao).vencedor = {"id_usuario": id_vencedor, "valor": valor}
+
+    def top(self, id_leilao, k=10):
+        historico = self.leiloes.get(id_leilao)
+        return historico.top(k) if historico is not None else []
+
+    def resumo(self, id_leilao):
+        historico = self.leiloes.get(id_leilao)
+        return historico.resumo() if historico is not None else None
+
+    def do_usuario(self, id_usuario, id_leilao=None):
+        """{id_leilao: [valores, crescentes]} com os lances retidos do usuário."""
+        leiloes = self.usuarios.get(id_usuario, ())
+        if id_leilao is not None:
+            leiloes = [id_leilao] if id_leilao in leiloes else []
+        return {l: list(self.leiloes[l].por_usuario[id_usuario]) for l in leiloes}
+
+    def stats(self):
+        return {
+            "leiloes": len(self.leiloes),
+            "lances_retidos": sum(len(h.lances) for h in self.leiloes.values()),
+            "usuarios": len(self.usuarios),
+        }
+
+
+def responder(indice, pedido):
+    """Executa um pedido de consulta e devolve o resultado (ValueError se inválido)."""
+    tipo = pedido.get('tipo')
+    if tipo == 'top':
+        k = pedido.get('k', 10)
+        if not isinstance(k, int) or not 0 < k <= MAX_K:
+            raise ValueError(f"k deve estar entre 1 e {MAX_K}")
+        return indice.top(pedido['id_leilao'], k)
+    if tipo == 'usuario':
+        return indice.do_usuario(pedido['id_usuario'], pedido.get('id_leilao'))
+    if tipo == 'resumo':
+        return indice.resumo(pedido['id_leilao'])
+    raise ValueError(f"Tipo de consulta desconhecido: {tipo}")
+
+
+def propriedades_resposta(correlation_id):
+    return pika.BasicProperties(content_type='application/json', correlation_id=correlation_id)
+
+
+class MSHistorico:
+    def __init__(self, indice=None):
+        self.indice = indice or IndiceLances()
+        self.channel = utils.get_rabbitmq_channel()
+        utils.setup_queues(self.channel)
+        self.channel.queue_declare(queue=FILA_HISTORICO, durable=True)
+        self.channel.queue_bind(exchange='notificacao_leilao', queue=FILA_HISTORICO, routing_key='leilao.*')
+        # Consultas não sobrevivem a um restart: quem pergunta desiste por timeout
+        self.channel.queue_declare(queue=utils.FILA_CONSULTAS)
+        self.consumidor = utils.Consumidor(self.channel)
+        metricas.medidor('ms_historico_leiloes', 'Leilões no índice').set_funcao(
+            lambda: len(self.indice.leiloes))
+
+    def processar_evento(self, ch, method, properties, body):
+        try:
+            evento = utils.decode_event(properties, body)
+            id_leilao = evento['id_leilao']
+            if 'id_vencedor' in evento:
+                self.indice.encerrar(id_leilao, evento['id_vencedor'], evento.get('valor'))
+                INDEXADOS.rotulos('vencedor').inc()
+            elif self.indice.adicionar(id_leilao, evento['id_usuario'], float(evento['valor']),
+                                       evento.get('ts') or time.time()):
+                INDEXADOS.rotulos('indexado').inc()
+            else:
+                INDEXADOS.rotulos('duplicado').inc()
+        except (ValueError, KeyError, TypeError):
+            log.warning('evento_malformado', extra={'campos': {'corpo': body[:200]}})
+            INDEXADOS.rotulos('malformado').inc()
+        self.consumidor.ack(method.delivery_tag)
+
+    def processar_consulta(self, ch, method, properties, body):
+        inicio = time.perf_counter()
+        # O rótulo vem do pedido do cliente: só tipos conhecidos viram série
+        rotulo = 'invalido'
+        try:
+            pedido = json.loads(body)
+            if pedido.get('tipo') in TIPOS_CONSULTA:
+                rotulo = pedido['tipo']
+            resposta = {"ok": True, "resultado": responder(self.indice, pedido)}
+            CONSULTAS.rotulos(rotulo, 'ok').inc()
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            resposta = {"ok": False, "erro": str(e) or type(e).__name__}
+            CONSULTAS.rotulos(rotulo, 'erro').inc()
+        DURACAO_CONSULTA.rotulos(rotulo).observar(time.perf_counter() - inicio)
+        if properties.reply_to:
+            self.channel.basic_publish(exchange='', routing_key=properties.reply_to,
+                                       body=json.dumps(resposta, default=str).encode('utf-8'),
+                                       properties=propriedades_resposta(properties.correlation_id))
+        self.consumidor.ack(method.delivery_tag)
+
+    def relatorio(self, intervalo):
+        log.info('indice', extra={'campos': self.indice.stats()})
+        self.channel.connection.call_later(intervalo, lambda: self.relatorio(intervalo))
+
+    def run(self):
+        self.consumidor.consumir(FILA_HISTORICO, self.processar_evento)
+        self.consumidor.consumir(utils.FILA_CONSULTAS, self.processar_consulta)
+        self.channel.connection.call_later(60, lambda: self.relatorio(60))
+        print("📚 MS Histórico iniciado! Indexando lances de notificacao_leilao")
+        print(f"🔎 Consultas na fila '{utils.FILA_CONSULTAS}'")
+        try:
+            self.channel.start_consuming()
+        except KeyboardInterrupt:
+            self.consumidor.flush()
+            print("\n🛑 MS Histórico encerrado pelo usuário")
+            print("Índice: " + " | ".join(f"{k}={v}" for k, v in self.indice.stats().items()))
+
+
+def consultar(pedido, timeout=5.0, channel=None):
+    """Cliente RPC bloqueante: envia o pedido e espera a resposta correspondente."""
+    proprio = channel is None
+    channel = channel or utils.get_rabbitmq_channel()
+    try:
+        fila = channel.queue_declare(queue='', exclusive=True).method.queue
+        correlation_id = uuid.uuid4().hex
+        resposta = []
+
+        def receber(ch, method, properties, body):
+            if properties.correlation_id == correlation_id:
+                resposta.append(json.loads(body))
+
+        tag = channel.basic_consume(queue=fila, on_message_callback=receber, auto_ack=True)
+        channel.basic_publish(exchange='', routing_key=utils.FILA_CONSULTAS,
+                              body=json.dumps(pedido).encode('utf-8'),
+                              properties=pika.BasicProperties(content_type='application/json',
+                                                              reply_to=fila,
+                                                              correlation_id=correlation_id))
+        limite = time.monotonic() + timeout
+        while not resposta and time.monotonic() < limite:
+            channel.connection.process_data_events(time_limit=min(0.1, max(0.0, limite - time.monotonic())))
+        channel.basic_cancel(tag)
+        channel.queue_delete(queue=fila)
+        if not resposta:
+            raise TimeoutError(f"Sem resposta do MS Histórico em {timeout} s")
+        return resposta[0]
+    finally:
+        if proprio:
+            channel.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MS Histórico')
+    parser.add_argument('--consulta', choices=('top', 'usuario', 'resumo'),
+                        help='faz uma consulta ao serviço em execução e sai')
+    parser.add_argument('--leilao', help='id do leilão consultado')
+    parser.add_argument('--usuario', help='id do usuário consultado')
+    parser.add_argument('-k', type=int, default=10, help='quantidade de lances no top')
+    parser.add_argument('--por-leilao', type=int, default=MAX_POR_LEILAO,
+                        help='lances guardados por leilão (padrão: LEILAO_HISTORICO_POR_LEILAO)')
+    parser.add_argument('--max-leiloes', type=int, default=MAX_LEILOES,
+                        help='leilões guardados no índice (padrão: LEILAO_HISTORICO_LEILOES)')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+
+    if args.consulta:
+        pedido = {"tipo": args.consulta}
+        if args.leilao:
+            pedido["id_leilao"] = args.leilao
+        if args.usuario:
+            pedido["id_usuario"] = args.usuario
+        if args.consulta == 'top':
+            pedido["k"] = args.k
+        print(json.dumps(consultar(pedido), indent=2, ensure_ascii=False))
+    else:
+        logs.configurar('ms_historico')
+        utils.iniciar_metricas(args.metricas_porta, 'MS Histórico')
+        MSHistorico(IndiceLances(args.por_leilao, args.max_leiloes)).run()
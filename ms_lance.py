@@ -1,52 +1,222 @@
 import utils
-import json
 import sys, os
+import argparse
+import time
+from verificacao import PipelineVerificacao
+from wal import LogLances
+from admissao import LimiteUsuarios, FiltroReplay
+import lance_automatico
+import wire
+import metricas
+import logging
+import logs
 
 PUBLIC_KEYS_DIR = 'public_keys'
 
+log = logging.getLogger('ms_lance')
+# Um registro por lance: limitado por evento para não virar o gargalo
+log_lances = logs.limitado('ms_lance.lances')
+
 leiloes_ativos = set()
+# id_leilao -> {"id_usuario", "valor"[, "maximo" do líder, se automático]}
 maiores_lances = {}
-chaves_publicas_cache = {}
+SEM_LANCES = {"id_usuario": None, "valor": 0}
+registro_chaves = utils.KeyRegistry(PUBLIC_KEYS_DIR)
+
+# Admissão antes da verificação (ver admissao.py)
+limite_usuarios = LimiteUsuarios()
+filtro_replay = FiltroReplay()
+# Sem isso, lances sem nonce/ts (clientes antigos) passam sem o filtro de replay
+EXIGIR_NONCE = os.environ.get('LEILAO_EXIGIR_NONCE') == '1'
+
+# Estágio de verificação paralela (None = verificação inline, serial)
+pipeline = None
+
+# Prefetch e acks em lote do canal de consumo (criado em run)
+consumidor = None
+
+# Shard deste processo no modo particionado (None = processa todos os leilões)
+shard_atual = None
+num_shards = 0
+
+# Log de escrita antecipada do estado (None = estado só em memória)
+wal = None
+# Mensagens cujo ack espera o próximo fsync do WAL (group commit)
+acks_pendentes = []
+LOTE_GROUP_COMMIT = 256
+INTERVALO_GROUP_COMMIT = 0.005
+_group_commit_agendado = False
+
+LANCES = metricas.contador('ms_lance_lances_total', 'Lances recebidos, por resultado', ['resultado'])
+ESTAGIOS = metricas.histograma('ms_lance_estagio_segundos',
+                               'Duração de cada estágio do processamento de um lance', ['estagio'])
+RECUSADOS = metricas.contador('ms_lance_admissao_recusados_total',
+                              'Lances recusados antes da verificação, por estágio', ['estagio'])
+FILA = metricas.medidor('ms_lance_fila_mensagens', 'Mensagens prontas nas filas consumidas', ['fila'])
+metricas.medidor('ms_lance_leiloes_ativos', 'Leilões ativos neste processo').set_funcao(
+    lambda: len(leiloes_ativos))
+# Séries do caminho quente resolvidas uma vez
+_VALIDOS = LANCES.rotulos('valido')
+_T_DECODE = ESTAGIOS.rotulos('decode')
+_T_ADMISSAO = ESTAGIOS.rotulos('admissao')
+_T_CHAVE = ESTAGIOS.rotulos('chave')
+ESTAGIOS_ADMISSAO = ('estado', 'taxa', 'replay')
+_RECUSADOS = {estagio: RECUSADOS.rotulos(estagio) for estagio in ESTAGIOS_ADMISSAO}
+_T_VERIFICACAO = ESTAGIOS.rotulos('verificacao')
+# No modo paralelo inclui a espera na fila do pool e na ordem do leilão
+_T_VERIFICACAO_PIPELINE = ESTAGIOS.rotulos('verificacao_pipeline')
+_T_DECISAO = ESTAGIOS.rotulos('decisao')
+_T_PUBLICACAO = ESTAGIOS.rotulos('publicacao')
 
 
 def get_public_key(user_id):
+    public_key = registro_chaves.get(user_id)
+    if not public_key:
+        log_lances.warning('chave_publica_ausente',
+                           extra={'campos': {'id_usuario': user_id, 'diretorio': PUBLIC_KEYS_DIR}})
+    return public_key
 
-    if user_id in chaves_publicas_cache:
-        return chaves_publicas_cache[user_id]
-    
+def relatorio_chaves(connection, intervalo):
+    log.info('cache_chaves', extra={'campos': registro_chaves.stats()})
+    connection.call_later(intervalo, lambda: relatorio_chaves(connection, intervalo))
 
-    key_path = os.path.join(PUBLIC_KEYS_DIR, f"{user_id}.pem")
-    public_key = utils.load_public_key_from_file(key_path)
-    
-    if public_key:
-        print(f"MS Lance: Chave pública para {user_id} carregada do arquivo e salva no cache.")
-        chaves_publicas_cache[user_id] = public_key
+def stats_admissao():
+    stats = {f"recusados_{estagio}": serie.valor for estagio, serie in _RECUSADOS.items()}
+    stats.update(limite_usuarios.stats())
+    stats.update(filtro_replay.stats())
+    return stats
+
+def relatorio_admissao(connection, intervalo):
+    log.info('admissao', extra={'campos': stats_admissao()})
+    connection.call_later(intervalo, lambda: relatorio_admissao(connection, intervalo))
+
+def admitir(lance_info):
+    """Estágios baratos, em ordem. None se o lance segue para a verificação; senão (estágio, motivo)."""
+    id_leilao = lance_info['id_leilao']
+    id_usuario = lance_info['id_usuario']
+    # Lance automático: o máximo não pode ser menor que o preço atual
+    valor = lance_info.get('maximo', lance_info.get('valor'))
+    if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+        return 'estado', 'malformado'
+    if not lance_automatico.valor_valido(valor):
+        return 'estado', 'valor_invalido'
+    if id_leilao not in leiloes_ativos:
+        return 'estado', 'leilao_inativo'
+    # No modo paralelo o maior lance ainda pode subir com lances em verificação;
+    # aplicar_lance confere de novo, aqui só se descarta o que já é certo perder
+    if not (valor > maiores_lances.get(id_leilao, {}).get("valor", 0)):
+        return 'estado', 'lance_baixo'
+
+    if not limite_usuarios.permitir(id_usuario):
+        return 'taxa', 'limite_taxa'
+
+    nonce = lance_info.get('nonce')
+    if nonce is None:
+        return ('replay', 'sem_nonce') if EXIGIR_NONCE else None
+    if not isinstance(nonce, str) or len(nonce) > 64:
+        return 'replay', 'nonce_invalido'
+    motivo = filtro_replay.verificar(id_usuario, nonce, lance_info.get('ts'))
+    return None if motivo is None else ('replay', motivo)
+
+def em_ordem(id_leilao, acao):
+    """Executa a ação após os lances do leilão ainda em verificação."""
+    if pipeline is None:
+        acao()
     else:
-        print(f"MS Lance: ATENÇÃO! Não foi possível encontrar a chave pública para {user_id} em {key_path}")
+        pipeline.enfileirar_evento(id_leilao, acao)
 
-    return public_key
+def registrar(registro):
+    """Acrescenta uma mudança de estado ao WAL, se habilitado."""
+    if wal is not None:
+        wal.registrar(registro)
+
+def confirmar(delivery_tag):
+    """Ack da mensagem; com WAL, só depois que os registros pendentes forem duráveis."""
+    global _group_commit_agendado
+    if wal is None or not wal.pendentes:
+        consumidor.ack(delivery_tag)
+        return
+    acks_pendentes.append(delivery_tag)
+    if wal.pendentes >= LOTE_GROUP_COMMIT:
+        group_commit()
+    elif not _group_commit_agendado:
+        _group_commit_agendado = True
+        consumidor.channel.connection.call_later(INTERVALO_GROUP_COMMIT, group_commit)
+
+def group_commit():
+    """Um fsync para o lote inteiro e, em seguida, os acks que o aguardavam."""
+    global _group_commit_agendado
+    _group_commit_agendado = False
+    wal.sincronizar()
+    for delivery_tag in acks_pendentes:
+        consumidor.ack(delivery_tag)
+    acks_pendentes.clear()
+    if wal.precisa_snapshot():
+        inicio = time.perf_counter()
+        wal.snapshot(leiloes_ativos, maiores_lances)
+        print(f"MS Lance: Snapshot do estado gravado em {(time.perf_counter() - inicio) * 1e3:.1f} ms.")
+
+def meu_leilao(id_leilao):
+    """No modo particionado, só o shard dono mantém estado do leilão."""
+    return shard_atual is None or utils.shard_for(id_leilao, num_shards) == shard_atual
+
+def id_leilao_do_evento(properties, body):
+    """id_leilao de um evento de leilão; ValueError se o evento for malformado."""
+    data = utils.decode_event(properties, body)
+    if not isinstance(data, dict) or not isinstance(data.get('id_leilao'), str):
+        raise ValueError("Evento sem id_leilao")
+    return data['id_leilao']
 
 def callback_leilao_iniciado(ch, method, properties, body):
     if not body:
+        consumidor.ack(method.delivery_tag)
         return
     try:
-        data = json.loads(body)
-        id_leilao_iniciado = data['id_leilao']
-        leiloes_ativos.add(id_leilao_iniciado)
-        maiores_lances[id_leilao_iniciado] = {"id_usuario": None, "valor": 0}
-        print(f"MS Lance: Leilão {id_leilao_iniciado} está ativo.")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-    except json.JSONDecodeError:
-        print(f" [!] Erro ao decodificar JSON: {body}")
+        id_leilao_iniciado = id_leilao_do_evento(properties, body)
+        # leilao_iniciado é fanout: todo shard recebe, só o dono ativa
+        if not meu_leilao(id_leilao_iniciado):
+            consumidor.ack(method.delivery_tag)
+            return
+
+        def ativar():
+            # Reentrega (a fila é durável) de um leilão que o WAL já
+            # recuperou como ativo: reativar zeraria o maior lance
+            if id_leilao_iniciado in leiloes_ativos:
+                confirmar(method.delivery_tag)
+                return
+            leiloes_ativos.add(id_leilao_iniciado)
+            maiores_lances[id_leilao_iniciado] = {"id_usuario": None, "valor": 0}
+            registrar(["i", id_leilao_iniciado])
+            log.info('leilao_ativo', extra={'campos': {'id_leilao': id_leilao_iniciado}})
+            confirmar(method.delivery_tag)
+
+        em_ordem(id_leilao_iniciado, ativar)
+    except (ValueError, KeyError, TypeError):
+        log.warning('evento_malformado', extra={'campos': {'fila': 'leilao_iniciado', 'corpo': body[:200]}})
+        consumidor.rejeitar(method.delivery_tag)
 
 
 def callback_leilao_finalizado(ch, method, properties, body):
     if not body:
+        consumidor.ack(method.delivery_tag)
+        return
+    try:
+        id_leilao_finalizado = id_leilao_do_evento(properties, body)
+    except (ValueError, KeyError, TypeError):
+        log.warning('evento_malformado', extra={'campos': {'fila': 'leilao_finalizado', 'corpo': body[:200]}})
+        consumidor.rejeitar(method.delivery_tag)
         return
-    data = json.loads(body)
-    id_leilao_finalizado = data['id_leilao']
+
+    def encerrar():
+        finalizar_leilao(id_leilao_finalizado)
+        confirmar(method.delivery_tag)
+
+    em_ordem(id_leilao_finalizado, encerrar)
+
+def finalizar_leilao(id_leilao_finalizado):
     if id_leilao_finalizado in leiloes_ativos:
         leiloes_ativos.remove(id_leilao_finalizado)
+        registrar(["f", id_leilao_finalizado])
         
         vencedor = maiores_lances.get(id_leilao_finalizado)
         if vencedor and vencedor["id_usuario"]:
@@ -55,76 +225,260 @@ def callback_leilao_finalizado(ch, method, properties, body):
                 "id_vencedor": vencedor["id_usuario"],
                 "valor": vencedor["valor"]
             }
-            channel = utils.get_rabbitmq_channel()
-            channel.basic_publish(
+            corpo, content_type = utils.encode_event(publication)
+            utils.publish_event(
                 exchange='',
                 routing_key='leilao_vencedor',
-                body=json.dumps(publication)
+                body=corpo,
+                properties=utils.event_properties(content_type, persistente=True)
             )
-            print(f"MS Lance: Leilão {id_leilao_finalizado} encerrado. Vencedor: {vencedor['id_usuario']} com R${vencedor['valor']}.")
+            log.info('leilao_encerrado', extra={'campos': {
+                'id_leilao': id_leilao_finalizado, 'id_vencedor': vencedor['id_usuario'],
+                'valor': vencedor['valor']}})
         else:
-            print(f"MS Lance: Leilão {id_leilao_finalizado} encerrado sem lances.")
-            
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+            log.info('leilao_encerrado', extra={'campos': {'id_leilao': id_leilao_finalizado, 'id_vencedor': None}})
 
 def callback_lance_realizado(ch, method, properties, body):
     if not body:
+        LANCES.rotulos('malformado').inc()
+        consumidor.ack(method.delivery_tag)
+        return
+    inicio = time.perf_counter()
+    try:
+        # payload são os bytes assinados; são verificados e repassados sem reserializar
+        payload, lance_info, alg, ass, content_type = utils.open_signed_message(properties, body)
+        id_usuario = lance_info['id_usuario']
+        id_leilao_realizado = lance_info['id_leilao']
+        # Os ids viram chaves de dicionário e nomes de arquivo adiante
+        if not isinstance(id_usuario, str) or not isinstance(id_leilao_realizado, str):
+            raise ValueError("id_usuario e id_leilao devem ser texto")
+    except (ValueError, KeyError, TypeError):
+        log_lances.warning('lance_malformado', extra={'campos': {'corpo': body[:200]}})
+        LANCES.rotulos('malformado').inc()
+        consumidor.rejeitar(method.delivery_tag)
+        return
+    decodificado = time.perf_counter()
+    _T_DECODE.observar(decodificado - inicio)
+
+    recusa = admitir(lance_info)
+    admitido = time.perf_counter()
+    _T_ADMISSAO.observar(admitido - decodificado)
+    if recusa is not None:
+        estagio, motivo = recusa
+        _RECUSADOS[estagio].inc()
+        LANCES.rotulos(motivo).inc()
+        if log_lances.isEnabledFor(logging.INFO):
+            log_lances.info('lance_recusado', extra={'campos': {
+                'id_leilao': id_leilao_realizado, 'id_usuario': id_usuario,
+                'valor': lance_info.get('valor'), 'estagio': estagio, 'motivo': motivo}})
+        # Recusa de negócio, como um lance baixo decidido depois da verificação
+        consumidor.ack(method.delivery_tag)
         return
-    data = json.loads(body)
-    lance_info = data['data']
-    id_usuario = lance_info['id_usuario']
-    id_leilao_realizado = lance_info['id_leilao']
-    valor_lance = lance_info['valor']
-    ass = bytes.fromhex(data['assinatura'])
 
     public_key = get_public_key(id_usuario)
+    com_chave = time.perf_counter()
+    _T_CHAVE.observar(com_chave - admitido)
     if not public_key:
-        print(f"Não foi possivel realizar a verificação do lance de {id_usuario}")
+        # Sem a chave o lance nunca poderá ser verificado: rejeita em vez de
+        # deixá-lo sem ack ocupando o prefetch (e travando os acks em lote)
+        LANCES.rotulos('sem_chave').inc()
+        consumidor.rejeitar(method.delivery_tag)
         return
 
+    def aplicar(ass_valida):
+        aplicar_lance(lance_info, payload, ass_valida, content_type)
+        confirmar(method.delivery_tag)
+
+    if alg not in utils.SCHEMES:
+        log_lances.warning('algoritmo_desconhecido', extra={'campos': {'alg': alg, 'id_usuario': id_usuario}})
+        aplicar(False)
+    elif pipeline is None:
+        ass_valida = utils.verify_signature(public_key, ass, payload, alg)
+        _T_VERIFICACAO.observar(time.perf_counter() - com_chave)
+        aplicar(ass_valida)
+    else:
+        def verificado(ass_valida):
+            _T_VERIFICACAO_PIPELINE.observar(time.perf_counter() - com_chave)
+            aplicar(ass_valida)
+
+        pem = registro_chaves.get_pem(id_usuario)
+        pipeline.enfileirar_lance(id_leilao_realizado, pem, ass, payload, alg, verificado)
+
+def aplicar_lance(lance_info, payload, ass_valida, content_type=wire.CONTENT_TYPE_JSON):
+    """Decide o lance já com a assinatura verificada e publica se mudou o preço.
+
+    Um lance comum que vira o maior é repassado com o payload assinado; se
+    um lance automático (ver lance_automatico.py) decidiu o novo preço, o
+    evento publicado é gerado aqui e nunca leva o máximo.
+    """
+    inicio = time.perf_counter()
+    id_usuario = lance_info['id_usuario']
+    id_leilao_realizado = lance_info['id_leilao']
+    automatico = 'maximo' in lance_info
+    valor_lance = lance_info['maximo'] if automatico else lance_info['valor']
+
     leilao_existe_e_ativo = id_leilao_realizado in leiloes_ativos
-    lance_maior = valor_lance > maiores_lances.get(id_leilao_realizado, {}).get("valor", 0)
+    atual = maiores_lances.get(id_leilao_realizado) or SEM_LANCES
+    novo, motivo = None, ('assinatura_invalida' if not ass_valida else
+                          'leilao_inativo' if not leilao_existe_e_ativo else None)
+    if motivo is None:
+        novo, motivo = lance_automatico.resolver(atual, id_usuario, valor_lance, automatico)
 
-    ass_valida = utils.verify_signature(public_key, ass, lance_info)
+    if novo is not None:
+        lider = novo["id_usuario"]
+        if log_lances.isEnabledFor(logging.INFO):
+            log_lances.info('lance_valido', extra={'campos': {
+                'id_leilao': id_leilao_realizado, 'id_usuario': id_usuario, 'valor': valor_lance,
+                'automatico': automatico, 'lider': lider, 'preco': novo['valor']}})
+        maiores_lances[id_leilao_realizado] = novo
+        registro = ["l", id_leilao_realizado, lider, novo["valor"]]
+        if "maximo" in novo:
+            registro.append(novo["maximo"])
+        registrar(registro)
+        if lider == id_usuario:
+            _VALIDOS.inc()
+        else:
+            # Aceito, mas o máximo do líder cobriu o lance
+            LANCES.rotulos('superado').inc()
+        decidido = time.perf_counter()
+        _T_DECISAO.observar(decidido - inicio)
 
-    if leilao_existe_e_ativo and lance_maior and ass_valida:
-        print(f"MS Lance: Lance de {id_usuario} no leilão {id_leilao_realizado} de R${valor_lance} é VÁLIDO.")
-        maiores_lances[id_leilao_realizado] = {"id_usuario": id_usuario, "valor": valor_lance}
-        
-        channel = utils.get_rabbitmq_channel()
-        channel.basic_publish(
+        if not automatico and lider == id_usuario and novo["valor"] == valor_lance:
+            body, properties = payload, utils.event_properties(content_type, persistente=True)
+        elif (lider, novo["valor"]) != (atual["id_usuario"], atual["valor"]):
+            body, content_type = utils.encode_event({
+                "id_leilao": id_leilao_realizado, "id_usuario": lider, "valor": novo["valor"],
+                "automatico": True, "ts": round(time.time(), 3)})
+            properties = utils.event_properties(content_type, persistente=True)
+        else:
+            # O líder só subiu o próprio máximo: o preço visível não mudou
+            return
+        utils.publish_event(
             exchange='',
             routing_key='lance_validado',
-            body=json.dumps(lance_info)
+            body=body,
+            properties=properties
         )
+        _T_PUBLICACAO.observar(time.perf_counter() - decidido)
     else:
-        print(f"MS Lance: Lance de {id_usuario} no leilão {id_leilao_realizado} de R${valor_lance} é INVÁLIDO.")
-        print(f"  - Leilão Ativo: {leilao_existe_e_ativo}")
-        print(f"  - Lance Maior: {lance_maior} (Atual: {maiores_lances.get(id_leilao_realizado, {}).get('valor', 0)})")
-        print(f"  - Assinatura válida: {ass_valida}")
+        LANCES.rotulos(motivo).inc()
+        if log_lances.isEnabledFor(logging.INFO):
+            log_lances.info('lance_invalido', extra={'campos': {
+                'id_leilao': id_leilao_realizado, 'id_usuario': id_usuario, 'valor': valor_lance,
+                'automatico': automatico, 'motivo': motivo, 'leilao_ativo': leilao_existe_e_ativo,
+                'valor_atual': atual['valor'], 'assinatura_valida': ass_valida}})
+        _T_DECISAO.observar(time.perf_counter() - inicio)
 
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+def recuperar_estado(diretorio):
+    """Abre o WAL e reconstrói leiloes_ativos/maiores_lances a partir dele."""
+    global wal
+    wal = LogLances(diretorio)
+    inicio = time.perf_counter()
+    ativos, maiores, reaplicados = wal.recuperar()
+    leiloes_ativos.update(ativos)
+    maiores_lances.update(maiores)
+    print(f"MS Lance: Estado recuperado de {diretorio} em {(time.perf_counter() - inicio) * 1e3:.1f} ms "
+          f"({len(leiloes_ativos)} leilões ativos, {reaplicados} registros reaplicados).")
+
+def medir_filas(channel, filas, intervalo):
+    """Atualiza periodicamente quantas mensagens esperam em cada fila consumida."""
+    for fila in filas:
+        FILA.rotulos(fila).set(channel.queue_declare(queue=fila, passive=True).method.message_count)
+    channel.connection.call_later(intervalo, lambda: medir_filas(channel, filas, intervalo))
+
+def run(workers=0, prefetch=None, precarregar=True, shard=None, shards=0, dir_wal=None,
+        porta_metricas=0):
+    global pipeline, shard_atual, num_shards, consumidor
+    utils.iniciar_metricas(porta_metricas, 'MS Lance')
+    if dir_wal:
+        # Cada shard tem seu próprio log
+        recuperar_estado(os.path.join(dir_wal, f"shard-{shard}") if shards > 0 else dir_wal)
 
-def run():
     channel = utils.get_rabbitmq_channel()
     utils.setup_queues(channel)
-    
 
-    result = channel.queue_declare(queue='', exclusive=True)
-    queue_name_iniciado = result.method.queue
-    channel.queue_bind(exchange='leilao_iniciado', queue=queue_name_iniciado)
-    channel.basic_consume(queue=queue_name_iniciado, on_message_callback=callback_leilao_iniciado)
-    channel.basic_consume(queue='leilao_finalizado', on_message_callback=callback_leilao_finalizado)
-    channel.basic_consume(queue='lance_realizado', on_message_callback=callback_lance_realizado)
+    fila_lances, fila_finalizado = 'lance_realizado', 'leilao_finalizado'
+    fila_iniciado = utils.FILA_INICIADOS_LANCE
+    if shards > 0:
+        shard_atual, num_shards = shard, shards
+        utils.setup_shards(channel, shards)
+        fila_lances, fila_finalizado = f'lance_realizado.{shard}', f'leilao_finalizado.{shard}'
+        fila_iniciado = utils.fila_iniciados_shard(shard)
+        print(f"MS Lance: Shard {shard} de {shards}.")
+    utils.declarar_fila_iniciados(channel, fila_iniciado)
+
+    if precarregar:
+        print(f"MS Lance: {registro_chaves.preload()} chaves públicas pré-carregadas.")
+    channel.connection.call_later(60, lambda: relatorio_chaves(channel.connection, 60))
+    channel.connection.call_later(60, lambda: relatorio_admissao(channel.connection, 60))
+
+    if workers > 0:
+        pipeline = PipelineVerificacao(channel.connection, workers)
+        print(f"MS Lance: Verificação paralela com {workers} workers.")
+    # Limita as mensagens em voo; sem isso o broker entrega a fila inteira.
+    # No modo paralelo o padrão acompanha o número de workers.
+    consumidor = utils.Consumidor(channel, prefetch or (workers * 32 if workers > 0 else utils.PREFETCH))
+
+    consumidor.consumir(fila_iniciado, callback_leilao_iniciado)
+    consumidor.consumir(fila_finalizado, callback_leilao_finalizado)
+    consumidor.consumir(fila_lances, callback_lance_realizado)
+    if pipeline is not None:
+        metricas.medidor('ms_lance_pipeline_profundidade',
+                         'Lances aguardando verificação no pool').set_funcao(pipeline.profundidade)
+    metricas.medidor('ms_lance_acks_aguardando',
+                     'Entregas concluídas esperando o ack cumulativo').set_funcao(
+        lambda: consumidor.stats()['aguardando'])
+    medir_filas(channel, [fila_lances, fila_finalizado, fila_iniciado], 5)
     
     print('MS Lance: Aguardando eventos...')
     channel.start_consuming()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MS Lance')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('MS_LANCE_WORKERS', 0)),
+                        help='processos para verificação de assinaturas (0 = serial)')
+    parser.add_argument('--prefetch', type=int, default=None,
+                        help='mensagens entregues sem ack (padrão: 32 por worker, ou LEILAO_PREFETCH)')
+    parser.add_argument('--max-chaves', type=int, default=10000,
+                        help='tamanho máximo do cache LRU de chaves públicas')
+    parser.add_argument('--sem-precarga', action='store_true',
+                        help='não carrega o diretório de chaves na inicialização')
+    parser.add_argument('--shards', type=int, default=utils.NUM_SHARDS,
+                        help='total de shards no modo particionado (padrão: LEILAO_SHARDS)')
+    parser.add_argument('--shard', type=int, default=0, help='shard deste processo')
+    parser.add_argument('--wal', default=os.environ.get('MS_LANCE_WAL'),
+                        help='diretório do log/snapshots do estado (padrão: MS_LANCE_WAL; sem ele, só memória)')
+    parser.add_argument('--lances-por-usuario', type=float, default=limite_usuarios.taxa,
+                        help='lances/s aceitos por usuário antes da verificação (0 = sem limite)')
+    parser.add_argument('--exigir-nonce', action='store_true', default=EXIGIR_NONCE,
+                        help='recusa lances sem nonce/ts (padrão: LEILAO_EXIGIR_NONCE=1)')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+    if args.shards > 0 and not 0 <= args.shard < args.shards:
+        parser.error('--shard deve estar entre 0 e --shards - 1')
+    if args.shards != utils.NUM_SHARDS:
+        # Os publicadores roteiam por LEILAO_SHARDS: com outro número, lances
+        # e fins de leilão iriam para filas que nenhum worker consome
+        parser.error(f'--shards {args.shards} difere de LEILAO_SHARDS={utils.NUM_SHARDS}')
+    logs.configurar(f'ms_lance.{args.shard}' if args.shards > 0 else 'ms_lance')
+    registro_chaves.max_chaves = args.max_chaves
+    limite_usuarios.taxa = args.lances_por_usuario
+    EXIGIR_NONCE = args.exigir_nonce
     try:
-        run()
+        run(args.workers, args.prefetch, not args.sem_precarga, args.shard, args.shards, args.wal,
+            args.metricas_porta)
     except KeyboardInterrupt:
         print('Interrupted')
+        if pipeline is not None:
+            pipeline.encerrar()
+        if wal is not None:
+            wal.fechar()
+        if consumidor is not None and consumidor.channel.is_open:
+            consumidor.flush()
+            print("MS Lance: Acks: " + " | ".join(f"{k}={v}" for k, v in consumidor.stats().items()))
+        print("MS Lance: Admissão: " + " | ".join(f"{k}={v}" for k, v in stats_admissao().items()))
+        utils.close_pool()
         try:
             sys.exit(0)
         except SystemExit:
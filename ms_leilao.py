@@ -5,48 +5,88 @@ import datetime
 import time
 import threading
 from typing import Dict, List
+import argparse
+from agendador import Agendador
+from catalogo import CatalogoLeiloes
+import metricas
+import logging
+import logs
+
+log = logging.getLogger('ms_leilao')
+
+TRANSICOES = metricas.contador('ms_leilao_transicoes_total', 'Transições de estado dos leilões', ['tipo'])
+DURACAO_TRANSICAO = metricas.histograma('ms_leilao_transicao_segundos',
+                                        'Duração de uma transição (catálogo + publicação)', ['tipo'])
+ATRASO_TRANSICAO = metricas.histograma('ms_leilao_atraso_transicao_segundos',
+                                       'Atraso entre o horário previsto da transição e sua execução')
+
+def leiloes_iniciais(agora=None):
+    """Leilões de demonstração, com horários relativos a 'agora'.
+
+    Cadastrados quando o catálogo ainda está vazio (ou a cada execução com
+    --demo): todos são iniciados e finalizados nos próximos minutos.
+    """
+    agora = agora or datetime.datetime.now()
+    em = lambda segundos: agora + datetime.timedelta(seconds=segundos)
+    return {
+        "leilao_001": {
+            "descricao": "iPhone 15 Pro Max 256GB - Azul Titânio",
+            "inicio": agora,
+            "fim": em(80),
+            "status": "agendado"
+        },
+        "leilao_002": {
+            "descricao": "MacBook Air M2 13'' 512GB - Meia-noite",
+            "inicio": em(30),
+            "fim": em(180),
+            "status": "agendado"
+        },
+        "leilao_003": {
+            "descricao": "Samsung Galaxy S24 Ultra 512GB - Preto",
+            "inicio": em(60),
+            "fim": em(240),
+            "status": "agendado"
+        },
+        "leilao_004": {
+            "descricao": "PlayStation 5 + 2 Controles + 3 Jogos",
+            "inicio": em(120),
+            "fim": em(300),
+            "status": "agendado"
+        },
+        "leilao_005": {
+            "descricao": "Nintendo Switch OLED + 5 Jogos Exclusivos",
+            "inicio": em(180),
+            "fim": em(360),
+            "status": "agendado"
+        }
+    }
 
 class MSLeilao:
-    def __init__(self):
+    # Segundos à frente cujas transições são carregadas do catálogo por vez
+    JANELA = 300
+    
+    def __init__(self, caminho_catalogo: str = 'leiloes.db', demo: bool = False):
         self.channel = utils.get_rabbitmq_channel()
         self.setup_queues()
         
-        # Lista pré-configurada (hardcoded) de leilões
-        self.leiloes = {
-            "leilao_001": {
-                "descricao": "iPhone 15 Pro Max 256GB - Azul Titânio",
-                "inicio": datetime.datetime(2025, 9, 9, 10, 10, 0),  # 15/01/2024 14:00
-                "fim": datetime.datetime.now() + datetime.timedelta(seconds=80),    # 15/01/2024 16:00
-                "status": "agendado"
-            },
-            "leilao_002": {
-                "descricao": "MacBook Air M2 13'' 512GB - Meia-noite",
-                "inicio": datetime.datetime(2024, 1, 16, 10, 0, 0),  # 16/01/2024 10:00
-                "fim": datetime.datetime(2024, 1, 16, 12, 0, 0),     # 16/01/2024 12:00
-                "status": "agendado"
-            },
-            "leilao_003": {
-                "descricao": "Samsung Galaxy S24 Ultra 512GB - Preto",
-                "inicio": datetime.datetime(2024, 1, 17, 15, 30, 0), # 17/01/2024 15:30
-                "fim": datetime.datetime(2024, 1, 17, 17, 30, 0),    # 17/01/2024 17:30
-                "status": "agendado"
-            },
-            "leilao_004": {
-                "descricao": "PlayStation 5 + 2 Controles + 3 Jogos",
-                "inicio": datetime.datetime(2024, 1, 18, 20, 0, 0),  # 18/01/2024 20:00
-                "fim": datetime.datetime(2024, 1, 18, 22, 0, 0),     # 18/01/2024 22:00
-                "status": "agendado"
-            },
-            "leilao_005": {
-                "descricao": "Nintendo Switch OLED + 5 Jogos Exclusivos",
-                "inicio": datetime.datetime(2024, 1, 19, 19, 0, 0),  # 19/01/2024 19:00
-                "fim": datetime.datetime(2024, 1, 19, 21, 0, 0),     # 19/01/2024 21:00
-                "status": "agendado"
-            }
-        }
+        self.catalogo = CatalogoLeiloes(caminho_catalogo)
+        # Os horários de demonstração são relativos: com --demo são renovados
+        # (e os leilões voltam a 'agendado') a cada execução
+        if demo or self.catalogo.contar() == 0:
+            for id_leilao, leilao in leiloes_iniciais().items():
+                self.catalogo.adicionar(id_leilao, leilao["descricao"],
+                                        leilao["inicio"], leilao["fim"], leilao["status"])
+        
+        self.agendador = Agendador()
+        # Transições já colocadas no agendador, para não duplicar ao recarregar
+        self._agendadas = set()
+        self._lock = threading.Lock()
+        self.carregar_janela()
+        metricas.medidor('ms_leilao_transicoes_agendadas',
+                         'Transições carregadas no agendador').set_funcao(self.agendador.pendentes)
         
         print("MS Leilão inicializado com sucesso!")
-        print(f"Total de leilões cadastrados: {len(self.leiloes)}")
+        print(f"Total de leilões cadastrados: {self.catalogo.contar()}")
     
     def setup_queues(self):
         """Configura as filas necessárias para o MS Leilão"""
@@ -55,12 +95,12 @@ class MSLeilao:
     
     def iniciar_leilao(self, id_leilao: str):
         """Inicia um leilão e publica o evento"""
-        if id_leilao not in self.leiloes:
-            print(f"Erro: Leilão {id_leilao} não encontrado!")
+        leilao = self.catalogo.obter(id_leilao)
+        if leilao is None:
+            log.error('leilao_nao_encontrado', extra={'campos': {'id_leilao': id_leilao}})
             return
         
-        leilao = self.leiloes[id_leilao]
-        leilao["status"] = "ativo"
+        self.catalogo.atualizar_status(id_leilao, "ativo")
         
         # Dados do evento de leilão iniciado
         evento = {
@@ -72,22 +112,24 @@ class MSLeilao:
         }
         
         # Publica o evento na fila
-        self.channel.basic_publish(
+        corpo, content_type = utils.encode_event(evento)
+        utils.publish_event(
             exchange='leilao_iniciado',
             routing_key='',
-            body=json.dumps(evento),
+            body=corpo,
+            properties=utils.event_properties(content_type, persistente=True)
         )
         
-        print(f"✅ Leilão {id_leilao} iniciado: {leilao['descricao']}")
+        log.info('leilao_iniciado', extra={'campos': {'id_leilao': id_leilao, 'descricao': leilao['descricao']}})
     
     def finalizar_leilao(self, id_leilao: str):
         """Finaliza um leilão e publica o evento"""
-        if id_leilao not in self.leiloes:
-            print(f"Erro: Leilão {id_leilao} não encontrado!")
+        leilao = self.catalogo.obter(id_leilao)
+        if leilao is None:
+            log.error('leilao_nao_encontrado', extra={'campos': {'id_leilao': id_leilao}})
             return
         
-        leilao = self.leiloes[id_leilao]
-        leilao["status"] = "finalizado"
+        self.catalogo.atualizar_status(id_leilao, "finalizado")
         
         # Dados do evento de leilão finalizado
         evento = {
@@ -97,51 +139,110 @@ class MSLeilao:
             "fim": leilao["fim"].isoformat()
         }
         
-        # Publica o evento na fila
-        self.channel.basic_publish(
-            exchange='',
-            routing_key='leilao_finalizado',
-            body=json.dumps(evento),
-            properties=pika.BasicProperties(delivery_mode=2)
+        # Publica o evento na fila (do shard dono do leilão, se particionado)
+        corpo, content_type = utils.encode_event(evento)
+        exchange, routing_key = utils.route_finished(id_leilao)
+        utils.publish_event(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=corpo,
+            properties=utils.event_properties(content_type, persistente=True)
         )
         
-        print(f"🏁 Leilão {id_leilao} finalizado: {leilao['descricao']}")
+        log.info('leilao_finalizado', extra={'campos': {'id_leilao': id_leilao, 'descricao': leilao['descricao']}})
     
-    def verificar_leiloes(self):
-        """Verifica quais leilões devem ser iniciados ou finalizados"""
-        agora = datetime.datetime.now()
-        
-        for id_leilao, leilao in self.leiloes.items():
-            # Verifica se deve iniciar
-            if (leilao["status"] == "agendado" and 
-                agora >= leilao["inicio"] and 
-                agora < leilao["fim"]):
-                self.iniciar_leilao(id_leilao)
-            
-            # Verifica se deve finalizar
-            elif (leilao["status"] == "ativo" and 
-                  agora >= leilao["fim"]):
-                self.finalizar_leilao(id_leilao)
+    def carregar_janela(self):
+        """Agenda as transições do catálogo devidas na próxima janela"""
+        ate = time.time() + self.JANELA
+        for quando, id_leilao, tipo in self.catalogo.proximas_transicoes(ate):
+            self._agendar(quando, id_leilao, tipo)
+        self.agendador.agendar(time.time() + self.JANELA / 2, None, self.carregar_janela)
+    
+    def _agendar(self, quando: float, id_leilao: str, tipo: str):
+        with self._lock:
+            if (id_leilao, tipo) in self._agendadas:
+                return
+            self._agendadas.add((id_leilao, tipo))
+        transicao = self._transicao_inicio if tipo == "inicio" else self._transicao_fim
+        
+        def executar():
+            ATRASO_TRANSICAO.observar(max(0.0, time.time() - quando))
+            inicio = time.perf_counter()
+            transicao(id_leilao)
+            DURACAO_TRANSICAO.rotulos(tipo).observar(time.perf_counter() - inicio)
+        
+        self.agendador.agendar(quando, id_leilao, executar)
     
-    def listar_leiloes(self):
+    def _transicao_inicio(self, id_leilao: str):
+        with self._lock:
+            self._agendadas.discard((id_leilao, "inicio"))
+        leilao = self.catalogo.obter(id_leilao)
+        if not leilao or leilao["status"] != "agendado":
+            return
+        # Leilões cujo fim já passou nunca chegam a ser iniciados
+        if datetime.datetime.now() >= leilao["fim"]:
+            self.catalogo.atualizar_status(id_leilao, "expirado")
+            TRANSICOES.rotulos("expirado").inc()
+            return
+        self.iniciar_leilao(id_leilao)
+        TRANSICOES.rotulos("inicio").inc()
+        fim = leilao["fim"].timestamp()
+        if fim <= time.time() + self.JANELA:
+            self._agendar(fim, id_leilao, "fim")
+    
+    def _transicao_fim(self, id_leilao: str):
+        with self._lock:
+            self._agendadas.discard((id_leilao, "fim"))
+        leilao = self.catalogo.obter(id_leilao)
+        if leilao and leilao["status"] == "ativo":
+            self.finalizar_leilao(id_leilao)
+            TRANSICOES.rotulos("fim").inc()
+    
+    def _descartar_transicoes(self, id_leilao: str):
+        self.agendador.cancelar_chave(id_leilao)
+        with self._lock:
+            self._agendadas.discard((id_leilao, "inicio"))
+            self._agendadas.discard((id_leilao, "fim"))
+    
+    def adicionar_leilao(self, id_leilao: str, descricao: str,
+                         inicio: datetime.datetime, fim: datetime.datetime):
+        """Cadastra um leilão em tempo de execução"""
+        self._descartar_transicoes(id_leilao)
+        self.catalogo.adicionar(id_leilao, descricao, inicio, fim)
+        if inicio.timestamp() <= time.time() + self.JANELA:
+            self._agendar(inicio.timestamp(), id_leilao, "inicio")
+    
+    def cancelar_leilao(self, id_leilao: str):
+        """Cancela um leilão ainda não iniciado e remove suas transições pendentes"""
+        self._descartar_transicoes(id_leilao)
+        leilao = self.catalogo.obter(id_leilao)
+        if leilao and leilao["status"] == "agendado":
+            self.catalogo.atualizar_status(id_leilao, "cancelado")
+            TRANSICOES.rotulos("cancelado").inc()
+    
+    def listar_leiloes(self, tamanho_pagina: int = 50):
         """Lista todos os leilões e seus status"""
         print("\n" + "="*60)
         print("📋 LEILÕES CADASTRADOS")
         print("="*60)
         
-        for id_leilao, leilao in self.leiloes.items():
-            status_emoji = {
-                "agendado": "⏰",
-                "ativo": "🔥",
-                "finalizado": "✅"
-            }
-            
-            print(f"{status_emoji.get(leilao['status'], '❓')} {id_leilao}")
-            print(f"   📝 {leilao['descricao']}")
-            print(f"   🕐 Início: {leilao['inicio'].strftime('%d/%m/%Y %H:%M')}")
-            print(f"   🕐 Fim: {leilao['fim'].strftime('%d/%m/%Y %H:%M')}")
-            print(f"   📊 Status: {leilao['status'].upper()}")
-            print("-" * 60)
+        status_emoji = {
+            "agendado": "⏰",
+            "ativo": "🔥",
+            "finalizado": "✅",
+            "cancelado": "🚫",
+            "expirado": "⌛"
+        }
+        
+        # Percorre o catálogo página a página, sem carregar tudo em memória
+        for pagina in self.catalogo.paginas(tamanho_pagina):
+            for leilao in pagina:
+                print(f"{status_emoji.get(leilao['status'], '❓')} {leilao['id_leilao']}")
+                print(f"   📝 {leilao['descricao']}")
+                print(f"   🕐 Início: {leilao['inicio'].strftime('%d/%m/%Y %H:%M')}")
+                print(f"   🕐 Fim: {leilao['fim'].strftime('%d/%m/%Y %H:%M')}")
+                print(f"   📊 Status: {leilao['status'].upper()}")
+                print("-" * 60)
     
     def run(self):
         """Loop principal do MS Leilão"""
@@ -149,16 +250,34 @@ class MSLeilao:
         print("Pressione Ctrl+C para parar o serviço")
         
         try:
-            while True:
-                self.verificar_leiloes()
-                time.sleep(5)  # Verifica a cada 5 segundos
+            # Dorme até a próxima transição em vez de varrer a cada 5 segundos
+            self.agendador.executar()
                 
         except KeyboardInterrupt:
             print("\n🛑 MS Leilão encerrado pelo usuário")
+            utils.close_pool()
+            self.catalogo.fechar()
         except Exception as e:
             print(f"❌ Erro no MS Leilão: {e}")
 
 if __name__ == '__main__':
-    ms_leilao = MSLeilao()
+    parser = argparse.ArgumentParser(description='MS Leilão')
+    parser.add_argument('--catalogo', default='leiloes.db', help='arquivo SQLite do catálogo')
+    parser.add_argument('--importar', metavar='JSONL', help='importa leilões antes de iniciar')
+    parser.add_argument('--demo', action='store_true',
+                        help='recadastra os leilões de demonstração a partir de agora')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+    
+    if args.importar:
+        catalogo = CatalogoLeiloes(args.catalogo)
+        total = catalogo.importar_jsonl(args.importar)
+        catalogo.fechar()
+        print(f"📥 {total} leilões importados de {args.importar}")
+    
+    logs.configurar('ms_leilao')
+    utils.iniciar_metricas(args.metricas_porta, 'MS Leilão')
+    ms_leilao = MSLeilao(args.catalogo, demo=args.demo)
     ms_leilao.listar_leiloes()
     ms_leilao.run()
@@ -1,14 +1,67 @@
 import pika
 import utils
-import json
 import threading
 import time
+import asyncio
+import argparse
+from collections import OrderedDict
 from typing import Dict, Any
+from pika.adapters.asyncio_connection import AsyncioConnection
+import metricas
+import logging
+import logs
+
+log = logging.getLogger('ms_notif')
+# Um registro por evento roteado: limitado por evento para não virar o gargalo
+log_eventos = logs.limitado('ms_notif.eventos')
+
+EVENTOS = metricas.contador('ms_notif_eventos_total', 'Eventos recebidos, por tipo e resultado',
+                            ['tipo', 'resultado'])
+ROTEAMENTO = metricas.histograma('ms_notif_roteamento_segundos',
+                                 'Duração do roteamento de um evento (decode + publicação)', ['tipo'])
+
+def encaminhar_evento(tipo: str, properties, body: bytes, publicar):
+    """Roteia um evento (lance_validado ou leilao_vencedor) para leilao.<id>.
+    
+    'publicar' recebe (exchange, routing_key, body, properties); o corpo é
+    repassado sem reserializar. Devolve a routing key usada, ou None.
+    """
+    inicio = time.perf_counter()
+    try:
+        evento = utils.decode_event(properties, body)
+        id_leilao = evento.get('id_leilao')
+        
+        if not id_leilao:
+            log_eventos.warning('evento_sem_id_leilao', extra={'campos': {'tipo': tipo}})
+            EVENTOS.rotulos(tipo, 'erro').inc()
+            return None
+        
+        queue_key = f"leilao.{id_leilao}"
+        publicar('notificacao_leilao', queue_key, body, properties)
+        
+        if tipo == 'lance_validado':
+            log_eventos.info('lance_roteado', extra={'campos': {
+                'id_leilao': id_leilao, 'id_usuario': evento.get('id_usuario'), 'valor': evento.get('valor')}})
+        else:
+            log.info('vencedor_roteado', extra={'campos': {
+                'id_leilao': id_leilao, 'id_vencedor': evento.get('id_vencedor'), 'valor': evento.get('valor')}})
+        EVENTOS.rotulos(tipo, 'roteado').inc()
+        ROTEAMENTO.rotulos(tipo).observar(time.perf_counter() - inicio)
+        return queue_key
+        
+    except ValueError:
+        log_eventos.warning('evento_malformado', extra={'campos': {'tipo': tipo}})
+    except Exception:
+        log_eventos.exception('falha_roteamento', extra={'campos': {'tipo': tipo}})
+    EVENTOS.rotulos(tipo, 'erro').inc()
+    return None
 
 class MSNotificacao:
     def __init__(self):
         self.channel = utils.get_rabbitmq_channel()
         self.setup_queues()
+        self.consumidor_lance = utils.Consumidor(self.channel)
+        self.consumidor_vencedor = None
         self.running = True
         
         print("MS Notificação inicializado com sucesso!")
@@ -32,84 +85,21 @@ class MSNotificacao:
     def processar_lance_validado(self, ch, method, properties, body):
         """Processa eventos de lance validado"""
         try:
-            evento = json.loads(body)
-            id_leilao = evento.get('id_leilao')
-            queue_key = f"leilao.{id_leilao}"
-            
-            if not id_leilao:
-                print("❌ Erro: ID do leilão não encontrado no evento lance_validado")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
-            
-            # Cria fila específica para o leilão
-            #fila_leilao = self.criar_fila_leilao(id_leilao)
-            
-            # Adiciona timestamp ao evento
-            #evento['timestamp'] = time.time()
-            #evento['tipo'] = 'lance_validado'
-            
-            # Publica na fila específica do leilão
-            self.channel.basic_publish(
-                exchange='notificacao_leilao',
-                routing_key=queue_key,
-                body=json.dumps(evento),
-            )
-            
-            print(f"📢 Lance validado roteado para leilão {id_leilao}")
-            print(f"   💰 Usuário: {evento.get('id_usuario', 'N/A')}")
-            print(f"   💵 Valor: R$ {evento.get('valor', 'N/A')}")
-            
-        except json.JSONDecodeError:
-            print("❌ Erro: Falha ao decodificar JSON do evento lance_validado")
-        except Exception as e:
-            print(f"❌ Erro ao processar lance_validado: {e}")
+            encaminhar_evento('lance_validado', properties, body, utils.publish)
         finally:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self.consumidor_lance.ack(method.delivery_tag)
     
     def processar_leilao_vencedor(self, ch, method, properties, body):
         """Processa eventos de leilão vencedor"""
         try:
-            evento = json.loads(body)
-            id_leilao = evento.get('id_leilao')
-            queue_key = f"leilao.{id_leilao}"
-            
-            if not id_leilao:
-                print("❌ Erro: ID do leilão não encontrado no evento leilao_vencedor")
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
-            
-            # Cria fila específica para o leilão
-            #fila_leilao = self.criar_fila_leilao(id_leilao)
-            
-            # Adiciona timestamp ao evento
-            #evento['timestamp'] = time.time()
-            #evento['tipo'] = 'leilao_vencedor'
-            
-            # Publica na fila específica do leilão
-            self.channel.basic_publish(
-                exchange='notificacao_leilao',
-                routing_key=queue_key,
-                body=json.dumps(evento),
-            )
-            
-            print(f"🏆 Leilão vencedor roteado para leilão {id_leilao}")
-            print(f"   👑 Vencedor: {evento.get('id_usuario', 'N/A')}")
-            print(f"   💰 Valor final: R$ {evento.get('valor', 'N/A')}")
-            
-        except json.JSONDecodeError:
-            print("❌ Erro: Falha ao decodificar JSON do evento leilao_vencedor")
-        except Exception as e:
-            print(f"❌ Erro ao processar leilao_vencedor: {e}")
+            encaminhar_evento('leilao_vencedor', properties, body, utils.publish)
         finally:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            self.consumidor_vencedor.ack(method.delivery_tag)
     
     def consumir_lance_validado(self):
         """Thread para consumir eventos de lance validado"""
         try:
-            self.channel.basic_consume(
-                queue='lance_validado',
-                on_message_callback=self.processar_lance_validado
-            )
+            self.consumidor_lance.consumir('lance_validado', self.processar_lance_validado)
             print("🎯 Iniciando consumo da fila 'lance_validado'")
             self.channel.start_consuming()
         except Exception as e:
@@ -120,14 +110,11 @@ class MSNotificacao:
         """Thread para consumir eventos de leilão vencedor"""
         try:
             # Cria uma nova conexão para a segunda thread
-            connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-            channel = connection.channel()
+            channel = utils.get_rabbitmq_channel()
             channel.queue_declare(queue='leilao_vencedor', durable=True)
             
-            channel.basic_consume(
-                queue='leilao_vencedor',
-                on_message_callback=self.processar_leilao_vencedor
-            )
+            self.consumidor_vencedor = utils.Consumidor(channel)
+            self.consumidor_vencedor.consumir('leilao_vencedor', self.processar_leilao_vencedor)
             print("🏆 Iniciando consumo da fila 'leilao_vencedor'")
             channel.start_consuming()
         except Exception as e:
@@ -155,10 +142,253 @@ class MSNotificacao:
         except KeyboardInterrupt:
             print("\n🛑 MS Notificação encerrado pelo usuário")
             self.running = False
+            utils.close_pool()
         except Exception as e:
             print(f"❌ Erro no MS Notificação: {e}")
             self.running = False
 
+class Conflador:
+    """Coalesce lances validados por leilão dentro de uma janela de tempo.
+    
+    O primeiro lance de um leilão abre a janela; lances seguintes substituem
+    o pendente, e ao fim da janela só o mais recente é publicado. O vencedor
+    é publicado na hora, logo depois do lance pendente do mesmo leilão, e
+    lances que chegam após o vencedor são descartados para nunca aparecerem
+    depois dele.
+
+    Um lance é confirmado assim que entra no slot pendente: segurá-lo até o
+    fim da janela travaria o prefixo de acks do Consumidor, e com o prefetch
+    esgotado a vazão ficaria limitada a prefetch/janela. O custo é que um
+    lance pendente se perde se o serviço cair durante a janela; o próximo
+    lance ou o vencedor do leilão o substituem.
+    
+    'agendar(atraso, funcao)' é o call_later do event loop.
+    """
+    
+    MAX_ENCERRADOS = 10000
+    
+    def __init__(self, janela: float, publicar, agendar):
+        self.janela = janela
+        self.publicar = publicar
+        self.agendar = agendar
+        # routing_key -> [exchange, body, properties] (já confirmado)
+        self.pendentes = {}
+        self.encerrados = OrderedDict()
+        self.entrada = 0
+        self.saida = 0
+        self.descartados = 0
+    
+    def receber(self, tipo, exchange, routing_key, body, properties, ack):
+        self.entrada += 1
+        if tipo == 'leilao_vencedor':
+            try:
+                self.descarregar(routing_key)
+            finally:
+                # O ack é deste método daqui em diante, mesmo se publicar falhar
+                self._publicar(exchange, routing_key, body, properties, ack)
+            self.encerrados[routing_key] = True
+            while len(self.encerrados) > self.MAX_ENCERRADOS:
+                self.encerrados.popitem(last=False)
+            return
+        
+        if routing_key in self.encerrados:
+            self.descartados += 1
+            ack()
+            return
+        
+        if routing_key not in self.pendentes:
+            self.agendar(self.janela, lambda: self.descarregar(routing_key))
+        self.pendentes[routing_key] = [exchange, body, properties]
+        ack()
+    
+    def descarregar(self, routing_key):
+        pendente = self.pendentes.pop(routing_key, None)
+        if pendente is not None:
+            exchange, body, properties = pendente
+            self._publicar(exchange, routing_key, body, properties)
+    
+    def _publicar(self, exchange, routing_key, body, properties, ack=None):
+        try:
+            self.publicar(exchange, routing_key, body, properties)
+            self.saida += 1
+        finally:
+            if ack is not None:
+                ack()
+    
+    def stats(self):
+        economia = 1 - self.saida / self.entrada if self.entrada else 0.0
+        return {
+            "entrada": self.entrada,
+            "saida": self.saida,
+            "descartados": self.descartados,
+            "pendentes": len(self.pendentes),
+            "economia": f"{economia:.1%}",
+        }
+
+class MSNotificacaoAsync:
+    """MS Notificação em um único event loop asyncio.
+    
+    Consome lance_validado e leilao_vencedor e publica em notificacao_leilao
+    pelo mesmo canal, sem threads. 'concorrencia' é o prefetch do canal:
+    quantas mensagens o broker mantém entregues e ainda não confirmadas.
+    """
+    
+    FILAS = ('lance_validado', 'leilao_vencedor')
+    
+    def __init__(self, concorrencia: int = 100, intervalo_reconexao: float = 2.0,
+                 janela_conflacao: float = 0.0):
+        self.concorrencia = concorrencia
+        self.janela_conflacao = janela_conflacao
+        # Criado por canal, pois publica e agenda usando o canal/loop atuais
+        self.conflador = None
+        self.intervalo_reconexao = intervalo_reconexao
+        self.loop = asyncio.new_event_loop()
+        self.connection = None
+        self.channel = None
+        # Acks em lote do canal atual (recriado a cada reconexão)
+        self.consumidor = None
+        self.encerrando = False
+        self.roteadas = 0
+    
+    def conectar(self):
+        self.connection = AsyncioConnection(
+            utils.get_connection_parameters(),
+            on_open_callback=self._on_conexao_aberta,
+            on_open_error_callback=self._on_falha_conexao,
+            on_close_callback=self._on_conexao_fechada,
+            custom_ioloop=self.loop
+        )
+    
+    def _on_conexao_aberta(self, connection):
+        connection.channel(on_open_callback=self._on_canal_aberto)
+    
+    def _on_falha_conexao(self, connection, erro):
+        print(f"❌ Falha ao conectar ao broker: {erro}")
+        self._reconectar()
+    
+    def _on_conexao_fechada(self, connection, motivo):
+        self.channel = None
+        if self.encerrando:
+            self.loop.stop()
+        else:
+            print(f"⚠️ Conexão perdida ({motivo}), reconectando...")
+            self._reconectar()
+    
+    def _reconectar(self):
+        if not self.encerrando:
+            self.loop.call_later(self.intervalo_reconexao, self.conectar)
+    
+    def _on_canal_aberto(self, channel):
+        self.channel = channel
+        if self.janela_conflacao > 0:
+            self.conflador = Conflador(self.janela_conflacao, channel.basic_publish, self.loop.call_later)
+        channel.exchange_declare(
+            exchange='notificacao_leilao', exchange_type='topic',
+            callback=lambda _frame: self._declarar_filas(list(self.FILAS))
+        )
+    
+    def _declarar_filas(self, restantes):
+        if restantes:
+            fila = restantes.pop(0)
+            self.channel.queue_declare(
+                queue=fila, durable=True,
+                callback=lambda _frame: self._declarar_filas(restantes)
+            )
+        else:
+            # O basic_qos do Consumidor é um RPC; o pika segura os basic_consume
+            # seguintes até o Qos-Ok chegar
+            self.consumidor = utils.Consumidor(self.channel, self.concorrencia,
+                                               agendar=self.loop.call_later)
+            self._consumir()
+    
+    def _consumir(self):
+        for fila in self.FILAS:
+            self.consumidor.consumir(
+                fila,
+                lambda ch, method, properties, body, fila=fila:
+                    self.processar(fila, ch, method, properties, body)
+            )
+        print(f"✅ Consumindo {', '.join(self.FILAS)} (concorrência {self.concorrencia})")
+    
+    def processar(self, tipo, ch, method, properties, body):
+        consumidor = self.consumidor
+        if self.conflador is None:
+            try:
+                if encaminhar_evento(tipo, properties, body, ch.basic_publish):
+                    self.roteadas += 1
+            finally:
+                consumidor.ack(method.delivery_tag)
+            return
+        
+        conflador = self.conflador
+        # O Conflador confirma cada lance ao guardá-lo, sem esperar a janela
+        ack = lambda: consumidor.ack(method.delivery_tag)
+        recebido = False
+        
+        def publicar(exchange, routing_key, corpo, props):
+            nonlocal recebido
+            # Entregue ao Conflador, o ack é dele, inclusive se a publicação falhar
+            recebido = True
+            conflador.receber(tipo, exchange, routing_key, corpo, props, ack)
+        
+        if encaminhar_evento(tipo, properties, body, publicar):
+            self.roteadas += 1
+        elif not recebido:
+            ack()
+    
+    def relatorio_conflacao(self, intervalo: float = 10.0):
+        if self.conflador is not None:
+            stats = self.conflador.stats()
+            print("📉 Conflação: " + " | ".join(f"{k}={v}" for k, v in stats.items()))
+        self.loop.call_later(intervalo, self.relatorio_conflacao, intervalo)
+    
+    def parar(self):
+        self.encerrando = True
+        if self.connection is not None and self.connection.is_open:
+            if self.consumidor is not None:
+                self.consumidor.flush()
+            self.connection.close()
+        else:
+            self.loop.stop()
+    
+    def run(self):
+        """Loop principal do MS Notificação (asyncio)"""
+        print("\n🚀 MS Notificação (asyncio) iniciado!")
+        print("📡 Escutando eventos e roteando para filas específicas...")
+        print("Pressione Ctrl+C para parar o serviço")
+        
+        self.conectar()
+        if self.janela_conflacao > 0:
+            print(f"📉 Conflação de lances ativa (janela de {self.janela_conflacao * 1000:.0f} ms)")
+            self.loop.call_later(10.0, self.relatorio_conflacao)
+        try:
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 MS Notificação encerrado pelo usuário")
+            self.parar()
+            # Deixa o fechamento da conexão terminar
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
 if __name__ == '__main__':
-    ms_notif = MSNotificacao()
-    ms_notif.run()
+    parser = argparse.ArgumentParser(description='MS Notificação')
+    parser.add_argument('--runtime', choices=('asyncio', 'threads'), default='asyncio',
+                        help='asyncio (um event loop) ou threads (implementação original)')
+    parser.add_argument('--concorrencia', type=int, default=100,
+                        help='mensagens em processamento simultâneo no runtime asyncio')
+    parser.add_argument('--conflacao-ms', type=float, default=0,
+                        help='janela de conflação de lances por leilão, em ms (0 = desativada; só asyncio)')
+    parser.add_argument('--metricas-porta', type=int, default=utils.METRICAS_PORTA,
+                        help='porta HTTP do /metrics (padrão: LEILAO_METRICAS_PORTA; 0 = desligado)')
+    args = parser.parse_args()
+    if args.conflacao_ms and args.runtime != 'asyncio':
+        parser.error('--conflacao-ms só é suportado no runtime asyncio')
+    
+    logs.configurar('ms_notif')
+    utils.iniciar_metricas(args.metricas_porta, 'MS Notificação')
+    if args.runtime == 'asyncio':
+        MSNotificacaoAsync(args.concorrencia, janela_conflacao=args.conflacao_ms / 1000).run()
+    else:
+        ms_notif = MSNotificacao()
+        ms_notif.run()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import broker_memoria  # noqa: E402
+import utils  # noqa: E402
+
+
+@pytest.fixture
+def conexao(monkeypatch):
+    """Conexão com um broker em memória novo, isolado dos outros testes."""
+    monkeypatch.setattr(broker_memoria, 'broker', broker_memoria.BrokerMemoria())
+    conexao = broker_memoria.conectar()
+    yield conexao
+    if conexao.is_open:
+        conexao.close()
+
+
+@pytest.fixture
+def memoria(conexao, monkeypatch):
+    """Como conexao, e as publicações dos serviços (utils.publish_event) também vão para o broker em memória."""
+    monkeypatch.setattr(utils, 'BROKER', 'memoria')
+    yield conexao
+    utils.close_pool()
@@ -0,0 +1,61 @@
+from admissao import FiltroReplay, LimiteUsuarios
+
+AGORA = 1_000_000.0
+
+
+def test_nonce_novo_passa_e_repetido_e_replay():
+    filtro = FiltroReplay(janela=300)
+    assert filtro.verificar('u1', 'n1', AGORA, agora=AGORA) is None
+    assert filtro.verificar('u1', 'n1', AGORA, agora=AGORA + 1) == 'replay'
+    # O nonce é por usuário
+    assert filtro.verificar('u2', 'n1', AGORA, agora=AGORA + 1) is None
+
+
+def test_ts_fora_da_janela_e_recusado():
+    filtro = FiltroReplay(janela=300)
+    assert filtro.verificar('u1', 'n1', AGORA - 301, agora=AGORA) == 'fora_da_janela'
+    assert filtro.verificar('u1', 'n2', AGORA + 301, agora=AGORA) == 'fora_da_janela'
+    assert filtro.verificar('u1', 'n3', AGORA - 300, agora=AGORA) is None
+
+
+def test_ts_que_nao_e_numero_e_recusado():
+    filtro = FiltroReplay(janela=300)
+    for ts in (None, '1000000', True, [AGORA]):
+        assert filtro.verificar('u1', 'n1', ts, agora=AGORA) == 'fora_da_janela'
+    assert filtro.stats()['nonces'] == 0
+
+
+def test_entradas_expiram_com_a_janela():
+    filtro = FiltroReplay(janela=10)
+    filtro.verificar('u1', 'n1', AGORA, agora=AGORA)
+    filtro.verificar('u1', 'n2', AGORA + 5, agora=AGORA + 5)
+    filtro.verificar('u1', 'n3', AGORA + 11, agora=AGORA + 11)
+    assert filtro.stats()['nonces'] == 2
+    # Expirado do filtro, o nonce antigo continua barrado pela janela
+    assert filtro.verificar('u1', 'n1', AGORA, agora=AGORA + 11) == 'fora_da_janela'
+
+
+def test_limite_de_entradas_sobe_o_piso():
+    filtro = FiltroReplay(janela=300, max_entradas=2)
+    for i in range(3):
+        assert filtro.verificar('u1', f'n{i}', AGORA + i, agora=AGORA + 3) is None
+    assert filtro.stats() == {"nonces": 2, "descartados": 1}
+    assert filtro.piso == AGORA
+    # n0 saiu do filtro, mas ts <= piso nunca mais é aceito
+    assert filtro.verificar('u1', 'n0', AGORA, agora=AGORA + 3) == 'fora_da_janela'
+    assert filtro.verificar('u1', 'n9', AGORA - 1, agora=AGORA + 3) == 'fora_da_janela'
+    assert filtro.verificar('u1', 'n1', AGORA + 1, agora=AGORA + 3) == 'replay'
+
+
+def test_limite_por_usuario_libera_a_rajada_e_recarrega():
+    limite = LimiteUsuarios(taxa=1, rajada=3)
+    assert [limite.permitir('u1', agora=0) for _ in range(4)] == [True, True, True, False]
+    assert limite.permitir('u2', agora=0)
+    assert not limite.permitir('u1', agora=0.5)
+    assert limite.permitir('u1', agora=1.6)
+
+
+def test_limite_por_usuario_desligado():
+    limite = LimiteUsuarios(taxa=0)
+    assert all(limite.permitir('u1', agora=0) for _ in range(1000))
+    assert limite.stats()['usuarios'] == 0
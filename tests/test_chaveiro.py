@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import chaveiro
+import utils
+
+
+def test_perfil_novo_e_criado_uma_vez(tmp_path):
+    identidade, criada = chaveiro.obter('p', 'ed25519', str(tmp_path))
+    assert criada
+    assert os.stat(tmp_path / 'p.json').st_mode & 0o777 == 0o600
+
+    carregada, criada = chaveiro.obter('p', 'ed25519', str(tmp_path))
+    assert not criada
+    assert carregada.user_id == identidade.user_id
+    assert utils.serialize_public_key(carregada.public_key) == utils.serialize_public_key(identidade.public_key)
+
+
+def test_sem_alg_usa_o_esquema_salvo(tmp_path):
+    identidade, _ = chaveiro.obter('p', 'ed25519', str(tmp_path))
+    carregada, criada = chaveiro.obter('p', diretorio=str(tmp_path))
+    assert (carregada.user_id, carregada.alg, criada) == (identidade.user_id, 'ed25519', False)
+
+
+def test_esquema_diferente_nao_troca_a_chave_sem_rotacionar(tmp_path):
+    chaveiro.obter('p', 'ed25519', str(tmp_path))
+    antes = (tmp_path / 'p.json').read_bytes()
+    with pytest.raises(chaveiro.ErroEsquema):
+        chaveiro.obter('p', 'rsa-pss-sha256', str(tmp_path))
+    assert (tmp_path / 'p.json').read_bytes() == antes
+
+
+def test_rotacionar_mantem_o_user_id(tmp_path):
+    identidade, _ = chaveiro.obter('p', 'ed25519', str(tmp_path))
+    rotacionada, criada = chaveiro.obter('p', 'rsa-pss-sha256', str(tmp_path), rotacionar=True)
+    assert criada
+    assert (rotacionada.user_id, rotacionada.alg) == (identidade.user_id, 'rsa-pss-sha256')
+    assert chaveiro.carregar('p', str(tmp_path)).alg == 'rsa-pss-sha256'
+
+
+def test_perfil_invalido(tmp_path):
+    for perfil in ('', '../p', '.oculto', 'a/b'):
+        with pytest.raises(ValueError):
+            chaveiro.obter(perfil, 'ed25519', str(tmp_path))
+
+
+def test_chave_publica_so_e_regravada_se_mudar(tmp_path):
+    identidade, _ = chaveiro.obter('p', 'ed25519', str(tmp_path / 'chaveiro'))
+    caminho = chaveiro.publicar_chave(identidade, str(tmp_path / 'publicas'))
+    os.utime(caminho, (1, 1))
+    chaveiro.publicar_chave(identidade, str(tmp_path / 'publicas'))
+    # Sem mudança, só o toque de uso (mtime antigo > INTERVALO_TOQUE)
+    assert os.stat(caminho).st_mtime > 1
+    assert utils.load_public_key_from_file(caminho) is not None
+    assert chaveiro.usuarios(str(tmp_path / 'chaveiro')) == {identidade.user_id}
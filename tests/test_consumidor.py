@@ -0,0 +1,128 @@
+import pika
+import pytest
+
+import utils
+
+
+@pytest.fixture
+def canal(conexao):
+    canal = conexao.channel()
+    canal.queue_declare(queue='q', durable=True)
+    return canal
+
+
+def publicar(canal, n):
+    for i in range(n):
+        canal.basic_publish(exchange='', routing_key='q', body=str(i).encode(),
+                            properties=pika.BasicProperties())
+
+
+def consumir(canal, consumidor):
+    """Registra o consumo e devolve a lista de (delivery_tag, body, redelivered) entregues."""
+    entregues = []
+    consumidor.consumir('q', lambda ch, method, properties, body: entregues.append(
+        (method.delivery_tag, body, method.redelivered)))
+    canal.connection.process_data_events()
+    return entregues
+
+
+def nao_confirmadas(canal):
+    return sorted(canal._nao_confirmadas)
+
+
+def test_prefetch_limita_as_entregas_sem_ack(canal):
+    publicar(canal, 6)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    entregues = consumir(canal, consumidor)
+    assert [tag for tag, _, _ in entregues] == [1, 2, 3, 4]
+
+
+def test_ack_fora_de_ordem_espera_o_prefixo_contiguo(canal):
+    publicar(canal, 4)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    consumir(canal, consumidor)
+
+    consumidor.ack(2)
+    consumidor.ack(3)
+    assert consumidor.frames_ack == 0
+    assert nao_confirmadas(canal) == [1, 2, 3, 4]
+
+    consumidor.ack(1)
+    assert consumidor.frames_ack == 1
+    assert nao_confirmadas(canal) == [4]
+    assert consumidor.stats()['aguardando'] == 0
+
+
+def test_ack_libera_o_prefetch_para_novas_entregas(canal):
+    publicar(canal, 3)
+    consumidor = utils.Consumidor(canal, prefetch=2, intervalo=0)
+    entregues = consumir(canal, consumidor)
+    assert len(entregues) == 2
+
+    consumidor.ack(1)
+    canal.connection.process_data_events()
+    assert [tag for tag, _, _ in entregues] == [1, 2, 3]
+
+
+def test_rejeitada_no_meio_do_prefixo_nao_entra_no_ack_multiplo(canal):
+    publicar(canal, 4)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    consumir(canal, consumidor)
+
+    consumidor.ack(1)
+    consumidor.ack(2)
+    consumidor.rejeitar(3)
+    # O nack é imediato e sem requeue: a mensagem sai do broker
+    assert nao_confirmadas(canal) == [4]
+    consumidor.ack(4)
+    assert nao_confirmadas(canal) == []
+    assert consumidor.stats()['rejeitadas'] == 1
+    assert canal.queue_declare(queue='q', passive=True).method.message_count == 0
+
+
+def test_prefixo_que_termina_numa_rejeitada_nao_envia_ack(canal):
+    publicar(canal, 2)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    consumir(canal, consumidor)
+
+    consumidor.rejeitar(1)
+    # Um ack múltiplo até a tag 1 seria "unknown delivery tag" e fecharia o canal
+    assert consumidor.frames_ack == 0
+    assert canal.is_open
+    consumidor.ack(2)
+    assert consumidor.frames_ack == 1
+    assert nao_confirmadas(canal) == []
+
+
+def test_rejeitar_com_requeue_reentrega(canal):
+    publicar(canal, 1)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    entregues = consumir(canal, consumidor)
+
+    consumidor.rejeitar(1, requeue=True)
+    canal.connection.process_data_events()
+    assert entregues == [(1, b'0', False), (2, b'0', True)]
+
+
+def test_acks_em_lote_saem_no_intervalo(canal):
+    publicar(canal, 3)
+    consumidor = utils.Consumidor(canal, prefetch=64, lote=16, intervalo=0.01)
+    consumir(canal, consumidor)
+
+    for tag in (1, 2, 3):
+        consumidor.ack(tag)
+    assert consumidor.frames_ack == 0
+    canal.connection.process_data_events(time_limit=0.05)
+    assert consumidor.frames_ack == 1
+    assert nao_confirmadas(canal) == []
+
+
+def test_sem_ack_a_mensagem_volta_para_a_fila_quando_o_canal_fecha(conexao, canal):
+    publicar(canal, 2)
+    consumidor = utils.Consumidor(canal, prefetch=4, intervalo=0)
+    consumir(canal, consumidor)
+    consumidor.ack(2)
+
+    canal.close()
+    outro = conexao.channel()
+    assert outro.queue_declare(queue='q', passive=True).method.message_count == 2
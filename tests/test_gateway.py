@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pika
+import pytest
+
+import utils
+import wire
+from gateway import Gateway
+
+
+@pytest.fixture
+def gateway():
+    gateway = Gateway()
+    yield gateway
+    gateway.loop.close()
+
+
+def rodar(gateway, corotina):
+    return gateway.loop.run_until_complete(asyncio.wait_for(corotina, 5))
+
+
+async def conectar(gateway):
+    servidor = (await gateway.iniciar_servidores('127.0.0.1', 0, None))[0]
+    porta = servidor.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', porta)
+    while not gateway.assinantes:
+        await asyncio.sleep(0.001)
+    return servidor, reader, writer, next(iter(gateway.assinantes))
+
+
+async def comando(writer, linha, condicao):
+    writer.write(linha.encode() + b'\n')
+    while not condicao():
+        await asyncio.sleep(0.001)
+
+
+def evento(dados, formato='json'):
+    corpo, content_type = utils.encode_event(dados, formato)
+    return pika.BasicProperties(content_type=content_type), corpo
+
+
+def test_assinatura_por_leilao_todos_e_cancelamento(gateway):
+    async def cenario():
+        servidor, reader, writer, assinante = await conectar(gateway)
+        await comando(writer, '+a', lambda: 'a' in gateway.por_leilao)
+        assert gateway.distribuir('a', 'lance', b'1') == 1
+        assert gateway.distribuir('b', 'lance', b'2') == 0
+
+        await comando(writer, '*', lambda: assinante.todos)
+        # Assina 'a' e todos: recebe uma vez só
+        assert gateway.distribuir('a', 'lance', b'3') == 1
+        assert gateway.distribuir('b', 'lance', b'4') == 1
+
+        await comando(writer, '-*', lambda: not assinante.todos)
+        assert gateway.distribuir('b', 'lance', b'5') == 0
+        assert gateway.distribuir('a', 'lance', b'6') == 1
+
+        await comando(writer, '-a', lambda: 'a' not in gateway.por_leilao)
+        assert gateway.distribuir('a', 'lance', b'7') == 0
+        linhas = [await reader.readline() for _ in range(4)]
+
+        writer.close()
+        while gateway.assinantes:
+            await asyncio.sleep(0.001)
+        servidor.close()
+        await servidor.wait_closed()
+        return linhas
+
+    assert rodar(gateway, cenario()) == [b'1\n', b'3\n', b'4\n', b'6\n']
+
+
+def test_processar_repassa_json_e_converte_o_binario(gateway):
+    recebidos = []
+    gateway.distribuir = lambda id_leilao, tipo, corpo: recebidos.append((id_leilao, tipo, corpo))
+    dados = {"id_leilao": "a", "id_usuario": "u", "valor": 1.5}
+    gateway.processar(None, None, *evento(dados))
+    gateway.processar(None, None, *evento(dict(dados, id_vencedor="u"), 'binario'))
+    assert [(l, t) for l, t, _ in recebidos] == [('a', 'lance'), ('a', 'vencedor')]
+    assert json.loads(recebidos[1][2]) == dict(dados, id_vencedor="u")
+
+
+@pytest.mark.parametrize('corpo', [b'[1, 2]', b'"texto"', b'{"id_leilao": ["a"]}', b'{"id_leilao": 1}',
+                                   b'{"valor": 1}', b'nao e json'])
+def test_evento_malformado_nao_derruba_o_consumo(gateway, corpo):
+    gateway.distribuir = lambda *args: pytest.fail('evento malformado distribuído')
+    gateway.processar(None, None, pika.BasicProperties(content_type=wire.CONTENT_TYPE_JSON), corpo)
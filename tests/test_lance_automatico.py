@@ -0,0 +1,121 @@
+import pytest
+
+from lance_automatico import incremento, proximo, resolver, valor_valido
+
+SEM_LANCES = {"id_usuario": None, "valor": 0}
+
+
+@pytest.mark.parametrize('preco, passo', [
+    (0, 0.05), (0.99, 0.05), (1, 0.25), (24.99, 0.50), (99, 1.00),
+    (100, 2.50), (999, 10.00), (4999, 50.00), (5000, 100.00), (1e6, 100.00),
+])
+def test_incremento_por_faixa(preco, passo):
+    assert incremento(preco) == passo
+
+
+def test_proximo_arredonda_centavos():
+    assert proximo(0.1) == 0.15
+    assert proximo(10) == 10.5
+
+
+def test_primeiro_automatico_abre_no_menor_lance():
+    novo, motivo = resolver(SEM_LANCES, 'a', 100, automatico=True)
+    assert motivo is None
+    assert novo == {"id_usuario": 'a', "valor": 0.05, "maximo": 100}
+
+
+def test_automatico_menor_que_o_minimo_e_recusado():
+    atual = {"id_usuario": 'a', "valor": 10}
+    assert resolver(atual, 'b', 10.2, automatico=True) == (None, 'lance_baixo')
+
+
+def test_desafiante_abaixo_do_maximo_sobe_o_preco_do_lider():
+    atual = {"id_usuario": 'a', "valor": 0.05, "maximo": 100}
+    novo, _ = resolver(atual, 'b', 50, automatico=True)
+    assert novo == {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+
+
+def test_empate_de_maximos_fica_com_quem_chegou_antes():
+    atual = {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+    novo, _ = resolver(atual, 'b', 100, automatico=True)
+    assert novo == {"id_usuario": 'a', "valor": 100, "maximo": 100}
+
+
+def test_desafiante_acima_do_maximo_assume_pagando_um_incremento():
+    atual = {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+    novo, _ = resolver(atual, 'b', 400, automatico=True)
+    assert novo == {"id_usuario": 'b', "valor": 102.5, "maximo": 400}
+
+
+def test_desafiante_pouco_acima_do_maximo_paga_o_proprio_maximo():
+    atual = {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+    novo, _ = resolver(atual, 'b', 101, automatico=True)
+    assert novo == {"id_usuario": 'b', "valor": 101, "maximo": 101}
+
+
+def test_lider_sobe_o_proprio_maximo_sem_mudar_o_preco():
+    atual = {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+    assert resolver(atual, 'a', 90, automatico=True) == (None, 'lance_baixo')
+    novo, _ = resolver(atual, 'a', 200, automatico=True)
+    assert novo == {"id_usuario": 'a', "valor": 51.0, "maximo": 200}
+
+
+def test_lance_comum_sem_automatico_vale_como_antes():
+    atual = {"id_usuario": 'a', "valor": 10}
+    assert resolver(atual, 'b', 10) == (None, 'lance_baixo')
+    assert resolver(atual, 'b', 10.01) == ({"id_usuario": 'b', "valor": 10.01}, None)
+
+
+def test_lance_comum_coberto_pelo_maximo_do_lider():
+    atual = {"id_usuario": 'a', "valor": 305.0, "maximo": 400}
+    novo, _ = resolver(atual, 'b', 350)
+    assert novo == {"id_usuario": 'a', "valor": 355.0, "maximo": 400}
+    novo, _ = resolver(atual, 'b', 400)
+    assert novo == {"id_usuario": 'a', "valor": 400, "maximo": 400}
+
+
+def test_lance_comum_acima_do_maximo_descarta_o_automatico():
+    atual = {"id_usuario": 'a', "valor": 305.0, "maximo": 400}
+    novo, _ = resolver(atual, 'b', 401)
+    assert novo == {"id_usuario": 'b', "valor": 401}
+
+
+def test_lance_comum_do_lider_mantem_o_maximo():
+    atual = {"id_usuario": 'a', "valor": 305.0, "maximo": 400}
+    novo, _ = resolver(atual, 'a', 390)
+    assert novo == {"id_usuario": 'a', "valor": 390, "maximo": 400}
+
+
+def test_resolver_nao_altera_o_estado_atual():
+    atual = {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+    resolver(atual, 'b', 400, automatico=True)
+    resolver(atual, 'a', 200, automatico=True)
+    assert atual == {"id_usuario": 'a', "valor": 51.0, "maximo": 100}
+
+
+NAN, INF = float('nan'), float('inf')
+
+
+@pytest.mark.parametrize('valor', [NAN, INF, -INF, 0, -5.0])
+@pytest.mark.parametrize('automatico', [False, True])
+def test_valor_nao_finito_ou_nao_positivo_e_recusado(valor, automatico):
+    atual = {"id_usuario": 'a', "valor": 10, "maximo": 50}
+    assert resolver(atual, 'b', valor, automatico) == (None, 'valor_invalido')
+    assert resolver(SEM_LANCES, 'b', valor, automatico) == (None, 'valor_invalido')
+    # Nem o líder sobe o próprio máximo para NaN/inf
+    assert resolver(atual, 'a', valor, automatico) == (None, 'valor_invalido')
+
+
+def test_nan_nao_vira_lider_nem_abre_caminho_para_lance_menor():
+    atual = {"id_usuario": 'a', "valor": 10}
+    novo, motivo = resolver(atual, 'b', NAN)
+    assert (novo, motivo) == (None, 'valor_invalido')
+    assert resolver(atual, 'c', 5.0) == (None, 'lance_baixo')
+
+
+@pytest.mark.parametrize('valor, valido', [
+    (1, True), (0.01, True), (10 ** 400, True), (0, False), (-1, False),
+    (NAN, False), (INF, False), (True, False), ('10', False), (None, False),
+])
+def test_valor_valido(valor, valido):
+    assert valor_valido(valor) is valido
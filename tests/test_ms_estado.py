@@ -0,0 +1,114 @@
+import json
+import time
+
+import pika
+import pytest
+
+import utils
+from ms_estado import MSEstado
+
+
+class Assinante:
+    """Cliente do cache: liga a fila aos deltas, pede o snapshot e aplica os deltas seguintes."""
+
+    def __init__(self, conexao):
+        self.canal = conexao.channel()
+        self.deltas = []
+        self.snapshot = None
+        fila = self.canal.queue_declare(queue='', exclusive=True).method.queue
+        self.canal.queue_bind(exchange=utils.EXCHANGE_DELTAS, queue=fila)
+        self.canal.basic_consume(queue=fila, auto_ack=True,
+                                 on_message_callback=lambda ch, method, properties, body:
+                                 self.deltas.append(utils.decode_event(properties, body)))
+        self.respostas = self.canal.queue_declare(queue='', exclusive=True).method.queue
+        self.canal.basic_consume(queue=self.respostas, auto_ack=True,
+                                 on_message_callback=lambda ch, method, properties, body:
+                                 setattr(self, 'snapshot', json.loads(body)))
+
+    def pedir_snapshot(self):
+        self.canal.basic_publish('', utils.FILA_SNAPSHOT, b'',
+                                 pika.BasicProperties(reply_to=self.respostas, correlation_id='1'))
+
+    def estado(self):
+        leiloes = {l["id_leilao"]: l["maior"] for l in self.snapshot["leiloes"]}
+        for delta in self.deltas:
+            if delta["instancia"] != self.snapshot["instancia"] or delta["seq"] <= self.snapshot["seq"]:
+                continue
+            if delta["tipo"] == 'iniciado':
+                leiloes[delta["id_leilao"]] = None
+            elif delta["tipo"] == 'lance':
+                leiloes[delta["id_leilao"]] = {"id_usuario": delta["id_usuario"], "valor": delta["valor"]}
+            else:
+                leiloes.pop(delta["id_leilao"], None)
+        return leiloes
+
+
+@pytest.fixture
+def servico(memoria):
+    ms = MSEstado(intervalo=0.01)
+    ms.consumidor.consumir('estado_eventos', ms.processar_evento)
+    ms.consumidor.consumir(utils.FILA_SNAPSHOT, ms.processar_snapshot)
+    return ms
+
+
+def publicar(canal, exchange, routing_key, evento):
+    corpo, content_type = utils.encode_event(evento)
+    canal.basic_publish(exchange, routing_key, corpo, utils.event_properties(content_type))
+
+
+def processar(servico, conexao, tempo=0.03):
+    limite = time.monotonic() + tempo
+    while time.monotonic() < limite:
+        servico.channel.connection.process_data_events(time_limit=0.005)
+        conexao.process_data_events()
+
+
+def lance(canal, id_leilao, id_usuario, valor):
+    publicar(canal, 'notificacao_leilao', f"leilao.{id_leilao}",
+             {"id_leilao": id_leilao, "id_usuario": id_usuario, "valor": valor})
+
+
+def test_lances_no_intervalo_viram_um_delta(servico, memoria):
+    assinante = Assinante(memoria)
+    canal = memoria.channel()
+    publicar(canal, 'leilao_iniciado', '', {"id_leilao": 'a', "descricao": 'd', "fim": None})
+    for valor in (1.0, 2.0, 3.0):
+        lance(canal, 'a', 'u', valor)
+    processar(servico, memoria)
+    assert [(d["tipo"], d.get("valor")) for d in assinante.deltas] == [('iniciado', None), ('lance', 3.0)]
+    assert [d["seq"] for d in assinante.deltas] == [1, 2]
+
+
+def test_cliente_tardio_fica_consistente_com_snapshot_e_deltas(servico, memoria):
+    canal = memoria.channel()
+    publicar(canal, 'leilao_iniciado', '', {"id_leilao": 'a'})
+    publicar(canal, 'leilao_iniciado', '', {"id_leilao": 'b'})
+    lance(canal, 'a', 'u1', 10.0)
+    processar(servico, memoria)
+
+    assinante = Assinante(memoria)
+    lance(canal, 'a', 'u2', 11.0)
+    assinante.pedir_snapshot()
+    publicar(canal, 'leilao_iniciado', '', {"id_leilao": 'c'})
+    publicar(canal, 'notificacao_leilao', 'leilao.b', {"id_leilao": 'b', "id_vencedor": 'u3', "valor": 5.0})
+    lance(canal, 'a', 'u1', 12.0)
+    processar(servico, memoria)
+
+    assert assinante.snapshot["instancia"] == servico.instancia
+    esperado = {id_leilao: leilao["maior"] for id_leilao, leilao in servico.leiloes.items()}
+    assert assinante.estado() == esperado == {'a': {"id_usuario": 'u1', "valor": 12.0}, 'c': None}
+
+
+def test_lance_mais_baixo_ou_de_leilao_desconhecido_e_ignorado(servico, memoria):
+    canal = memoria.channel()
+    publicar(canal, 'leilao_iniciado', '', {"id_leilao": 'a'})
+    lance(canal, 'a', 'u1', 10.0)
+    lance(canal, 'a', 'u2', 9.0)
+    lance(canal, 'x', 'u2', 9.0)
+    publicar(canal, 'notificacao_leilao', 'leilao.a', ["não", "é", "um", "evento"])
+    processar(servico, memoria)
+    assert servico.leiloes['a']["maior"] == {"id_usuario": 'u1', "valor": 10.0}
+    assert 'x' not in servico.leiloes
+    # O evento malformado também é confirmado
+    servico.consumidor.flush()
+    assert servico.channel._nao_confirmadas == {}
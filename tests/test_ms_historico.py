@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+import ms_historico
+import utils
+from ms_historico import IndiceLances
+
+
+def test_top_sao_os_ultimos_em_ordem_decrescente():
+    indice = IndiceLances(max_por_leilao=3)
+    for i, usuario in enumerate(['a', 'b', 'a', 'c', 'b'], start=1):
+        assert indice.adicionar('x', usuario, float(i), i)
+    assert [l["valor"] for l in indice.top('x', 10)] == [5.0, 4.0, 3.0]
+    assert [l["valor"] for l in indice.top('x', 2)] == [5.0, 4.0]
+    assert indice.resumo('x') == {"total": 5, "retidos": 3, "usuarios": 3,
+                                  "maior": {"id_usuario": 'b', "valor": 5.0}, "vencedor": None}
+
+
+def test_reentrega_nao_e_indexada_de_novo():
+    indice = IndiceLances()
+    assert indice.adicionar('x', 'a', 10.0, 1)
+    assert indice.adicionar('x', 'b', 11.0, 2)
+    assert not indice.adicionar('x', 'a', 10.0, 1)
+    assert not indice.adicionar('x', 'b', 11.0, 2)
+    assert indice.resumo('x')["total"] == 2
+
+
+def test_usuario_sem_lances_retidos_sai_do_indice():
+    indice = IndiceLances(max_por_leilao=2)
+    indice.adicionar('x', 'a', 1.0, 1)
+    indice.adicionar('y', 'a', 1.0, 1)
+    indice.adicionar('x', 'b', 2.0, 2)
+    assert indice.do_usuario('a') == {'x': [1.0], 'y': [1.0]}
+    indice.adicionar('x', 'b', 3.0, 3)
+    assert indice.do_usuario('a') == {'y': [1.0]}
+    assert indice.do_usuario('b', 'x') == {'x': [2.0, 3.0]}
+
+
+def test_leilao_menos_recente_sai_no_limite():
+    indice = IndiceLances(max_leiloes=2)
+    indice.adicionar('x', 'a', 1.0, 1)
+    indice.adicionar('y', 'b', 1.0, 1)
+    indice.adicionar('x', 'a', 2.0, 2)
+    indice.adicionar('z', 'c', 1.0, 1)
+    assert list(indice.leiloes) == ['x', 'z']
+    assert indice.do_usuario('b') == {}
+
+
+@pytest.fixture
+def servico(memoria):
+    ms = ms_historico.MSHistorico(IndiceLances())
+    thread = threading.Thread(target=ms.run, daemon=True)
+    thread.start()
+    yield ms
+    ms.channel.connection.add_callback_threadsafe(ms.channel.stop_consuming)
+    thread.join(5)
+
+
+def notificar(canal, evento):
+    corpo, content_type = utils.encode_event(evento)
+    canal.basic_publish('notificacao_leilao', f"leilao.{evento['id_leilao']}", corpo,
+                        utils.event_properties(content_type))
+
+
+def test_consultas_pelo_broker(servico, memoria):
+    canal = memoria.channel()
+    for valor, usuario in ((10.0, 'a'), (12.0, 'b'), (15.0, 'a')):
+        notificar(canal, {"id_leilao": 'x', "id_usuario": usuario, "valor": valor, "ts": 1.0})
+    notificar(canal, {"id_leilao": 'x', "id_vencedor": 'a', "valor": 15.0})
+    limite = time.monotonic() + 5
+    while servico.indice.resumo('x') is None or servico.indice.resumo('x')["vencedor"] is None:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+    top = ms_historico.consultar({"tipo": "top", "id_leilao": 'x', "k": 2}, channel=canal)
+    assert top == {"ok": True, "resultado": [{"id_usuario": 'a', "valor": 15.0, "ts": 1.0},
+                                             {"id_usuario": 'b', "valor": 12.0, "ts": 1.0}]}
+    usuario = ms_historico.consultar({"tipo": "usuario", "id_usuario": 'a'}, channel=canal)
+    assert usuario["resultado"] == {'x': [10.0, 15.0]}
+    resumo = ms_historico.consultar({"tipo": "resumo", "id_leilao": 'x'}, channel=canal)
+    assert resumo["resultado"]["vencedor"] == {"id_usuario": 'a', "valor": 15.0}
+    invalida = ms_historico.consultar({"tipo": "outro"}, channel=canal)
+    assert not invalida["ok"]
@@ -0,0 +1,207 @@
+import os
+
+import pytest
+
+import ms_lance
+import utils
+from admissao import FiltroReplay, LimiteUsuarios
+
+
+class Servico:
+    """MS Lance ligado às filas do broker em memória, sem o start_consuming de run()."""
+
+    def __init__(self, conexao, diretorio):
+        self.conexao = conexao
+        self.canal = conexao.channel()
+        self.diretorio_chaves = str(diretorio / 'chaves')
+        self.chaves = {}
+        self.validados = []
+        utils.setup_queues(self.canal)
+        utils.declarar_fila_iniciados(self.canal, utils.FILA_INICIADOS_LANCE)
+        # Canal à parte: entregas com auto_ack abririam buracos nas tags do Consumidor
+        conexao.channel().basic_consume(queue='lance_validado', auto_ack=True,
+                                 on_message_callback=lambda ch, method, properties, body:
+                                 self.validados.append(utils.decode_event(properties, body)))
+
+    def iniciar(self):
+        ms_lance.consumidor = utils.Consumidor(self.canal, intervalo=0)
+        ms_lance.consumidor.consumir(utils.FILA_INICIADOS_LANCE, ms_lance.callback_leilao_iniciado)
+        ms_lance.consumidor.consumir('leilao_finalizado', ms_lance.callback_leilao_finalizado)
+        ms_lance.consumidor.consumir('lance_realizado', ms_lance.callback_lance_realizado)
+
+    def processar(self, tempo=0.02):
+        self.conexao.process_data_events(time_limit=tempo)
+
+    def chave(self, id_usuario):
+        if id_usuario not in self.chaves:
+            private_key, public_key = utils.generate_keys('ed25519')
+            utils.save_key_to_file(public_key, f"{self.diretorio_chaves}/{id_usuario}.pem")
+            self.chaves[id_usuario] = private_key
+        return self.chaves[id_usuario]
+
+    def iniciar_leilao(self, id_leilao):
+        corpo, content_type = utils.encode_event({"id_leilao": id_leilao})
+        utils.publish('leilao_iniciado', '', corpo, utils.event_properties(content_type))
+        self.processar()
+
+    def finalizar_leilao(self, id_leilao):
+        corpo, content_type = utils.encode_event({"id_leilao": id_leilao})
+        utils.publish('', 'leilao_finalizado', corpo, utils.event_properties(content_type))
+        self.processar()
+
+    def lance(self, id_leilao, id_usuario, carimbo=None, **valores):
+        dados = {"id_leilao": id_leilao, "id_usuario": id_usuario, **valores,
+                 **(carimbo or utils.carimbo_lance())}
+        body, properties = utils.build_signed_message(self.chave(id_usuario), dados)
+        utils.publish('', 'lance_realizado', body, properties)
+        self.processar()
+
+    def nao_confirmadas(self):
+        return len(self.canal._nao_confirmadas)
+
+
+@pytest.fixture
+def servico(memoria, tmp_path, monkeypatch):
+    for nome, valor in (('leiloes_ativos', set()), ('maiores_lances', {}), ('consumidor', None),
+                        ('wal', None), ('acks_pendentes', []), ('pipeline', None),
+                        ('filtro_replay', FiltroReplay()), ('limite_usuarios', LimiteUsuarios(taxa=0)),
+                        ('registro_chaves', utils.KeyRegistry(str(tmp_path / 'chaves'), ttl_negativo=0))):
+        monkeypatch.setattr(ms_lance, nome, valor)
+    servico = Servico(memoria, tmp_path)
+    yield servico
+    if ms_lance.wal is not None:
+        ms_lance.wal.fechar()
+
+
+def test_inicio_reentregue_nao_zera_o_maior_lance(servico):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.lance('a', 'u1', valor=10.0)
+    servico.iniciar_leilao('a')
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": 'u1', "valor": 10.0}
+    assert servico.nao_confirmadas() == 0
+
+
+def test_inicio_publicado_com_o_servico_fora_do_ar_e_entregue_depois(servico):
+    servico.iniciar_leilao('a')
+    assert ms_lance.leiloes_ativos == set()
+    servico.iniciar()
+    servico.processar()
+    assert ms_lance.leiloes_ativos == {'a'}
+
+
+def test_estado_recuperado_do_wal_depois_de_uma_queda(servico, tmp_path):
+    ms_lance.recuperar_estado(str(tmp_path / 'wal'))
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.iniciar_leilao('b')
+    servico.lance('a', 'u1', valor=10.0)
+    servico.lance('b', 'u2', maximo=50.0)
+    servico.finalizar_leilao('b')
+    # O ack só sai depois do fsync do group commit
+    assert servico.nao_confirmadas() == 0
+    ms_lance.wal.fechar()
+
+    ms_lance.wal = None
+    ms_lance.leiloes_ativos.clear()
+    ms_lance.maiores_lances.clear()
+    ms_lance.recuperar_estado(str(tmp_path / 'wal'))
+    assert ms_lance.leiloes_ativos == {'a'}
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": 'u1', "valor": 10.0}
+    assert ms_lance.maiores_lances['b'] == {"id_usuario": 'u2', "valor": 0.05, "maximo": 50.0}
+
+    # Lance abaixo do recuperado continua recusado
+    servico.lance('a', 'u2', valor=9.0)
+    assert ms_lance.maiores_lances['a']["id_usuario"] == 'u1'
+
+
+def recusados(estagio):
+    return ms_lance._RECUSADOS[estagio].valor
+
+
+@pytest.mark.parametrize('valores', [{"valor": float('nan')}, {"valor": float('inf')}, {"valor": -1.0},
+                                     {"valor": 0}, {"maximo": float('nan')}, {"maximo": float('inf')}])
+def test_valor_nao_finito_ou_nao_positivo_e_recusado_antes_da_verificacao(servico, valores):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    antes = recusados('estado')
+    servico.lance('a', 'u1', **valores)
+    assert recusados('estado') == antes + 1
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": None, "valor": 0}
+    # Recusa de negócio: ack, não rejeição
+    assert ms_lance.consumidor.stats()['rejeitadas'] == 0
+    servico.lance('a', 'u2', valor=5.0)
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": 'u2', "valor": 5.0}
+
+
+def test_estado_e_conferido_antes_do_limite_por_usuario(servico, monkeypatch):
+    monkeypatch.setattr(ms_lance, 'limite_usuarios', LimiteUsuarios(taxa=0.001, rajada=1))
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.lance('a', 'u1', valor=10.0)
+    estado, taxa = recusados('estado'), recusados('taxa')
+    servico.lance('a', 'u1', valor=9.0)
+    assert (recusados('estado'), recusados('taxa')) == (estado + 1, taxa)
+    servico.lance('a', 'u1', valor=11.0)
+    assert (recusados('estado'), recusados('taxa')) == (estado + 1, taxa + 1)
+    assert ms_lance.maiores_lances['a']["valor"] == 10.0
+
+
+def test_lance_repetido_e_replay(servico):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    carimbo = utils.carimbo_lance()
+    servico.lance('a', 'u1', carimbo, valor=10.0)
+    replay = recusados('replay')
+    # Mesmo nonce: recusado mesmo com um valor que ainda venceria
+    servico.lance('a', 'u1', carimbo, valor=11.0)
+    assert recusados('replay') == replay + 1
+    assert [evento["valor"] for evento in servico.validados] == [10.0]
+
+
+def test_lance_sem_chave_publica_e_rejeitado(servico):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.chave('u1')
+    os.remove(f"{servico.diretorio_chaves}/u1.pem")
+    servico.lance('a', 'u1', valor=10.0)
+    assert ms_lance.consumidor.stats()['rejeitadas'] == 1
+    assert servico.validados == []
+
+
+def test_lance_automatico_publica_so_o_preco(servico):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.lance('a', 'u1', maximo=100.0)
+    servico.lance('a', 'u2', valor=50.0)
+    # O máximo de u1 cobre o lance de u2: o preço sobe, u1 continua à frente
+    servico.lance('a', 'u2', valor=101.0)
+    assert [(e["id_usuario"], e["valor"], e.get("automatico")) for e in servico.validados] == [
+        ('u1', 0.05, True), ('u1', 51.0, True), ('u2', 101.0, None)]
+    assert all("maximo" not in evento for evento in servico.validados)
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": 'u2', "valor": 101.0}
+
+
+def test_vencedor_publicado_ao_finalizar(servico):
+    servico.iniciar()
+    servico.iniciar_leilao('a')
+    servico.lance('a', 'u1', valor=10.0)
+    vencedores = []
+    servico.conexao.channel().basic_consume(
+        queue='leilao_vencedor', auto_ack=True,
+        on_message_callback=lambda ch, method, properties, body:
+        vencedores.append(utils.decode_event(properties, body)))
+    servico.finalizar_leilao('a')
+    assert vencedores == [{"id_leilao": 'a', "id_vencedor": 'u1', "valor": 10.0}]
+    servico.lance('a', 'u2', valor=20.0)
+    assert ms_lance.maiores_lances['a']["id_usuario"] == 'u1'
+
+
+def test_aplicar_lance_recusa_nan_mesmo_sem_a_admissao(servico):
+    ms_lance.leiloes_ativos.add('a')
+    ms_lance.maiores_lances['a'] = {"id_usuario": 'u1', "valor": 10.0}
+    for valores in ({"valor": float('nan')}, {"maximo": float('inf')}):
+        ms_lance.aplicar_lance(dict(valores, id_leilao='a', id_usuario='u2'), b'', True)
+    assert ms_lance.maiores_lances['a'] == {"id_usuario": 'u1', "valor": 10.0}
+    servico.processar()
+    assert servico.validados == []
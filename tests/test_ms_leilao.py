@@ -0,0 +1,70 @@
+import datetime
+import time
+
+import pytest
+
+import utils
+from ms_leilao import MSLeilao
+
+
+@pytest.fixture
+def eventos(memoria):
+    """Eventos publicados pelo MS Leilão: (fila, id_leilao)."""
+    canal = memoria.channel()
+    utils.setup_queues(canal)
+    canal.queue_declare(queue='inicios', exclusive=True)
+    canal.queue_bind(exchange='leilao_iniciado', queue='inicios')
+    recebidos = []
+    for fila in ('inicios', 'leilao_finalizado'):
+        canal.basic_consume(queue=fila, auto_ack=True,
+                            on_message_callback=lambda ch, method, properties, body, fila=fila:
+                            recebidos.append((fila, utils.decode_event(properties, body)['id_leilao'])))
+
+    def ler():
+        memoria.process_data_events()
+        return recebidos
+
+    return ler
+
+
+@pytest.fixture
+def servico(memoria, tmp_path):
+    criados = []
+
+    def criar(demo=False):
+        criados.append(MSLeilao(str(tmp_path / 'leiloes.db'), demo=demo))
+        return criados[-1]
+
+    yield criar
+    for ms in criados:
+        ms.catalogo.fechar()
+
+
+def rodar(ms, segundos):
+    ms.agendador.agendar(time.time() + segundos, None, ms.agendador.parar)
+    ms.agendador.executar()
+
+
+def test_transicoes_publicam_inicio_e_fim(servico, eventos):
+    ms = servico()
+    agora = datetime.datetime.now()
+    ms.adicionar_leilao('rapido', 'teste', agora, agora + datetime.timedelta(seconds=0.2))
+    ms.adicionar_leilao('passado', 'teste', agora - datetime.timedelta(seconds=2),
+                        agora - datetime.timedelta(seconds=1))
+    rodar(ms, 0.5)
+
+    assert sorted(eventos()) == [('inicios', 'leilao_001'), ('inicios', 'rapido'),
+                                 ('leilao_finalizado', 'rapido')]
+    status = {id_leilao: ms.catalogo.obter(id_leilao)["status"]
+              for id_leilao in ('leilao_001', 'leilao_002', 'rapido', 'passado')}
+    assert status == {'leilao_001': 'ativo', 'leilao_002': 'agendado',
+                      'rapido': 'finalizado', 'passado': 'expirado'}
+
+
+def test_demo_so_recadastra_quando_pedido(servico):
+    ms = servico()
+    rodar(ms, 0.1)
+    assert ms.catalogo.obter('leilao_001')["status"] == 'ativo'
+
+    assert servico().catalogo.obter('leilao_001')["status"] == 'ativo'
+    assert servico(demo=True).catalogo.obter('leilao_001')["status"] == 'agendado'
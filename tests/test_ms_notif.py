@@ -0,0 +1,86 @@
+import pytest
+
+import utils
+from ms_notif import MSNotificacaoAsync, Conflador
+
+
+class Servico:
+    """MS Notificação (asyncio) com conflação, ligado ao broker em memória."""
+
+    def __init__(self, conexao, janela, publicar=None):
+        self.conexao = conexao
+        self.canal = conexao.channel()
+        for fila in MSNotificacaoAsync.FILAS:
+            self.canal.queue_declare(queue=fila, durable=True)
+        self.canal.exchange_declare(exchange='notificacao_leilao', exchange_type='topic')
+        self.recebidas = []
+        assinante = conexao.channel()
+        fila = assinante.queue_declare(queue='', exclusive=True).method.queue
+        assinante.queue_bind(exchange='notificacao_leilao', queue=fila, routing_key='leilao.*')
+        assinante.basic_consume(queue=fila, auto_ack=True,
+                                on_message_callback=lambda ch, method, properties, body:
+                                self.recebidas.append(utils.decode_event(properties, body)))
+
+        self.ms = MSNotificacaoAsync(janela_conflacao=janela)
+        self.ms.consumidor = utils.Consumidor(self.canal, intervalo=0)
+        self.ms.conflador = Conflador(janela, publicar or self.canal.basic_publish, conexao.call_later)
+        for fila in MSNotificacaoAsync.FILAS:
+            self.ms.consumidor.consumir(fila, lambda ch, method, properties, body, fila=fila:
+                                        self.ms.processar(fila, ch, method, properties, body))
+
+    def publicar(self, fila, evento):
+        corpo, content_type = utils.encode_event(evento)
+        self.canal.basic_publish('', fila, corpo, utils.event_properties(content_type))
+
+    def processar(self, tempo=0.0):
+        self.conexao.process_data_events(time_limit=tempo)
+
+
+@pytest.fixture
+def servicos(conexao):
+    criados = []
+
+    def criar(janela, publicar=None):
+        criados.append(Servico(conexao, janela, publicar))
+        return criados[-1]
+
+    yield criar
+    for servico in criados:
+        servico.ms.loop.close()
+
+
+def test_conflacao_publica_so_o_ultimo_lance_e_confirma_na_hora(servicos):
+    servico = servicos(0.02)
+    for valor in (1.0, 2.0, 3.0):
+        servico.publicar('lance_validado', {"id_leilao": "a", "id_usuario": "u", "valor": valor})
+    servico.processar()
+    assert servico.ms.consumidor.acks == 3
+    assert servico.recebidas == []
+
+    servico.processar(0.05)
+    assert [evento["valor"] for evento in servico.recebidas] == [3.0]
+
+
+def test_vencedor_descarrega_o_pendente_antes(servicos):
+    servico = servicos(10)
+    servico.publicar('lance_validado', {"id_leilao": "a", "id_usuario": "u", "valor": 5.0})
+    servico.publicar('leilao_vencedor', {"id_leilao": "a", "id_vencedor": "u", "valor": 5.0})
+    servico.publicar('lance_validado', {"id_leilao": "a", "id_usuario": "v", "valor": 6.0})
+    servico.processar()
+    assert servico.recebidas == [{"id_leilao": "a", "id_usuario": "u", "valor": 5.0},
+                                 {"id_leilao": "a", "id_vencedor": "u", "valor": 5.0}]
+    assert servico.ms.conflador.descartados == 1
+    assert servico.ms.consumidor.acks == 3
+
+
+def test_falha_ao_publicar_o_vencedor_confirma_uma_vez(servicos):
+    def publicar(exchange, routing_key, body, properties):
+        raise ConnectionError('canal fechado')
+
+    servico = servicos(10, publicar)
+    servico.publicar('leilao_vencedor', {"id_leilao": "a", "id_vencedor": "u", "valor": 5.0})
+    servico.publicar('leilao_vencedor', {"id_leilao": "b", "id_vencedor": "u", "valor": 5.0})
+    servico.processar()
+    assert servico.ms.consumidor.acks == 2
+    assert servico.ms.consumidor.stats()['aguardando'] == 0
+    assert len(servico.canal._nao_confirmadas) == 0
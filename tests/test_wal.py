@@ -0,0 +1,89 @@
+import os
+
+from wal import LogLances
+
+
+def gravar(diretorio, registros, snapshot_a_cada=500000):
+    wal = LogLances(str(diretorio), snapshot_a_cada)
+    wal.recuperar()
+    for registro in registros:
+        wal.registrar(registro)
+    wal.sincronizar()
+    return wal
+
+
+def test_diretorio_vazio_recupera_estado_vazio(tmp_path):
+    assert LogLances(str(tmp_path)).recuperar() == (set(), {}, 0)
+
+
+def test_recupera_inicios_lances_e_fins(tmp_path):
+    gravar(tmp_path, [
+        ["i", "a"], ["i", "b"],
+        ["l", "a", "u1", 10], ["l", "a", "u2", 12.5],
+        ["l", "b", "u1", 3, 9],
+        ["f", "a"],
+    ]).fechar()
+
+    ativos, maiores, reaplicados = LogLances(str(tmp_path)).recuperar()
+    assert ativos == {"b"}
+    assert maiores == {
+        "a": {"id_usuario": "u2", "valor": 12.5},
+        "b": {"id_usuario": "u1", "valor": 3, "maximo": 9},
+    }
+    assert reaplicados == 6
+
+
+def test_lance_comum_depois_de_automatico_apaga_o_maximo(tmp_path):
+    gravar(tmp_path, [["i", "a"], ["l", "a", "u1", 5, 50], ["l", "a", "u2", 60]]).fechar()
+    _, maiores, _ = LogLances(str(tmp_path)).recuperar()
+    assert maiores["a"] == {"id_usuario": "u2", "valor": 60}
+
+
+def test_ultima_linha_interrompida_e_descartada(tmp_path):
+    wal = gravar(tmp_path, [["i", "a"], ["l", "a", "u1", 10]])
+    caminho = wal._caminho_segmento(wal.segmento)
+    wal.fechar()
+    # Queda no meio de uma escrita: a linha fica sem '\n'
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write('["l","a","u2",2')
+
+    ativos, maiores, reaplicados = LogLances(str(tmp_path)).recuperar()
+    assert ativos == {"a"}
+    assert maiores["a"] == {"id_usuario": "u1", "valor": 10}
+    assert reaplicados == 2
+
+
+def test_segmento_so_com_linha_interrompida(tmp_path):
+    wal = gravar(tmp_path, [])
+    caminho = wal._caminho_segmento(wal.segmento)
+    wal.fechar()
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write('["i","a"')
+    assert LogLances(str(tmp_path)).recuperar() == (set(), {}, 0)
+
+
+def test_snapshot_descarta_segmentos_antigos(tmp_path):
+    wal = gravar(tmp_path, [["i", "a"], ["l", "a", "u1", 10]], snapshot_a_cada=2)
+    assert wal.precisa_snapshot()
+    ativos, maiores, _ = LogLances(str(tmp_path)).recuperar()
+    wal.snapshot(ativos, maiores)
+    wal.registrar(["l", "a", "u2", 11])
+    wal.fechar()
+
+    segmentos = [nome for nome in os.listdir(tmp_path) if nome.startswith('log.')]
+    assert segmentos == [f"log.{wal.segmento:08d}"]
+    ativos, maiores, reaplicados = LogLances(str(tmp_path)).recuperar()
+    assert ativos == {"a"}
+    assert maiores["a"] == {"id_usuario": "u2", "valor": 11}
+    assert reaplicados == 1
+
+
+def test_registros_nao_sincronizados_ficam_pendentes(tmp_path):
+    wal = LogLances(str(tmp_path))
+    wal.recuperar()
+    wal.registrar(["i", "a"])
+    wal.registrar(["i", "b"])
+    assert wal.pendentes == 2
+    wal.sincronizar()
+    assert wal.pendentes == 0
+    wal.fechar()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import utils
+import wire
+
+EVENTOS = [
+    {"id_leilao": "leilao_001", "id_usuario": "user_ab12", "valor": 150.5,
+     "nonce": "9f2c41d0aa17b3e8", "ts": 1792300000.123},
+    {"id_leilao": "leilao_001", "id_usuario": "u", "maximo": 400.0},
+    {"id_leilao": "x", "id_vencedor": "u", "valor": 10.0},
+    {"id_leilao": "x", "campo_novo": [1, -1, 2 ** 40, -(2 ** 40), None, True, False],
+     "aninhado": {"a": {"b": [1.5, "ç"]}}, "bruto": b"\x00\xff"},
+    {"descricao": "d" * 300, "lista": list(range(20)), "mapa": {str(i): i for i in range(20)}},
+    {},
+]
+
+
+@pytest.mark.parametrize('evento', EVENTOS)
+def test_ida_e_volta(evento):
+    assert wire.decodificar(wire.codificar(evento)) == evento
+
+
+def test_codificacao_deterministica():
+    a = {"valor": 1.0, "id_usuario": "u", "id_leilao": "l"}
+    b = {"id_leilao": "l", "id_usuario": "u", "valor": 1.0}
+    assert wire.codificar(a) == wire.codificar(b)
+
+
+def test_chaves_do_esquema_viram_um_codigo():
+    assert len(wire.codificar({"id_leilao": "l"})) < len(wire.codificar({"id_leilaox": "l"}))
+
+
+def test_encode_decode_event_nos_dois_formatos():
+    evento = EVENTOS[0]
+    for formato in ('json', 'binario'):
+        corpo, content_type = utils.encode_event(evento, formato)
+        assert utils.decode_event(utils.event_properties(content_type), corpo) == evento
+    corpo, _ = utils.encode_event(evento, 'json')
+    assert json.loads(corpo) == evento
+
+
+def test_tipo_nao_suportado_na_codificacao():
+    with pytest.raises(TypeError):
+        wire.codificar({"x": object()})
+
+
+CABECALHO = bytes((wire.MAGIC, wire.VERSAO))
+
+MALFORMADOS = {
+    'vazia': b'',
+    'curta': CABECALHO,
+    'magic_errado': bytes((0x00, wire.VERSAO, 0x80)),
+    'versao_futura': bytes((wire.MAGIC, wire.VERSAO + 1, 0x80)),
+    'truncada': wire.codificar(EVENTOS[0])[:-3],
+    'bytes_sobrando': wire.codificar({"a": 1}) + b'\x00',
+    'codigo_de_chave_desconhecido': CABECALHO + bytes((0x81, 0xD4, 0xFF, 0x01)),
+    'marcador_desconhecido': CABECALHO + bytes((0xC1,)),
+    'chave_lista': CABECALHO + bytes((0x81, 0x91, 0x01, 0x01)),
+    'chave_mapa': CABECALHO + bytes((0x81, 0x80, 0x01)),
+    'utf8_invalido': CABECALHO + bytes((0xA1, 0xFF)),
+    'aninhamento_profundo': CABECALHO + bytes((0x91,)) * 100000 + b'\x01',
+}
+
+
+@pytest.mark.parametrize('nome', sorted(MALFORMADOS))
+def test_malformada_gera_erro_formato(nome):
+    with pytest.raises(wire.ErroFormato):
+        wire.decodificar(MALFORMADOS[nome])
+
+
+def test_erro_formato_e_value_error():
+    # Os serviços tratam mensagens malformadas capturando ValueError
+    assert issubclass(wire.ErroFormato, ValueError)
@@ -1,15 +1,477 @@
 import pika
 import json
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from pika.adapters.select_connection import IOLoop
+from pika.exceptions import AMQPConnectionError, AMQPChannelError, StreamLostError
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519, padding
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.exceptions import InvalidSignature
 import os
+import secrets
+import wire
+import broker_memoria
+import metricas
 
 HOST = 'localhost'
+# 'rabbitmq' ou 'memoria' (broker em processo, ver broker_memoria)
+BROKER = os.environ.get('LEILAO_BROKER', 'rabbitmq')
+HEARTBEAT = 60
+# Quantidade de shards do MS Lance (0 = fila única lance_realizado).
+# Precisa ser a mesma em todos os publicadores e workers.
+NUM_SHARDS = int(os.environ.get('LEILAO_SHARDS', 0))
+# Fila (ou prefixo das filas por shard) de leilao_iniciado do MS Lance
+FILA_INICIADOS_LANCE = 'leilao_iniciado.ms_lance'
+# Consultas do MS Histórico e snapshot/deltas do MS Estado (usados também pelo cliente)
+FILA_CONSULTAS = 'historico_consultas'
+FILA_SNAPSHOT = 'estado_snapshot'
+EXCHANGE_DELTAS = 'estado_leiloes'
+# Publica eventos de ciclo de vida/validação com publisher confirms
+CONFIRMS = os.environ.get('LEILAO_CONFIRMS') == '1'
+# Formato dos eventos publicados: 'json' ou 'binario' (a leitura aceita os dois)
+FORMATO = os.environ.get('LEILAO_FORMATO', 'json')
+CONTENT_TYPES = {'json': wire.CONTENT_TYPE_JSON, 'binario': wire.CONTENT_TYPE_BINARIO}
+# Consumidores: mensagens entregues e ainda sem ack por canal, e acks em lote
+PREFETCH = int(os.environ.get('LEILAO_PREFETCH', 64))
+ACK_LOTE = int(os.environ.get('LEILAO_ACK_LOTE', 16))
+ACK_INTERVALO = float(os.environ.get('LEILAO_ACK_INTERVALO_MS', 50)) / 1000
+# Porta do endpoint /metrics de cada serviço (0 = não expõe; a coleta é sempre feita)
+METRICAS_PORTA = int(os.environ.get('LEILAO_METRICAS_PORTA', 0))
+
+def iniciar_metricas(porta, servico):
+    """Expõe as métricas do processo em http://127.0.0.1:<porta>/metrics."""
+    if porta:
+        metricas.servir(porta)
+        print(f"{servico}: métricas em http://127.0.0.1:{porta}/metrics")
+
+def get_connection_parameters():
+    return pika.ConnectionParameters(host=HOST, heartbeat=HEARTBEAT)
+
+def open_connection():
+    """Nova conexão bloqueante com o broker configurado em BROKER."""
+    if BROKER == 'memoria':
+        return broker_memoria.conectar()
+    return pika.BlockingConnection(get_connection_parameters())
 
 def get_rabbitmq_channel():
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host=HOST))
-    return connection.channel()
+    """Abre uma conexão dedicada e devolve um canal (uso: consumidores)."""
+    return open_connection().channel()
+
+
+class ChannelPool:
+    """Pool de conexões de publicação, uma por thread e por processo.
+
+    BlockingConnection não é thread-safe, então cada thread recebe sua própria
+    conexão/canal, criada na primeira publicação e reaproveitada nas
+    seguintes. Conexões herdadas via fork são descartadas (o socket pertence
+    ao processo pai).
+    """
+
+    def __init__(self, max_tentativas=3, intervalo_health_check=None):
+        self.max_tentativas = max_tentativas
+        # Conexões ociosas precisam processar heartbeats de tempos em tempos
+        if intervalo_health_check is None:
+            intervalo_health_check = HEARTBEAT / 2
+        self.intervalo_health_check = intervalo_health_check
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._conexoes = []
+
+    def _verificar_fork(self):
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._pid = os.getpid()
+                    self._conexoes = []
+                    self._local = threading.local()
+
+    def _conectar(self):
+        connection = open_connection()
+        channel = connection.channel()
+        self._local.connection = connection
+        self._local.channel = channel
+        self._local.ultimo_uso = time.monotonic()
+        with self._lock:
+            self._conexoes.append(connection)
+        return channel
+
+    def _descartar(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        self._local.channel = None
+        if connection is None:
+            return
+        with self._lock:
+            if connection in self._conexoes:
+                self._conexoes.remove(connection)
+        try:
+            if connection.is_open:
+                connection.close()
+        except Exception:
+            pass
+
+    def _saudavel(self):
+        connection = getattr(self._local, 'connection', None)
+        channel = getattr(self._local, 'channel', None)
+        if connection is None or channel is None:
+            return False
+        if not (connection.is_open and channel.is_open):
+            return False
+        if time.monotonic() - self._local.ultimo_uso >= self.intervalo_health_check:
+            try:
+                connection.process_data_events(time_limit=0)
+            except (AMQPConnectionError, AMQPChannelError, StreamLostError):
+                return False
+        return True
+
+    def channel(self):
+        """Devolve o canal da thread atual, reconectando se necessário."""
+        self._verificar_fork()
+        if not self._saudavel():
+            self._descartar()
+            return self._conectar()
+        return self._local.channel
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        """Publica uma mensagem, refazendo a conexão em caso de falha."""
+        for tentativa in range(1, self.max_tentativas + 1):
+            channel = self.channel()
+            try:
+                channel.basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=properties
+                )
+                self._local.ultimo_uso = time.monotonic()
+                return
+            except (AMQPConnectionError, AMQPChannelError, StreamLostError):
+                self._descartar()
+                if tentativa == self.max_tentativas:
+                    raise
+
+    def close_all(self):
+        """Fecha todas as conexões abertas pelo pool neste processo."""
+        with self._lock:
+            conexoes, self._conexoes = self._conexoes, []
+        for connection in conexoes:
+            try:
+                if connection.is_open:
+                    connection.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+_pool = ChannelPool()
+
+def get_pooled_channel():
+    """Canal de publicação reaproveitado da thread atual."""
+    return _pool.channel()
+
+def publish(exchange, routing_key, body, properties=None):
+    """Publica através do pool de conexões do processo."""
+    _pool.publish(exchange, routing_key, body, properties)
+
+def close_pool():
+    _pool.close_all()
+    close_reliable_publisher()
+
+
+class ReliablePublisher:
+    """Publicador com publisher confirms assíncronos e muitas mensagens em voo.
+
+    Roda uma SelectConnection numa thread própria. publish() só enfileira a
+    mensagem no ioloop (bloqueando apenas se max_em_voo mensagens ainda não
+    foram confirmadas), e os acks/nacks do broker chegam em lote (multiple).
+    Mensagens com nack são reenviadas até max_tentativas; as que estavam em
+    voo quando a conexão caiu são reenviadas após reconectar (pelo menos
+    uma vez).
+    """
+
+    def __init__(self, max_em_voo=1000, max_tentativas=3, intervalo_reconexao=1.0):
+        self.max_tentativas = max_tentativas
+        self.intervalo_reconexao = intervalo_reconexao
+        self._vagas = threading.Semaphore(max_em_voo)
+        self._cond = threading.Condition()
+        self._em_aberto = 0
+        # Estado abaixo só é tocado pela thread do ioloop
+        self._aguardando = deque()
+        self._pendentes = OrderedDict()
+        self._channel = None
+        self._pronto = False
+        self._tag = 0
+        self._fechando = False
+        self.confirmadas = 0
+        self.nacks = 0
+        self.retentativas = 0
+        self.falhas = 0
+        self.latencias = deque(maxlen=100000)
+        self._ioloop = IOLoop()
+        self._conectar()
+        self._thread = threading.Thread(target=self._ioloop.start, daemon=True,
+                                        name='reliable-publisher')
+        self._thread.start()
+
+    def _conectar(self):
+        self._connection = pika.SelectConnection(
+            get_connection_parameters(),
+            on_open_callback=self._on_conexao_aberta,
+            on_open_error_callback=self._on_falha_conexao,
+            on_close_callback=self._on_conexao_fechada,
+            custom_ioloop=self._ioloop
+        )
+
+    def _on_conexao_aberta(self, connection):
+        connection.channel(on_open_callback=self._on_canal_aberto)
+
+    def _on_falha_conexao(self, connection, erro):
+        if not self._fechando:
+            self._ioloop.call_later(self.intervalo_reconexao, self._conectar)
+
+    def _on_conexao_fechada(self, connection, motivo):
+        self._reenfileirar_pendentes()
+        if self._fechando:
+            self._ioloop.stop()
+        else:
+            self._ioloop.call_later(self.intervalo_reconexao, self._conectar)
+
+    def _on_canal_aberto(self, channel):
+        self._channel = channel
+        self._tag = 0
+        channel.add_on_close_callback(self._on_canal_fechado)
+        channel.confirm_delivery(ack_nack_callback=self._on_confirmacao,
+                                 callback=self._on_confirm_ativo)
+
+    def _on_confirm_ativo(self, frame):
+        self._pronto = True
+        while self._aguardando and self._pronto:
+            self._enviar(self._aguardando.popleft())
+
+    def _on_canal_fechado(self, channel, motivo):
+        self._reenfileirar_pendentes()
+        if not self._fechando and self._connection.is_open:
+            self._connection.channel(on_open_callback=self._on_canal_aberto)
+
+    def _reenfileirar_pendentes(self):
+        self._pronto = False
+        self._channel = None
+        # Mantém a ordem original: pendentes vão antes das que nem foram enviadas
+        self._aguardando.extendleft(reversed(self._pendentes.values()))
+        self._pendentes.clear()
+
+    def _enviar(self, mensagem):
+        if not self._pronto:
+            self._aguardando.append(mensagem)
+            return
+        exchange, routing_key, body, properties = mensagem[:4]
+        self._tag += 1
+        self._pendentes[self._tag] = mensagem
+        try:
+            self._channel.basic_publish(exchange, routing_key, body, properties)
+        except (AMQPConnectionError, AMQPChannelError, StreamLostError):
+            self._reenfileirar_pendentes()
+
+    def _on_confirmacao(self, frame):
+        method = frame.method
+        ack = isinstance(method, pika.spec.Basic.Ack)
+        if method.multiple:
+            tags = []
+            for tag in self._pendentes:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._pendentes else []
+
+        for tag in tags:
+            mensagem = self._pendentes.pop(tag)
+            if ack:
+                self._resolver(mensagem, True)
+                continue
+            self.nacks += 1
+            if mensagem[4] + 1 < self.max_tentativas:
+                mensagem[4] += 1
+                self.retentativas += 1
+                self._enviar(mensagem)
+            else:
+                self._resolver(mensagem, False)
+
+    def _resolver(self, mensagem, confirmada):
+        if confirmada:
+            self.confirmadas += 1
+            self.latencias.append(time.monotonic() - mensagem[5])
+        else:
+            self.falhas += 1
+            print(f"❌ Mensagem para '{mensagem[1]}' rejeitada pelo broker após {self.max_tentativas} tentativas")
+        self._vagas.release()
+        with self._cond:
+            self._em_aberto -= 1
+            self._cond.notify_all()
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        """Enfileira a publicação; a confirmação chega de forma assíncrona."""
+        if properties is None:
+            properties = pika.BasicProperties(delivery_mode=2)
+        self._vagas.acquire()
+        with self._cond:
+            self._em_aberto += 1
+        mensagem = [exchange, routing_key, body, properties, 0, time.monotonic()]
+        self._ioloop.add_callback_threadsafe(lambda: self._enviar(mensagem))
+
+    def flush(self, timeout=None):
+        """Aguarda a confirmação de tudo o que já foi publicado."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._em_aberto == 0, timeout)
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+
+        def fechar():
+            self._fechando = True
+            if self._connection.is_open:
+                self._connection.close()
+            else:
+                self._ioloop.stop()
+
+        self._ioloop.add_callback_threadsafe(fechar)
+        self._thread.join(timeout)
+
+    def stats(self):
+        latencias = sorted(self.latencias)
+
+        def percentil(p):
+            if not latencias:
+                return 0.0
+            return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1e3
+
+        return {
+            "confirmadas": self.confirmadas,
+            "nacks": self.nacks,
+            "retentativas": self.retentativas,
+            "falhas": self.falhas,
+            "em_voo": self._em_aberto,
+            "p50_ms": percentil(0.50),
+            "p95_ms": percentil(0.95),
+            "p99_ms": percentil(0.99),
+        }
+
+
+_reliable = None
+_reliable_pid = None
+_reliable_lock = threading.Lock()
+
+def get_reliable_publisher():
+    """Publicador confiável do processo (criado na primeira chamada)."""
+    global _reliable, _reliable_pid
+    with _reliable_lock:
+        if _reliable is None or _reliable_pid != os.getpid():
+            _reliable = ReliablePublisher()
+            _reliable_pid = os.getpid()
+        return _reliable
+
+def close_reliable_publisher():
+    global _reliable
+    with _reliable_lock:
+        if _reliable is not None and _reliable_pid == os.getpid():
+            _reliable.close()
+            stats = _reliable.stats()
+            print("Publisher confirms: " + " | ".join(
+                f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+        _reliable = None
+
+def publish_event(exchange, routing_key, body, properties=None):
+    """Publica um evento do leilão; com LEILAO_CONFIRMS=1 usa publisher confirms."""
+    # O broker em memória não perde publicações: confirms não se aplicam
+    if CONFIRMS and BROKER != 'memoria':
+        get_reliable_publisher().publish(exchange, routing_key, body, properties)
+    else:
+        publish(exchange, routing_key, body, properties)
+
+
+class Consumidor:
+    """Consumo com prefetch limitado e acks cumulativos em lote.
+
+    ack()/rejeitar() marcam a entrega como concluída; flush() confirma com um
+    único basic_ack(multiple=True) o maior prefixo contíguo de delivery tags
+    concluídas, então entregas que terminam fora de ordem (pipeline, group
+    commit, conflação) esperam as anteriores. O flush acontece a cada 'lote'
+    acks ou 'intervalo' segundos depois do primeiro pendente; o lote fica
+    abaixo do prefetch para o broker nunca parar de entregar esperando acks.
+
+    Toda entrega do canal precisa passar por ack() ou rejeitar(), senão o
+    prefixo trava. Só deve ser usado na thread da conexão; 'agendar' é o
+    call_later dela (padrão: BlockingConnection.call_later).
+    """
+
+    def __init__(self, channel, prefetch=PREFETCH, lote=ACK_LOTE, intervalo=ACK_INTERVALO,
+                 agendar=None):
+        self.channel = channel
+        self.prefetch = prefetch
+        self.lote = max(1, min(lote, prefetch // 2) if prefetch else lote)
+        self.intervalo = intervalo
+        self._agendar = agendar or channel.connection.call_later
+        # delivery_tag -> True (ack) / False (já rejeitada)
+        self._concluidas = {}
+        self._base = 0
+        self._agendado = False
+        self.acks = 0
+        self.rejeitadas = 0
+        self.frames_ack = 0
+        if prefetch:
+            channel.basic_qos(prefetch_count=prefetch)
+
+    def consumir(self, fila, callback):
+        return self.channel.basic_consume(queue=fila, on_message_callback=callback)
+
+    def ack(self, delivery_tag):
+        self.acks += 1
+        self._concluir(delivery_tag, True)
+
+    def rejeitar(self, delivery_tag, requeue=False):
+        """Nack imediato só desta entrega (sem requeue ela é descartada/DLX)."""
+        if self.channel.is_open:
+            self.channel.basic_nack(delivery_tag=delivery_tag, multiple=False, requeue=requeue)
+        self.rejeitadas += 1
+        self._concluir(delivery_tag, False)
+
+    def _concluir(self, delivery_tag, confirmar):
+        self._concluidas[delivery_tag] = confirmar
+        if self.intervalo <= 0 or len(self._concluidas) >= self.lote:
+            self.flush()
+        elif not self._agendado:
+            self._agendado = True
+            self._agendar(self.intervalo, self._flush_agendado)
+
+    def _flush_agendado(self):
+        self._agendado = False
+        self.flush()
+
+    def flush(self):
+        base, ate = self._base, 0
+        while base + 1 in self._concluidas:
+            base += 1
+            if self._concluidas.pop(base):
+                ate = base
+        self._base = base
+        # O ack múltiplo termina numa tag confirmada: a de uma entrega já
+        # rejeitada seria "unknown delivery tag" para o broker
+        if ate and self.channel.is_open:
+            self.channel.basic_ack(delivery_tag=ate, multiple=True)
+            self.frames_ack += 1
+
+    def stats(self):
+        return {
+            "acks": self.acks,
+            "rejeitadas": self.rejeitadas,
+            "frames_ack": self.frames_ack,
+            "aguardando": len(self._concluidas),
+            "acks_por_frame": round(self.acks / self.frames_ack, 1) if self.frames_ack else 0,
+        }
+
 
 def setup_queues(channel):
     #channel.queue_declare(queue='leilao_iniciado', durable=True)
@@ -20,46 +482,213 @@ def setup_queues(channel):
     
     channel.exchange_declare(exchange='leilao_iniciado', exchange_type='fanout')
     channel.exchange_declare(exchange='notificacao_leilao', exchange_type='topic')
+    # Publicadores também declaram: um lance enviado antes de algum shard
+    # subir não pode cair numa exchange inexistente (404 fecha o canal)
+    if NUM_SHARDS > 0:
+        setup_shards(channel, NUM_SHARDS)
+
+def shard_for(id_leilao, num_shards):
+    """Shard dono do leilão (crc32 é estável entre processos, ao contrário de hash())."""
+    return zlib.crc32(id_leilao.encode('utf-8')) % num_shards
+
+def declarar_fila_iniciados(channel, fila):
+    """Fila durável do MS Lance ligada a leilao_iniciado: inícios perdidos com ele fora do ar são reentregues.
+
+    Só o MS Lance declara: declarada por outro processo, uma fila que
+    ninguém consome (MS Lance fora do deploy ou com outro número de shards)
+    cresceria sem limite.
+    """
+    channel.queue_declare(queue=fila, durable=True)
+    channel.queue_bind(exchange='leilao_iniciado', queue=fila)
+
+def fila_iniciados_shard(shard):
+    return f'{FILA_INICIADOS_LANCE}.{shard}'
+
+def setup_shards(channel, num_shards):
+    """Declara as filas por shard e as exchanges diretas que as alimentam."""
+    for exchange in ('lance_realizado_shards', 'leilao_finalizado_shards'):
+        channel.exchange_declare(exchange=exchange, exchange_type='direct', durable=True)
+    for shard in range(num_shards):
+        channel.queue_declare(queue=f'lance_realizado.{shard}', durable=True)
+        channel.queue_bind(exchange='lance_realizado_shards', queue=f'lance_realizado.{shard}',
+                           routing_key=str(shard))
+        channel.queue_declare(queue=f'leilao_finalizado.{shard}', durable=True)
+        channel.queue_bind(exchange='leilao_finalizado_shards', queue=f'leilao_finalizado.{shard}',
+                           routing_key=str(shard))
+
+def route_bid(id_leilao, num_shards=None):
+    """(exchange, routing_key) para publicar um lance do leilão."""
+    num_shards = NUM_SHARDS if num_shards is None else num_shards
+    if num_shards <= 0:
+        return '', 'lance_realizado'
+    return 'lance_realizado_shards', str(shard_for(id_leilao, num_shards))
+
+def route_finished(id_leilao, num_shards=None):
+    """(exchange, routing_key) para publicar o fim de um leilão."""
+    num_shards = NUM_SHARDS if num_shards is None else num_shards
+    if num_shards <= 0:
+        return '', 'leilao_finalizado'
+    return 'leilao_finalizado_shards', str(shard_for(id_leilao, num_shards))
+
+class RSAPSSScheme:
+    """RSA-2048 com PSS/SHA-256 (esquema original)."""
+    nome = 'rsa-pss-sha256'
+    tipos_publicos = (rsa.RSAPublicKey,)
+    tipos_privados = (rsa.RSAPrivateKey,)
+
+    def generate_keys(self):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return private_key, private_key.public_key()
+
+    def _padding(self):
+        return padding.PSS(
+            mgf=padding.MGF1(hashes.SHA256()),
+            salt_length=padding.PSS.MAX_LENGTH
+        )
+
+    def sign(self, private_key, message):
+        return private_key.sign(message, self._padding(), hashes.SHA256())
+
+    def verify(self, public_key, signature, message):
+        public_key.verify(signature, message, self._padding(), hashes.SHA256())
+
+
+class Ed25519Scheme:
+    """Ed25519: geração de chaves e assinatura muito mais rápidas que RSA."""
+    nome = 'ed25519'
+    tipos_publicos = (ed25519.Ed25519PublicKey,)
+    tipos_privados = (ed25519.Ed25519PrivateKey,)
+
+    def generate_keys(self):
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        return private_key, private_key.public_key()
+
+    def sign(self, private_key, message):
+        return private_key.sign(message)
+
+    def verify(self, public_key, signature, message):
+        public_key.verify(signature, message)
 
-def generate_keys():
-    """Gera chaves pública e privada de acordo com o ID do processo cliente"""
-    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    public_key = private_key.public_key()
-    return private_key, public_key
+
+SCHEMES = {scheme.nome: scheme for scheme in (RSAPSSScheme(), Ed25519Scheme())}
+DEFAULT_SCHEME = RSAPSSScheme.nome
+
+def get_scheme(nome):
+    """Esquema de assinatura pelo nome publicado no envelope ('alg')."""
+    try:
+        return SCHEMES[nome]
+    except KeyError:
+        raise ValueError(f"Esquema de assinatura desconhecido: {nome}")
+
+def scheme_for_key(key):
+    """Descobre o esquema de uma chave pública ou privada."""
+    for scheme in SCHEMES.values():
+        if isinstance(key, scheme.tipos_publicos + scheme.tipos_privados):
+            return scheme
+    raise ValueError(f"Tipo de chave não suportado: {type(key).__name__}")
+
+def generate_keys(scheme=DEFAULT_SCHEME):
+    """Gera chaves pública e privada no esquema escolhido"""
+    return get_scheme(scheme).generate_keys()
 
 def sign_message(private_key, message):
-    """Cria uma assinatura para a mensagem com um hex"""
+    """Cria uma assinatura para a mensagem no esquema da chave privada"""
     if isinstance(message, dict):
         message = json.dumps(message, sort_keys=True).encode('utf-8')
-        
-    signature = private_key.sign(
-        message,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
-    return signature
 
-def verify_signature(public_key, signature, message):
+    return scheme_for_key(private_key).sign(private_key, message)
+
+def verify_signature(public_key, signature, message, scheme=None):
+    """Verifica a assinatura; se 'scheme' for dado, a chave precisa ser dele."""
     if isinstance(message, dict):
         message = json.dumps(message, sort_keys=True).encode('utf-8')
 
+    key_scheme = scheme_for_key(public_key)
+    # Impede que um envelope declare um algoritmo diferente do da chave registrada
+    if scheme is not None and key_scheme.nome != scheme:
+        return False
     try:
-        public_key.verify(
-            signature,
-            message,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        key_scheme.verify(public_key, signature, message)
         return True
     except InvalidSignature:
         return False
 
+def encode_payload(dados, formato=None):
+    """Serialização canônica de um payload: é exatamente isso que é assinado."""
+    if (formato or FORMATO) == 'binario':
+        return wire.codificar(dados)
+    return json.dumps(dados, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def encode_event(dados, formato=None):
+    """Codifica um evento no formato configurado. Devolve (body, content_type)."""
+    formato = formato or FORMATO
+    return encode_payload(dados, formato), CONTENT_TYPES[formato]
+
+_event_properties = {}
+
+def event_properties(content_type, persistente=False):
+    """BasicProperties reaproveitáveis para um content-type."""
+    chave = (content_type, persistente)
+    properties = _event_properties.get(chave)
+    if properties is None:
+        properties = pika.BasicProperties(content_type=content_type,
+                                          delivery_mode=2 if persistente else None)
+        _event_properties[chave] = properties
+    return properties
+
+def decode_event(properties, body):
+    """Decodifica um evento JSON ou binário conforme o content-type da mensagem."""
+    content_type = properties.content_type if properties is not None else None
+    if content_type == wire.CONTENT_TYPE_BINARIO:
+        return wire.decodificar(body)
+    return json.loads(body)
+
+def carimbo_lance():
+    """nonce e ts que o cliente põe no payload assinado do lance (filtro de replay do MS Lance)."""
+    return {"nonce": secrets.token_hex(8), "ts": round(time.time(), 3)}
+
+def build_signed_message(private_key, dados):
+    """Monta (body, properties) de uma mensagem assinada.
+
+    O body é o payload canônico, e a assinatura e o algoritmo vão nos headers
+    AMQP. Quem recebe verifica os bytes do body como chegaram e pode
+    repassá-los adiante sem serializar de novo.
+    """
+    payload, content_type = encode_event(dados)
+    properties = pika.BasicProperties(
+        content_type=content_type,
+        headers={
+            'alg': scheme_for_key(private_key).nome,
+            'assinatura': sign_message(private_key, payload)
+        }
+    )
+    return payload, properties
+
+def open_signed_message(properties, body):
+    """Extrai (payload, dados, alg, assinatura, content_type) de uma mensagem assinada.
+
+    Também aceita o envelope antigo {"data": ..., "assinatura": hex}, cujo
+    payload assinado é reconstruído com json.dumps(sort_keys=True).
+    """
+    headers = (properties.headers if properties is not None else None) or {}
+    assinatura = headers.get('assinatura')
+    if assinatura is not None:
+        if isinstance(assinatura, str):
+            assinatura = bytes.fromhex(assinatura)
+        dados = decode_event(properties, body)
+        if not isinstance(dados, dict) or not isinstance(assinatura, bytes):
+            raise ValueError("Mensagem assinada malformada")
+        return (body, dados, headers.get('alg', DEFAULT_SCHEME),
+                assinatura, properties.content_type or wire.CONTENT_TYPE_JSON)
+
+    envelope = json.loads(body)
+    if not isinstance(envelope, dict) or not isinstance(envelope.get('data'), dict):
+        raise ValueError("Envelope assinado malformado")
+    dados = envelope['data']
+    payload = json.dumps(dados, sort_keys=True).encode('utf-8')
+    return (payload, dados, envelope.get('alg', DEFAULT_SCHEME),
+            bytes.fromhex(envelope['assinatura']), wire.CONTENT_TYPE_JSON)
+
 def serialize_public_key(public_key):
     """Converte uma chave pública para o formato PEM para transporte."""
     return public_key.public_bytes(
@@ -76,7 +705,7 @@ def save_key_to_file(key, filename):
     os.makedirs(os.path.dirname(filename), exist_ok=True)
     
     pem = None
-    if isinstance(key, rsa.RSAPublicKey):
+    if isinstance(key, (rsa.RSAPublicKey, ed25519.Ed25519PublicKey)):
         pem = key.public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo
@@ -86,6 +715,139 @@ def save_key_to_file(key, filename):
         with open(filename, 'wb') as pem_out:
             pem_out.write(pem)
 
+class KeyRegistry:
+    """Cache de chaves públicas dos usuários, lidas de <diretorio>/<user_id>.pem.
+
+    - LRU limitado a max_chaves entradas;
+    - cache negativo com TTL curto para usuários sem chave, evitando que
+      lances de ids desconhecidos causem I/O em disco a cada mensagem;
+    - invalidação quando o .pem muda (mtime/tamanho), conferida no máximo a
+      cada intervalo_revalidacao segundos por chave;
+    - contadores de hits, misses, hits negativos, evicções e invalidações.
+    """
+
+    def __init__(self, diretorio, max_chaves=10000, ttl_negativo=5.0,
+                 intervalo_revalidacao=2.0, max_negativos=10000):
+        self.diretorio = diretorio
+        self.max_chaves = max_chaves
+        self.ttl_negativo = ttl_negativo
+        self.intervalo_revalidacao = intervalo_revalidacao
+        self.max_negativos = max_negativos
+        # user_id -> [public_key, pem, (mtime_ns, tamanho), verificado_em]
+        self._chaves = OrderedDict()
+        # user_id -> instante (monotonic) em que a entrada negativa expira
+        self._negativos = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.hits_negativos = 0
+        self.evictions = 0
+        self.invalidacoes = 0
+
+    def _caminho(self, user_id):
+        # O id vem da mensagem: não pode escapar do diretório de chaves
+        if not isinstance(user_id, str) or not user_id or os.sep in user_id or '/' in user_id or user_id.startswith('.'):
+            return None
+        return os.path.join(self.diretorio, f"{user_id}.pem")
+
+    def _ler(self, user_id):
+        caminho = self._caminho(user_id)
+        if caminho is None:
+            return None
+        try:
+            with open(caminho, 'rb') as pem_in:
+                st = os.fstat(pem_in.fileno())
+                pem = pem_in.read()
+            public_key = deserialize_public_key(pem)
+        except (OSError, ValueError):
+            return None
+        return [public_key, pem, (st.st_mtime_ns, st.st_size), time.monotonic()]
+
+    def _alterada(self, user_id, assinatura_arquivo):
+        try:
+            st = os.stat(self._caminho(user_id))
+        except OSError:
+            return True
+        return (st.st_mtime_ns, st.st_size) != assinatura_arquivo
+
+    def _inserir(self, user_id, entrada):
+        self._chaves[user_id] = entrada
+        self._chaves.move_to_end(user_id)
+        self._negativos.pop(user_id, None)
+        while len(self._chaves) > self.max_chaves:
+            self._chaves.popitem(last=False)
+            self.evictions += 1
+
+    def _entrada(self, user_id):
+        agora = time.monotonic()
+        entrada = self._chaves.get(user_id)
+        if entrada is not None:
+            if agora - entrada[3] >= self.intervalo_revalidacao:
+                if self._alterada(user_id, entrada[2]):
+                    del self._chaves[user_id]
+                    self.invalidacoes += 1
+                    entrada = None
+                else:
+                    entrada[3] = agora
+            if entrada is not None:
+                self._chaves.move_to_end(user_id)
+                self.hits += 1
+                return entrada
+
+        expira = self._negativos.get(user_id)
+        if expira is not None:
+            if expira > agora:
+                self.hits_negativos += 1
+                return None
+            del self._negativos[user_id]
+
+        self.misses += 1
+        entrada = self._ler(user_id)
+        if entrada is None:
+            self._negativos[user_id] = agora + self.ttl_negativo
+            while len(self._negativos) > self.max_negativos:
+                self._negativos.popitem(last=False)
+            return None
+        self._inserir(user_id, entrada)
+        return entrada
+
+    def get(self, user_id):
+        """Chave pública do usuário, ou None se não houver chave registrada."""
+        entrada = self._entrada(user_id)
+        return entrada[0] if entrada is not None else None
+
+    def get_pem(self, user_id):
+        """PEM da chave como está no arquivo, ou None."""
+        entrada = self._entrada(user_id)
+        return entrada[1] if entrada is not None else None
+
+    def preload(self):
+        """Carrega todo o diretório de chaves (até max_chaves). Devolve o total."""
+        if not os.path.isdir(self.diretorio):
+            return 0
+        carregadas = 0
+        for nome in sorted(os.listdir(self.diretorio)):
+            if not nome.endswith('.pem'):
+                continue
+            if carregadas >= self.max_chaves:
+                break
+            user_id = nome[:-len('.pem')]
+            entrada = self._ler(user_id)
+            if entrada is not None:
+                self._inserir(user_id, entrada)
+                carregadas += 1
+        return carregadas
+
+    def stats(self):
+        return {
+            "chaves": len(self._chaves),
+            "negativos": len(self._negativos),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hits_negativos": self.hits_negativos,
+            "evictions": self.evictions,
+            "invalidacoes": self.invalidacoes,
+        }
+
 def load_public_key_from_file(filename):
     """Carrega uma chave pública de um arquivo PEM."""
     if not os.path.exists(filename):
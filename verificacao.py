@@ -0,0 +1,110 @@
+"""Estágio de verificação de assinaturas em paralelo para o MS Lance.
+
+As verificações RSA são distribuídas para um pool de processos, mas a decisão
+de cada lance (leilão ativo? maior que o atual?) continua sendo tomada na
+thread consumidora, na ordem de chegada por id_leilao. Assim o resultado é
+idêntico ao do caminho serial.
+"""
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import utils
+
+# Cache de chaves desserializadas dentro de cada processo worker
+_chaves_worker = {}
+_MAX_CHAVES_WORKER = 10000
+
+
+def _verificar_no_worker(pem, assinatura, mensagem, alg):
+    public_key = _chaves_worker.get(pem)
+    if public_key is None:
+        if len(_chaves_worker) >= _MAX_CHAVES_WORKER:
+            _chaves_worker.clear()
+        public_key = utils.deserialize_public_key(pem)
+        _chaves_worker[pem] = public_key
+    return utils.verify_signature(public_key, assinatura, mensagem, alg)
+
+
+class PipelineVerificacao:
+    """Verifica assinaturas em paralelo preservando a ordem por leilão.
+
+    Cada leilão tem uma fila de ações pendentes. Uma ação de lance só é
+    aplicada quando sua verificação terminou e todas as ações anteriores do
+    mesmo leilão já foram aplicadas. Eventos de ciclo de vida (início/fim)
+    entram na mesma fila para não ultrapassarem lances anteriores.
+
+    Todos os métodos devem ser chamados na thread da conexão; os resultados
+    dos workers voltam para ela via add_callback_threadsafe.
+    """
+
+    def __init__(self, connection, workers, intervalo_relatorio=10):
+        self.connection = connection
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pendentes = {}
+        self.em_voo = 0
+        self.verificacoes = 0
+        self.intervalo_relatorio = intervalo_relatorio
+        self._ultimo_relatorio = time.monotonic()
+        self._verificacoes_relatorio = 0
+        if intervalo_relatorio:
+            self.connection.call_later(intervalo_relatorio, self._relatorio)
+
+    def enfileirar_lance(self, id_leilao, pem, assinatura, mensagem, alg, aplicar):
+        """Agenda a verificação; aplicar(ass_valida) roda na ordem do leilão."""
+        future = self.executor.submit(_verificar_no_worker, pem, assinatura, mensagem, alg)
+        self.em_voo += 1
+        self.pendentes.setdefault(id_leilao, deque()).append((future, aplicar))
+        future.add_done_callback(
+            lambda _f: self.connection.add_callback_threadsafe(
+                lambda: self._drenar(id_leilao)
+            )
+        )
+
+    def enfileirar_evento(self, id_leilao, acao):
+        """Executa a ação depois dos lances pendentes do mesmo leilão."""
+        fila = self.pendentes.get(id_leilao)
+        if not fila:
+            acao()
+            return
+        fila.append((None, acao))
+
+    def _drenar(self, id_leilao):
+        fila = self.pendentes.get(id_leilao)
+        while fila:
+            future, acao = fila[0]
+            if future is None:
+                fila.popleft()
+                acao()
+                continue
+            if not future.done():
+                break
+            fila.popleft()
+            self.em_voo -= 1
+            self.verificacoes += 1
+            try:
+                ass_valida = future.result()
+            except Exception as e:
+                print(f"MS Lance: Falha na verificação da assinatura: {e}")
+                ass_valida = False
+            acao(ass_valida)
+        if not fila:
+            self.pendentes.pop(id_leilao, None)
+
+    def profundidade(self):
+        """Quantidade de verificações enviadas aos workers e ainda não aplicadas."""
+        return self.em_voo
+
+    def _relatorio(self):
+        agora = time.monotonic()
+        decorrido = agora - self._ultimo_relatorio
+        taxa = (self.verificacoes - self._verificacoes_relatorio) / decorrido if decorrido else 0
+        self._ultimo_relatorio = agora
+        self._verificacoes_relatorio = self.verificacoes
+        print(f"MS Lance: {taxa:.1f} verificações/s | fila: {self.em_voo} "
+              f"| leilões com pendências: {len(self.pendentes)} | workers: {self.workers}")
+        self.connection.call_later(self.intervalo_relatorio, self._relatorio)
+
+    def encerrar(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
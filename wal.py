@@ -0,0 +1,161 @@
+"""Log de escrita antecipada (WAL) e snapshots do estado do MS Lance.
+
+O estado (leilões ativos e maior lance de cada leilão) é reconstruído a
+partir do último snapshot mais os segmentos de log gravados depois dele.
+
+Registros, um por linha (listas JSON):
+    ["i", id_leilao]                     leilão iniciado
+    ["f", id_leilao]                     leilão finalizado
+    ["l", id_leilao, id_usuario, valor]  lance aceito
+    ["l", id_leilao, id_usuario, valor, maximo]
+                                         idem, com o máximo do líder (lance automático)
+
+As gravações vão para o buffer do arquivo e só são tornadas duráveis em
+sincronizar() (group commit): quem chama decide quando, normalmente a cada
+N registros ou alguns milissegundos, e só então confirma as mensagens.
+"""
+import json
+import os
+import time
+
+SNAPSHOT = 'snapshot.json'
+PREFIXO_SEGMENTO = 'log.'
+
+
+def _fsync_diretorio(diretorio):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def aplicar_registro(registro, leiloes_ativos, maiores_lances):
+    tipo = registro[0]
+    if tipo == 'l':
+        maiores_lances[registro[1]] = {"id_usuario": registro[2], "valor": registro[3]}
+        if len(registro) > 4:
+            maiores_lances[registro[1]]["maximo"] = registro[4]
+    elif tipo == 'i':
+        leiloes_ativos.add(registro[1])
+        maiores_lances[registro[1]] = {"id_usuario": None, "valor": 0}
+    elif tipo == 'f':
+        leiloes_ativos.discard(registro[1])
+
+
+class LogLances:
+    """WAL segmentado com snapshots periódicos."""
+
+    def __init__(self, diretorio, snapshot_a_cada=500000):
+        self.diretorio = diretorio
+        self.snapshot_a_cada = snapshot_a_cada
+        os.makedirs(diretorio, exist_ok=True)
+        self.segmento = None
+        self._arquivo = None
+        self.pendentes = 0
+        self.desde_snapshot = 0
+
+    def _caminho_segmento(self, numero):
+        return os.path.join(self.diretorio, f"{PREFIXO_SEGMENTO}{numero:08d}")
+
+    def _segmentos(self):
+        numeros = []
+        for nome in os.listdir(self.diretorio):
+            if nome.startswith(PREFIXO_SEGMENTO) and nome[len(PREFIXO_SEGMENTO):].isdigit():
+                numeros.append(int(nome[len(PREFIXO_SEGMENTO):]))
+        return sorted(numeros)
+
+    def _abrir_segmento(self, numero):
+        if self._arquivo is not None:
+            self._arquivo.close()
+        self.segmento = numero
+        self._arquivo = open(self._caminho_segmento(numero), 'a', encoding='utf-8',
+                             buffering=1 << 16)
+        _fsync_diretorio(self.diretorio)
+
+    def recuperar(self):
+        """Carrega snapshot + log e abre um segmento novo para escrita.
+
+        Devolve (leiloes_ativos, maiores_lances, registros_reaplicados).
+        """
+        leiloes_ativos, maiores_lances, primeiro = set(), {}, 0
+        caminho_snapshot = os.path.join(self.diretorio, SNAPSHOT)
+        if os.path.exists(caminho_snapshot):
+            with open(caminho_snapshot, encoding='utf-8') as arquivo:
+                snapshot = json.load(arquivo)
+            leiloes_ativos = set(snapshot["leiloes_ativos"])
+            maiores_lances = snapshot["maiores_lances"]
+            primeiro = snapshot["segmento"]
+
+        reaplicados = 0
+        segmentos = [n for n in self._segmentos() if n >= primeiro]
+        for numero in segmentos:
+            reaplicados += self._reaplicar(self._caminho_segmento(numero), leiloes_ativos, maiores_lances)
+
+        self._abrir_segmento((segmentos[-1] + 1) if segmentos else primeiro)
+        self.desde_snapshot = reaplicados
+        return leiloes_ativos, maiores_lances, reaplicados
+
+    def _reaplicar(self, caminho, leiloes_ativos, maiores_lances, linhas_por_bloco=100000):
+        total = 0
+        with open(caminho, encoding='utf-8') as arquivo:
+            while True:
+                linhas = arquivo.readlines(linhas_por_bloco * 48)
+                if not linhas:
+                    break
+                # Última linha sem '\n' é uma escrita interrompida: descarta
+                if not linhas[-1].endswith('\n'):
+                    linhas.pop()
+                    if not linhas:
+                        break
+                # Um único json.loads por bloco é bem mais rápido que um por linha
+                for registro in json.loads('[' + ','.join(linhas) + ']'):
+                    aplicar_registro(registro, leiloes_ativos, maiores_lances)
+                total += len(linhas)
+        return total
+
+    def registrar(self, registro):
+        """Acrescenta um registro ao log (ainda não durável)."""
+        self._arquivo.write(json.dumps(registro, separators=(',', ':')) + '\n')
+        self.pendentes += 1
+        self.desde_snapshot += 1
+
+    def sincronizar(self):
+        """Torna duráveis todos os registros pendentes (um único fsync)."""
+        if not self.pendentes:
+            return
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+        self.pendentes = 0
+
+    def precisa_snapshot(self):
+        return self.desde_snapshot >= self.snapshot_a_cada
+
+    def snapshot(self, leiloes_ativos, maiores_lances):
+        """Grava o estado completo e descarta os segmentos que ele cobre."""
+        self.sincronizar()
+        proximo = self.segmento + 1
+        self._abrir_segmento(proximo)
+        caminho = os.path.join(self.diretorio, SNAPSHOT)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                "segmento": proximo,
+                "criado_em": time.time(),
+                "leiloes_ativos": sorted(leiloes_ativos),
+                "maiores_lances": maiores_lances,
+            }, arquivo, separators=(',', ':'))
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, caminho)
+        _fsync_diretorio(self.diretorio)
+        for numero in self._segmentos():
+            if numero < proximo:
+                os.remove(self._caminho_segmento(numero))
+        self.desde_snapshot = 0
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self.sincronizar()
+            self._arquivo.close()
+            self._arquivo = None
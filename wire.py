@@ -0,0 +1,182 @@
+"""Formato binário compacto e versionado para os eventos do leilão.
+
+Cabeçalho de 2 bytes (MAGIC, versão) seguido de um mapa codificado no estilo
+msgpack. Na versão 1 as chaves conhecidas do esquema viram um único byte
+(ver CHAVES_V1); chaves desconhecidas seguem como texto, então campos novos
+não exigem versão nova. Floats usam float64, sem perda em relação ao JSON.
+
+O formato é indicado pelo content-type AMQP, e todos os serviços leem os
+dois formatos (JSON e binário) durante a migração.
+"""
+import struct
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_BINARIO = 'application/x-leilao'
+
+MAGIC = 0xA7
+VERSAO = 1
+
+# Chaves do esquema v1: o índice na tupla é o código da chave (0..N-1).
+# Só acrescente no fim; mudar a ordem exige uma versão nova.
+CHAVES_V1 = (
+    'id_leilao', 'id_usuario', 'valor', 'id_vencedor', 'descricao',
+    'inicio', 'fim', 'status', 'nonce', 'ts', 'maximo',
+)
+_CODIGO_V1 = {chave: codigo for codigo, chave in enumerate(CHAVES_V1)}
+
+# Marcadores (subconjunto do msgpack)
+_NIL, _FALSE, _TRUE = 0xC0, 0xC2, 0xC3
+_BIN8, _BIN16 = 0xC4, 0xC5
+_FLOAT64, _INT64 = 0xCB, 0xD3
+_STR8, _STR16 = 0xD9, 0xDA
+_ARRAY16, _MAP16 = 0xDC, 0xDE
+_CHAVE = 0xD4  # código de chave do esquema, seguido de 1 byte
+
+_pack_d = struct.Struct('>d').pack
+_pack_q = struct.Struct('>q').pack
+_pack_H = struct.Struct('>H').pack
+_unpack_d = struct.Struct('>d').unpack_from
+_unpack_q = struct.Struct('>q').unpack_from
+_unpack_H = struct.Struct('>H').unpack_from
+
+
+class ErroFormato(ValueError):
+    """Mensagem binária inválida ou de versão não suportada."""
+
+
+def _codificar(valor, saida):
+    if valor is None:
+        saida.append(_NIL)
+    elif valor is True:
+        saida.append(_TRUE)
+    elif valor is False:
+        saida.append(_FALSE)
+    elif isinstance(valor, float):
+        saida.append(_FLOAT64)
+        saida += _pack_d(valor)
+    elif isinstance(valor, int):
+        if 0 <= valor < 0x80:
+            saida.append(valor)
+        else:
+            saida.append(_INT64)
+            saida += _pack_q(valor)
+    elif isinstance(valor, str):
+        dados = valor.encode('utf-8')
+        _codificar_tamanho(len(dados), 0xA0, 32, _STR8, _STR16, saida)
+        saida += dados
+    elif isinstance(valor, (bytes, bytearray)):
+        _codificar_tamanho(len(valor), None, 0, _BIN8, _BIN16, saida)
+        saida += valor
+    elif isinstance(valor, dict):
+        _codificar_tamanho(len(valor), 0x80, 16, None, _MAP16, saida)
+        for chave, item in sorted(valor.items()):
+            codigo = _CODIGO_V1.get(chave)
+            if codigo is None:
+                _codificar(chave, saida)
+            else:
+                saida.append(_CHAVE)
+                saida.append(codigo)
+            _codificar(item, saida)
+    elif isinstance(valor, (list, tuple)):
+        _codificar_tamanho(len(valor), 0x90, 16, None, _ARRAY16, saida)
+        for item in valor:
+            _codificar(item, saida)
+    else:
+        raise TypeError(f"Tipo não suportado no formato binário: {type(valor).__name__}")
+
+
+def _codificar_tamanho(tamanho, prefixo_fixo, limite_fixo, marcador8, marcador16, saida):
+    if prefixo_fixo is not None and tamanho < limite_fixo:
+        saida.append(prefixo_fixo | tamanho)
+    elif marcador8 is not None and tamanho < 0x100:
+        saida.append(marcador8)
+        saida.append(tamanho)
+    elif tamanho < 0x10000:
+        saida.append(marcador16)
+        saida += _pack_H(tamanho)
+    else:
+        raise ValueError("Valor grande demais para o formato binário")
+
+
+def _decodificar(dados, pos):
+    marcador = dados[pos]
+    pos += 1
+    if marcador < 0x80:
+        return marcador, pos
+    if 0xA0 <= marcador <= 0xBF:
+        fim = pos + (marcador & 0x1F)
+        return dados[pos:fim].decode('utf-8'), fim
+    if 0x80 <= marcador <= 0x8F:
+        return _decodificar_mapa(dados, pos, marcador & 0x0F)
+    if 0x90 <= marcador <= 0x9F:
+        return _decodificar_lista(dados, pos, marcador & 0x0F)
+    if marcador == _FLOAT64:
+        return _unpack_d(dados, pos)[0], pos + 8
+    if marcador == _INT64:
+        return _unpack_q(dados, pos)[0], pos + 8
+    if marcador == _NIL:
+        return None, pos
+    if marcador == _TRUE:
+        return True, pos
+    if marcador == _FALSE:
+        return False, pos
+    if marcador in (_STR8, _BIN8, _STR16, _BIN16):
+        if marcador in (_STR8, _BIN8):
+            tamanho, pos = dados[pos], pos + 1
+        else:
+            tamanho, pos = _unpack_H(dados, pos)[0], pos + 2
+        bruto = bytes(dados[pos:pos + tamanho])
+        return (bruto.decode('utf-8') if marcador in (_STR8, _STR16) else bruto), pos + tamanho
+    if marcador == _MAP16:
+        return _decodificar_mapa(dados, pos + 2, _unpack_H(dados, pos)[0])
+    if marcador == _ARRAY16:
+        return _decodificar_lista(dados, pos + 2, _unpack_H(dados, pos)[0])
+    raise ErroFormato(f"Marcador desconhecido: 0x{marcador:02x}")
+
+
+def _decodificar_mapa(dados, pos, tamanho):
+    resultado = {}
+    for _ in range(tamanho):
+        if dados[pos] == _CHAVE:
+            try:
+                chave = CHAVES_V1[dados[pos + 1]]
+            except IndexError:
+                raise ErroFormato(f"Código de chave desconhecido: {dados[pos + 1]}")
+            pos += 2
+        else:
+            chave, pos = _decodificar(dados, pos)
+            # Uma lista ou um mapa como chave não é hasheável
+            if not isinstance(chave, (str, int)):
+                raise ErroFormato(f"Chave de mapa inválida: {type(chave).__name__}")
+        resultado[chave], pos = _decodificar(dados, pos)
+    return resultado, pos
+
+
+def _decodificar_lista(dados, pos, tamanho):
+    resultado = []
+    for _ in range(tamanho):
+        item, pos = _decodificar(dados, pos)
+        resultado.append(item)
+    return resultado, pos
+
+
+def codificar(evento):
+    """Codifica um dicionário no formato binário (determinístico: chaves ordenadas)."""
+    saida = bytearray((MAGIC, VERSAO))
+    _codificar(evento, saida)
+    return bytes(saida)
+
+
+def decodificar(dados):
+    """Decodifica uma mensagem binária; ErroFormato se inválida ou de outra versão."""
+    if len(dados) < 3 or dados[0] != MAGIC:
+        raise ErroFormato("Mensagem não está no formato binário do leilão")
+    if dados[1] != VERSAO:
+        raise ErroFormato(f"Versão do formato binário não suportada: {dados[1]}")
+    try:
+        evento, pos = _decodificar(dados, 2)
+    except (IndexError, struct.error, UnicodeDecodeError, RecursionError) as e:
+        raise ErroFormato(f"Mensagem binária truncada ou corrompida: {e}")
+    if pos != len(dados):
+        raise ErroFormato("Bytes sobrando após o fim da mensagem")
+    return evento